@@ -0,0 +1,364 @@
+# -*- coding: utf-8 -*-
+"""
+Offline benchmarks for gspread-formatting's request-building and decoding hot paths.
+
+Run ``python benchmark.py`` from the top-level folder of the repository. Each benchmark is
+timed ``repeat`` times (each timing running it ``number`` times, with garbage collection
+off, as ``timeit`` does) and the results, seconds per run, are written as JSON, along with the
+time taken by a fixed pure-Python calibration loop on the same machine. Medians are compared
+in units of that loop, so that one set of ceilings holds on fast and slow machines alike. A run
+fails (exit status 1) if a benchmark's relative median exceeds its ceiling in
+``benchmark_thresholds.json``, or, with ``--baseline``, exceeds the relative median stored in
+an earlier results file by more than ``--tolerance``::
+
+    python benchmark.py --output results-2.0.0.json
+    python benchmark.py --baseline results-2.0.0.json --tolerance 0.2
+
+No Google account or network access is needed: requests are built but never sent.
+Benchmarks of ``format_with_dataframe`` need ``pandas``.
+"""
+
+from gspread_formatting import *
+from gspread_formatting.util import _range_to_gridrange_object
+from gspread.utils import rowcol_to_a1
+
+import argparse
+import datetime
+import gc
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+
+try:
+    import numpy as np
+    import pandas as pd
+    from gspread_formatting.dataframe import _format_with_dataframe, _format_with_dataframes, \
+        BasicFormatter, ConditionalFormatter
+except ImportError:
+    pd = None
+
+THRESHOLDS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark_thresholds.json')
+SEED = 20240101
+
+BENCHMARKS = []
+
+
+def benchmark(name, number=1, repeat=5, needs_pandas=False, quick=True):
+    """
+    Registers a benchmark. The decorated function prepares its inputs and returns
+    the function to time, so that preparation is never timed; it is called again before
+    each repeat, for benchmarks that change their inputs.
+    """
+    def register(prepare):
+        BENCHMARKS.append({
+            'name': name, 'prepare': prepare, 'number': number, 'repeat': repeat,
+            'needs_pandas': needs_pandas, 'quick': quick
+        })
+        return prepare
+    return register
+
+
+class _Worksheet(object):
+    """Enough of a gspread ``Worksheet`` to build requests for."""
+    def __init__(self, id=0):
+        self.id = id
+        self.title = 'Sheet1'
+        self.spreadsheet = _Spreadsheet()
+
+class _Spreadsheet(object):
+    def batch_update(self, body):
+        return {'replies': [{} for r in body['requests']]}
+
+
+def _random_cell_format(rng):
+    return cellFormat(
+        backgroundColor=color(rng.random(), rng.random(), rng.random()),
+        numberFormat=numberFormat(type=rng.choice(['NUMBER', 'DATE', 'CURRENCY']), pattern='#,##0.00'),
+        horizontalAlignment=rng.choice(['LEFT', 'CENTER', 'RIGHT']),
+        borders=borders(top=border('SOLID', color(0, 0, 0)), bottom=border('DOTTED', color(0.5, 0.5, 0.5))),
+        padding=padding(top=2, bottom=2),
+        textFormat=textFormat(
+            bold=rng.random() < 0.5, italic=rng.random() < 0.5,
+            fontSize=rng.choice([8, 10, 12]), foregroundColor=color(0, 0, rng.random())
+        )
+    )
+
+@benchmark('cellformat_to_props', number=1000)
+def cellformat_to_props():
+    fmt = _random_cell_format(random.Random(SEED))
+    return fmt.to_props
+
+@benchmark('cellformat_affected_fields', number=1000)
+def cellformat_affected_fields():
+    fmt = _random_cell_format(random.Random(SEED))
+    return lambda: fmt.affected_fields('userEnteredFormat')
+
+@benchmark('cellformat_from_props_grid_100x100')
+def cellformat_from_props_grid():
+    # a grid as returned by the API, with a few distinct formats repeated across cells
+    rng = random.Random(SEED)
+    palette = [_random_cell_format(rng).to_props() for i in range(20)]
+    row_data = [
+        {'values': [{'userEnteredFormat': rng.choice(palette)} for c in range(100)]}
+        for r in range(100)
+    ]
+    def run():
+        return [
+            [CellFormat.from_props(cell['userEnteredFormat']) for cell in row['values']]
+            for row in row_data
+        ]
+    return run
+
+@benchmark('range_to_gridrange_a1_10k')
+def range_to_gridrange_a1():
+    rng = random.Random(SEED)
+    labels = []
+    for i in range(10000):
+        row, col = rng.randint(1, 5000), rng.randint(1, 200)
+        labels.append('%s:%s' % (rowcol_to_a1(row, col), rowcol_to_a1(row + rng.randint(0, 50), col + rng.randint(0, 5))))
+    return lambda: [_range_to_gridrange_object(label, 0) for label in labels]
+
+@benchmark('range_to_gridrange_tuples_10k')
+def range_to_gridrange_tuples():
+    rng = random.Random(SEED)
+    ranges = [
+        (r, c, r + rng.randint(0, 50), c + rng.randint(0, 5))
+        for r, c in ((rng.randint(1, 5000), rng.randint(1, 200)) for i in range(10000))
+    ]
+    return lambda: [_range_to_gridrange_object(r, 0) for r in ranges]
+
+def _dataframe(cells, columns=10):
+    rng = np.random.RandomState(SEED)
+    rows = cells // columns
+    data = {}
+    for c in range(columns):
+        kind = c % 5
+        if kind == 0:
+            data['int%d' % c] = rng.randint(0, 1000, rows)
+        elif kind == 1:
+            data['float%d' % c] = rng.rand(rows)
+        elif kind == 2:
+            data['date%d' % c] = pd.date_range('2020-01-01', periods=rows, freq='h')
+        elif kind == 3:
+            data['text%d' % c] = np.array(['item %d' % (i % 100) for i in range(rows)], dtype=object)
+        else:
+            # an object column of numbers, whose type is inferred from a sample
+            data['mixed%d' % c] = pd.Series(rng.randint(0, 10, rows), dtype=object)
+    return pd.DataFrame(data)
+
+if pd is not None:
+    class _HighlightingFormatter(BasicFormatter):
+        """Formats individual cells, so that every cell is visited."""
+        HIGH = cellFormat(backgroundColor=color(1, 0.8, 0.8))
+
+        def format_for_cell(self, value, row_number, col_number, dataframe):
+            return self.HIGH if isinstance(value, float) and value > 0.9 else None
+
+    class _BandedCellsFormatter(BasicFormatter):
+        """Formats numeric cells by value band with ``format_for_cells``, so that the formats
+        of all cells are planned into ranges, but computed column-wise."""
+        FORMATS = [
+            cellFormat(backgroundColor=color(1, 0.8, 0.8)),
+            cellFormat(backgroundColor=color(0.8, 1, 0.8)),
+            cellFormat(textFormat=textFormat(bold=True))
+        ]
+
+        def format_for_cells(self, dataframe):
+            values = dataframe.select_dtypes('number').reindex(columns=dataframe.columns)
+            values = values / values.max()
+            return np.select([values > 0.8, values < 0.2, values > 0.5], [0, 1, 2], -1), self.FORMATS
+
+def _format_with_dataframe_benchmark(cells, formatter_class, columns=10, **formatter_args):
+    def prepare():
+        worksheet = _Worksheet()
+        dataframe = _dataframe(cells, columns)
+        formatter = formatter_class.with_defaults(freeze_headers=True, **formatter_args)
+        # as fetched from a worksheet without conditional format rules
+        rules = ConditionalFormatRules(worksheet, [])
+        return lambda: _format_with_dataframe(
+            worksheet, dataframe, formatter, include_index=True, conditional_rules=rules
+        )
+    return prepare
+
+for _cells in (10000, 100000):
+    benchmark(
+        'format_with_dataframe_basic_%dk_cells' % (_cells // 1000), needs_pandas=True
+    )(_format_with_dataframe_benchmark(_cells, BasicFormatter if pd is not None else None))
+
+for _cells, _quick in ((100000, True), (1000000, False)):
+    benchmark(
+        'format_with_dataframe_cells_%dk_cells' % (_cells // 1000), needs_pandas=True, quick=_quick
+    )(_format_with_dataframe_benchmark(_cells, _BandedCellsFormatter if pd is not None else None))
+
+for _cells, _quick in ((10000, True), (100000, False)):
+    benchmark(
+        'format_with_dataframe_per_cell_%dk_cells' % (_cells // 1000), needs_pandas=True, quick=_quick
+    )(_format_with_dataframe_benchmark(_cells, _HighlightingFormatter if pd is not None else None))
+
+@benchmark('format_with_dataframe_conditional_200_columns', needs_pandas=True)
+def format_with_dataframe_conditional():
+    # rules declared per column, compiled and merged across the columns they are equal on
+    over = BooleanRule(
+        condition=BooleanCondition('NUMBER_GREATER', ['0.9']), format=cellFormat(backgroundColor=color(1, 0.8, 0.8))
+    )
+    small = BooleanRule(
+        condition=BooleanCondition('NUMBER_LESS', ['10']), format=cellFormat(textFormat=textFormat(bold=True))
+    )
+    heat = GradientRule(
+        minpoint=InterpolationPoint(color=color(1, 1, 1), type='MIN'),
+        maxpoint=InterpolationPoint(color=color(0.3, 0.8, 0.3), type='MAX')
+    )
+    return _format_with_dataframe_benchmark(100000, ConditionalFormatter, columns=200, column_rules=dict(
+        ('float%d' % c, [over, heat]) if c % 5 == 1 else ('int%d' % c if c % 5 == 0 else 'mixed%d' % c, small)
+        for c in range(200) if c % 5 in (0, 1, 4)
+    ))()
+
+@benchmark('format_with_dataframes_160_frames', needs_pandas=True)
+def format_with_dataframes_stacked():
+    # small DataFrames stacked down one worksheet, whose equal formats are merged
+    worksheet = _Worksheet()
+    rng = np.random.RandomState(SEED)
+    formatter = _HighlightingFormatter.with_defaults()
+    jobs = [
+        (worksheet, pd.DataFrame({'a': rng.rand(30), 'b': rng.rand(30), 'c': rng.randint(0, 5, 30)}), formatter, 1 + i * 32, 1)
+        for i in range(160)
+    ]
+    return lambda: _format_with_dataframes(jobs)
+
+@benchmark('conditional_rules_save_500_rules', repeat=5)
+def conditional_rules_save():
+    # edits to a long rule list: deletions, insertions, replacements and moves
+    rng = random.Random(SEED)
+    worksheet = _Worksheet()
+    def rule(i):
+        return ConditionalFormatRule(
+            ranges=[GridRange(sheetId=0, startRowIndex=i, endRowIndex=i + 10, startColumnIndex=i % 20, endColumnIndex=i % 20 + 1)],
+            booleanRule=BooleanRule(
+                condition=BooleanCondition('NUMBER_GREATER', [str(i)]),
+                format=cellFormat(backgroundColor=color(1, i % 7 / 7.0, 0))
+            )
+        )
+    rules = ConditionalFormatRules(worksheet, [rule(i) for i in range(500)])
+    for i in range(25):
+        del rules[rng.randrange(len(rules))]
+    for i in range(25):
+        rules.insert(rng.randrange(len(rules)), rule(1000 + i))
+    for i in range(25):
+        rules[rng.randrange(len(rules))] = rule(2000 + i)
+    for i in range(25):
+        rules.insert(rng.randrange(len(rules)), rules.pop(rng.randrange(len(rules))))
+    return rules.save
+
+
+def _calibrate(repeat=5):
+    """Seconds taken by a fixed pure-Python loop of dict building, sorting and JSON encoding,
+    like the work of request building, which is the unit that thresholds are expressed in."""
+    def loop():
+        rows = [{'row': i, 'key': '%d:%d' % (i % 97, i % 89)} for i in range(5000)]
+        rows.sort(key=lambda r: r['key'])
+        return json.dumps(rows, sort_keys=True)
+    return _time({'prepare': lambda: loop, 'number': 1, 'repeat': repeat})['median']
+
+def _time(bench):
+    timings = []
+    for i in range(bench['repeat']):
+        run = bench['prepare']()
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            start = time.perf_counter()
+            for n in range(bench['number']):
+                run()
+            timings.append((time.perf_counter() - start) / bench['number'])
+        finally:
+            if gc_enabled:
+                gc.enable()
+    return {
+        'median': statistics.median(timings),
+        'min': min(timings),
+        'max': max(timings),
+        'number': bench['number'],
+        'repeat': bench['repeat']
+    }
+
+def run_benchmarks(names=None, quick=False, out=None):
+    """Runs the benchmarks (those whose names contain one of ``names``, if given) and returns the results document."""
+    results = {}
+    for bench in BENCHMARKS:
+        if names and not any(n in bench['name'] for n in names):
+            continue
+        if (quick and not bench['quick']) or (bench['needs_pandas'] and pd is None):
+            continue
+        random.seed(SEED)
+        # calibrated around each benchmark, so that the unit follows the machine's load
+        calibration = _calibrate()
+        result = results[bench['name']] = _time(bench)
+        result['calibration'] = (calibration + _calibrate()) / 2
+        result['relative'] = result['median'] / result['calibration']
+        if out is not None:
+            out.write('%-45s median %10.6fs  min %10.6fs  relative %10.4f\n' % (
+                bench['name'], result['median'], result['min'], result['relative']
+            ))
+    with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'VERSION')) as f:
+        version = f.read().strip()
+    return {
+        'version': version,
+        'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'pandas': pd.__version__ if pd is not None else None,
+        'results': results
+    }
+
+def check_results(document, thresholds=None, baseline=None, tolerance=0.2):
+    """Returns a list of messages, one for each benchmark whose relative median (its median
+    in units of the calibration loop) exceeds its threshold or, if a baseline results
+    document is given, its baseline relative median by more than ``tolerance`` (a fraction)."""
+    failures = []
+    for name, result in sorted(document['results'].items()):
+        ceiling = (thresholds or {}).get(name)
+        if ceiling is not None and result['relative'] > ceiling:
+            failures.append('%s: relative median %.4f exceeds threshold %.4f' % (name, result['relative'], ceiling))
+        previous = (baseline or {}).get('results', {}).get(name)
+        if previous is not None and result['relative'] > previous['relative'] * (1 + tolerance):
+            failures.append('%s: relative median %.4f is more than %d%% slower than baseline %.4f (version %s)' % (
+                name, result['relative'], tolerance * 100, previous['relative'], baseline.get('version')
+            ))
+    return failures
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--output', help='file to write the results to, as JSON')
+    parser.add_argument('--baseline', help='results file of an earlier run, to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='allowed slowdown relative to the baseline, as a fraction (default 0.2)')
+    parser.add_argument('--thresholds', default=THRESHOLDS_FILE,
+                        help='JSON file of maximum relative medians per benchmark, in units of the '
+                             'calibration loop; empty to skip')
+    parser.add_argument('--quick', action='store_true', help='skip the largest benchmarks')
+    parser.add_argument('names', nargs='*', help='run only benchmarks whose names contain one of these')
+    args = parser.parse_args(argv)
+
+    document = run_benchmarks(args.names, args.quick, sys.stdout)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(document, f, indent=2, sort_keys=True)
+    thresholds = baseline = None
+    if args.thresholds:
+        with open(args.thresholds) as f:
+            thresholds = json.load(f)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    failures = check_results(document, thresholds, baseline, args.tolerance)
+    for failure in failures:
+        sys.stdout.write('REGRESSION %s\n' % failure)
+    return 1 if failures else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
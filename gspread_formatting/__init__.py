@@ -3,4 +3,5 @@
 from .functions import *
 from .models import *
 from .conditionals import *
+from .ranges import *
 from .batch import *
@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+"""
+Adapters that let ``format_with_dataframe`` and ``DataFrameFormatter`` objects work directly
+on Apache Arrow tables and Polars DataFrames, without converting them to pandas. An adapted
+table offers the parts of the ``pandas.DataFrame`` interface that formatting uses: ``columns``,
+``shape``, ``dtypes``, a default ``index`` of row numbers, column access by name, and
+positional row slicing via ``iloc``. Column types are read from the Arrow schema, and values
+are only copied out of the table for the rows being formatted cell by cell or row by row,
+or for the sample of a column whose type must be inferred from its values.
+
+Requires ``pyarrow`` (and ``polars``, for Polars DataFrames, which are adapted through their
+Arrow data).
+"""
+
+__all__ = ('ArrowFrame', 'ArrowColumn')
+
+
+def _arrow_kind(arrow_type):
+    """The NumPy dtype kind corresponding to an Arrow data type."""
+    import pyarrow.types as pat
+    if pat.is_dictionary(arrow_type):
+        return _arrow_kind(arrow_type.value_type)
+    if pat.is_boolean(arrow_type):
+        return 'b'
+    if pat.is_signed_integer(arrow_type):
+        return 'i'
+    if pat.is_unsigned_integer(arrow_type):
+        return 'u'
+    if pat.is_floating(arrow_type) or pat.is_decimal(arrow_type):
+        return 'f'
+    if pat.is_timestamp(arrow_type) or pat.is_date(arrow_type):
+        return 'M'
+    return 'O'
+
+def _is_arrow_table(obj):
+    return type(obj).__module__.split('.')[0] == 'pyarrow' and hasattr(obj, 'column_names')
+
+def _is_polars_frame(obj):
+    return type(obj).__module__.split('.')[0] == 'polars' and hasattr(obj, 'to_arrow')
+
+def _as_frame(dataframe):
+    """Wraps an Arrow table or Polars DataFrame in an ``ArrowFrame``; returns other objects unchanged."""
+    if _is_arrow_table(dataframe):
+        return ArrowFrame(dataframe)
+    if _is_polars_frame(dataframe):
+        # Polars hands over its Arrow buffers without copying them
+        return ArrowFrame(dataframe.to_arrow())
+    return dataframe
+
+
+class ArrowDtype(object):
+    """The dtype of an ``ArrowColumn``: the Arrow data type, with the corresponding NumPy ``kind``."""
+    def __init__(self, arrow_type):
+        self.arrow_type = arrow_type
+        self.kind = _arrow_kind(arrow_type)
+
+    def __eq__(self, other):
+        return isinstance(other, ArrowDtype) and self.arrow_type == other.arrow_type
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(str(self.arrow_type))
+
+    def __str__(self):
+        return str(self.arrow_type)
+
+    def __repr__(self):
+        return 'ArrowDtype(%s)' % self.arrow_type
+
+
+class ArrowColumn(object):
+    """
+    A column of an ``ArrowFrame``, standing in for a ``pandas.Series``: it has a ``name`` and
+    ``dtype``, a length, and yields its values as Python objects when iterated or indexed by
+    position or by a list of positions.
+    """
+    def __init__(self, name, array):
+        self.name = name
+        self.array = array
+        self.dtype = ArrowDtype(array.type)
+
+    def __len__(self):
+        return len(self.array)
+
+    def __iter__(self):
+        for chunk in getattr(self.array, 'chunks', [self.array]):
+            for value in chunk.to_pylist():
+                yield value
+
+    def __getitem__(self, position):
+        if isinstance(position, slice):
+            start, stop, step = position.indices(len(self))
+            if step == 1:
+                return ArrowColumn(self.name, self.array.slice(start, max(stop - start, 0)))
+            position = list(range(start, stop, step))
+        if isinstance(position, (list, tuple)):
+            return self.array.take(list(position)).to_pylist()
+        return self.array[position].as_py()
+
+    def to_pylist(self):
+        return self.array.to_pylist()
+
+
+class _RowNumberDtype(object):
+    kind = 'i'
+
+    def __str__(self):
+        return 'int64'
+
+class _RowNumberIndex(object):
+    """The index of an ``ArrowFrame``: row numbers, like a default ``pandas.RangeIndex``."""
+    name = None
+    names = [None]
+    nlevels = 1
+    dtype = _RowNumberDtype()
+
+    def __init__(self, start, stop):
+        self.start = start
+        self.stop = stop
+
+    def __len__(self):
+        return self.stop - self.start
+
+    def __iter__(self):
+        return iter(range(self.start, self.stop))
+
+    def __getitem__(self, position):
+        rows = range(self.start, self.stop)
+        if isinstance(position, (list, tuple)):
+            return [rows[p] for p in position]
+        rows = rows[position]
+        if isinstance(rows, range) and rows.step == 1:
+            return _RowNumberIndex(rows.start, rows.stop)
+        return rows
+
+    def get_level_values(self, level):
+        return self
+
+
+class _ILocIndexer(object):
+    def __init__(self, frame):
+        self.frame = frame
+
+    def __getitem__(self, rows):
+        if not isinstance(rows, slice) or rows.step not in (None, 1):
+            raise ValueError("ArrowFrame.iloc supports only contiguous slices of rows")
+        start, stop, _ = rows.indices(self.frame.shape[0])
+        stop = max(start, stop)
+        return ArrowFrame(
+            self.frame.table.slice(start, stop - start),
+            _RowNumberIndex(self.frame.index.start + start, self.frame.index.start + stop)
+        )
+
+
+class ArrowFrame(object):
+    """
+    Presents a ``pyarrow.Table`` (or ``RecordBatch``) with the parts of the ``pandas.DataFrame``
+    interface used by ``format_with_dataframe`` and ``BasicFormatter``. Custom formatters
+    receive this object as their ``dataframe`` argument; the underlying Arrow data is
+    available as ``table``.
+    """
+    def __init__(self, table, index=None):
+        self.table = table
+        self.columns = list(table.column_names)
+        self.shape = (table.num_rows, table.num_columns)
+        self.index = index if index is not None else _RowNumberIndex(0, table.num_rows)
+        self.iloc = _ILocIndexer(self)
+
+    @property
+    def dtypes(self):
+        return [ArrowDtype(field.type) for field in self.table.schema]
+
+    def __getitem__(self, name):
+        return ArrowColumn(name, self.table.column(name))
+
+    def __len__(self):
+        return self.shape[0]
+
+    @property
+    def values(self):
+        """The rows of the table, each as a list of Python values. Copies every value:
+        slice the frame with ``iloc`` first."""
+        if not self.columns:
+            return [[] for row in range(self.shape[0])]
+        columns = [self.table.column(name).to_pylist() for name in self.columns]
+        return [list(row) for row in zip(*columns)]
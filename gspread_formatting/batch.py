@@ -2,18 +2,27 @@
 
 import gspread_formatting.functions
 import gspread_formatting.dataframe
+from gspread_formatting.instrumentation import _span, _batch_update
 
 from functools import wraps
 
 __all__ = ('batch_updater', 'SpreadsheetBatchUpdater')
 
-def batch_updater(spreadsheet):
-    return SpreadsheetBatchUpdater(spreadsheet)
+def batch_updater(spreadsheet, max_pending_requests=None):
+    return SpreadsheetBatchUpdater(spreadsheet, max_pending_requests)
 
 class SpreadsheetBatchUpdater(object):
-    def __init__(self, spreadsheet):
+    """
+    Gathers formatting requests for one spreadsheet and sends them in a single
+    ``batchUpdate`` call when ``execute()`` is called (or the ``with:`` block exits).
+    If ``max_pending_requests`` is given, pending requests are also sent as soon as
+    there are at least that many, so that large jobs use bounded memory.
+    """
+    def __init__(self, spreadsheet, max_pending_requests=None):
         self.spreadsheet = spreadsheet
+        self.max_pending_requests = max_pending_requests
         self.requests = []
+        self._pending_count = 0
 
     def __enter__(self):
         if self.requests:
@@ -25,19 +34,72 @@ class SpreadsheetBatchUpdater(object):
         return False
 
     def execute(self):
-        resps = self.spreadsheet.batch_update({'requests': self.requests})
+        """Sends the pending requests, and returns the response, or None if there were none."""
+        if not any(self.requests):
+            # the API rejects a batchUpdate without requests
+            del self.requests[:]
+            self._pending_count = 0
+            return None
+        resps = _batch_update(self.spreadsheet, {'requests': self.requests}, 'SpreadsheetBatchUpdater.execute')
         del self.requests[:]
+        self._pending_count = 0
         return resps
 
+    def _add_requests(self, requests):
+        self.requests.append(requests)
+        self._pending_count += len(requests)
+        if self.max_pending_requests and self._pending_count >= self.max_pending_requests:
+            self.execute()
+
+    def format_with_dataframe_in_chunks(self, worksheet, dataframe, *args, **kwargs):
+        """
+        Like ``format_with_dataframe``, but walks the DataFrame in chunks of rows 
+        (see ``iter_format_with_dataframe``, whose parameters this method accepts), adding
+        each chunk's requests as it is built. Combine with ``max_pending_requests``
+        so that requests are sent as they accumulate.
+        """
+        _check_worksheet(self, worksheet)
+        chunks = gspread_formatting.dataframe.iter_format_with_dataframe(
+            worksheet, dataframe, *args, **kwargs
+        )
+        while True:
+            with _span('build', operation='SpreadsheetBatchUpdater.format_with_dataframe_in_chunks'):
+                requests = next(chunks, None)
+            if requests is None:
+                break
+            if requests:
+                self._add_requests(requests)
+        return self
+
+    def format_with_dataframes(self, jobs, plan_cache=None):
+        """
+        Like ``format_with_dataframes``, but adds the requests for all jobs, whose 
+        worksheets must belong to this updater's spreadsheet, to this batch updater.
+        """
+        jobs = list(jobs)
+        for job in jobs:
+            _check_worksheet(self, job[0])
+        with _span('build', operation='SpreadsheetBatchUpdater.format_with_dataframes'):
+            by_spreadsheet = gspread_formatting.dataframe._format_with_dataframes(jobs, plan_cache)
+        for spreadsheet, requests in by_spreadsheet:
+            if requests:
+                self._add_requests(requests)
+        return self
+
+def _check_worksheet(updater, worksheet):
+    if worksheet.spreadsheet != updater.spreadsheet:
+        raise ValueError(
+            "Worksheet %r belongs to spreadsheet %r, not batch updater's spreadsheet %r" 
+            % (worksheet, worksheet.spreadsheet, updater.spreadsheet)
+        )
+
 def _wrap_for_batch_updater(func):
     @wraps(func)
     def f(self, worksheet, *args, **kwargs):
-        if worksheet.spreadsheet != self.spreadsheet:
-            raise ValueError(
-                "Worksheet %r belongs to spreadsheet %r, not batch updater's spreadsheet %r" 
-                % (worksheet, worksheet.spreadsheet, self.spreadsheet)
-            )
-        self.requests.append( func(worksheet, *args, **kwargs) )
+        _check_worksheet(self, worksheet)
+        with _span('build', operation='SpreadsheetBatchUpdater.' + func.__name__.lstrip('_')):
+            requests = func(worksheet, *args, **kwargs)
+        self._add_requests(requests)
         return self
     return f
 
@@ -50,4 +112,3 @@ setattr(
     'format_with_dataframe', 
     _wrap_for_batch_updater(gspread_formatting.dataframe._format_with_dataframe)
 )
-
@@ -6,16 +6,20 @@ This module provides functions that generate request objects compatible with the
 in functions that make the API call or calls using the generated request objects.
 """
 
-from .util import _build_repeat_cell_request, _range_to_dimensionrange_object
+from .util import _build_repeat_cell_request, _range_to_dimensionrange_object, _range_to_gridrange_object, \
+    _props_key
 
 from functools import wraps
+import json
 
 __all__ = (
     'format_cell_ranges', 'format_cell_range', 'set_frozen', 'set_right_to_left',
     'set_data_validation_for_cell_range', 'set_data_validation_for_cell_ranges',
     'set_text_format_runs',
     'set_row_height', 'set_row_heights',
-    'set_column_width', 'set_column_widths'
+    'set_column_width', 'set_column_widths',
+    'add_banding', 'update_banding', 'delete_banding',
+    'copy_format', 'update_borders', 'update_cell_borders'
 )
 
 
@@ -96,7 +100,7 @@ def set_text_format_runs(worksheet, label, runs):
     :param label: string representing a single cell or range of cells, e.g. ``A1`` or ``A2:B7``.
     :param runs: A list (possibly empty) of TextFormatRun objects
     """
-    return _build_repeat_cell_request(worksheet, label, runs, 'textFormatRuns')
+    return [_build_repeat_cell_request(worksheet, label, runs, 'textFormatRuns')]
 
 
 def format_cell_ranges(worksheet, ranges):
@@ -105,8 +109,9 @@ def format_cell_ranges(worksheet, ranges):
 
     :param worksheet: The ``Worksheet`` object.
     :param ranges: An iterable whose elements are pairs of:
-        a string with range value in A1 notation, e.g. 'A1:A5',
-        and a ``CellFormat`` object).
+        a range -- a string with range value in A1 notation, e.g. 'A1:A5',
+        a tuple of 1-based numeric coordinates, e.g. ``(1, 1)`` or ``(1, 1, 5, 1)``,
+        or a ``GridRange`` object -- and a ``CellFormat`` object).
 
     """
 
@@ -121,7 +126,8 @@ def format_cell_range(worksheet, name, cell_format):
     to have the specified ``CellFormat``.
 
     :param worksheet: The ``Worksheet`` object.
-    :param name: A string with range value in A1 notation, e.g. 'A1:A5'.
+    :param name: A string with range value in A1 notation, e.g. 'A1:A5',
+                 a tuple of numeric coordinates, or a ``GridRange`` object.
     :param cell_format: A ``CellFormat`` object.
 
     """
@@ -194,3 +200,247 @@ def set_frozen(worksheet, rows=None, cols=None):
         }
     }]
 
+
+def _banded_range_props(worksheet, range, row_properties, column_properties):
+    props = {}
+    if range is not None:
+        props['range'] = _range_to_gridrange_object(range, worksheet.id)
+    if row_properties is not None:
+        props['rowProperties'] = row_properties.to_props()
+    if column_properties is not None:
+        props['columnProperties'] = column_properties.to_props()
+    return props
+
+
+def add_banding(worksheet, range, row_properties=None, column_properties=None, banded_range_id=None):
+    """Add alternating colors ("banding") to a range of the given ``Worksheet``.
+    Google Sheets applies the colors itself, so a table of any size is banded
+    with one request.
+
+    :param worksheet: The ``Worksheet`` object.
+    :param range: A string with range value in A1 notation, e.g. 'A1:D50',
+                  a tuple of 1-based numeric coordinates, or a ``GridRange`` object.
+    :param row_properties: A ``BandingProperties`` object, for bands of rows.
+    :param column_properties: A ``BandingProperties`` object, for bands of columns.
+                              At least one of ``row_properties`` and ``column_properties``
+                              is required.
+    :param banded_range_id: An optional integer id for the new banded range. If omitted,
+                            Google Sheets chooses one and returns it in the response.
+    """
+    if row_properties is None and column_properties is None:
+        raise ValueError("Must specify at least one of row_properties and column_properties")
+    props = _banded_range_props(worksheet, range, row_properties, column_properties)
+    if banded_range_id is not None:
+        props['bandedRangeId'] = banded_range_id
+    return [{'addBanding': {'bandedRange': props}}]
+
+
+def update_banding(worksheet, banded_range_id, range=None, row_properties=None, column_properties=None):
+    """Update the range or colors of an existing banded range of the given ``Worksheet``.
+    Only the given parameters are changed.
+
+    :param worksheet: The ``Worksheet`` object.
+    :param banded_range_id: The integer id of the banded range, e.g. from ``get_banded_ranges``.
+    :param range: A new range, as for ``add_banding``.
+    :param row_properties: A ``BandingProperties`` object replacing the row colors.
+    :param column_properties: A ``BandingProperties`` object replacing the column colors.
+    """
+    props = _banded_range_props(worksheet, range, row_properties, column_properties)
+    if not props:
+        raise ValueError("Must specify at least one of range, row_properties and column_properties")
+    fields = ','.join(props.keys())
+    props['bandedRangeId'] = banded_range_id
+    return [{'updateBanding': {'bandedRange': props, 'fields': fields}}]
+
+
+def delete_banding(worksheet, banded_range_id):
+    """Remove a banded range from the given ``Worksheet``.
+
+    :param worksheet: The ``Worksheet`` object.
+    :param banded_range_id: The integer id of the banded range, e.g. from ``get_banded_ranges``.
+    """
+    return [{'deleteBanding': {'bandedRangeId': banded_range_id}}]
+
+
+def copy_format(worksheet, source_range, dest_ranges, source_worksheet=None):
+    """Copy the formatting (and data validation rules, but not the values) of a range
+    to other ranges of the given ``Worksheet``. Google Sheets copies the formats itself,
+    so each destination costs one small request, however complex the formats are.
+
+    :param worksheet: The ``Worksheet`` object holding the destination ranges.
+    :param source_range: The range to copy from: a string in A1 notation, e.g. 'A1:D5',
+                         a tuple of 1-based numeric coordinates, or a ``GridRange`` object.
+    :param dest_ranges: An iterable of ranges to copy to, or a single range. If a destination
+                        is a multiple of the source's height or width, the source is repeated
+                        to fill it; otherwise the whole source is pasted from its top-left
+                        cell, possibly extending beyond it.
+    :param source_worksheet: The ``Worksheet`` holding ``source_range``, if not ``worksheet``.
+                             It must belong to the same spreadsheet.
+    """
+    if source_worksheet is None:
+        source_worksheet = worksheet
+    elif not _same_spreadsheet(source_worksheet.spreadsheet, worksheet.spreadsheet):
+        raise ValueError(
+            "Worksheet %r belongs to spreadsheet %r, not %r"
+            % (source_worksheet, source_worksheet.spreadsheet, worksheet.spreadsheet)
+        )
+    if isinstance(dest_ranges, str) or hasattr(dest_ranges, 'to_props') or (
+        isinstance(dest_ranges, (tuple, list)) and dest_ranges and all(
+            v is None or (isinstance(v, int) and not isinstance(v, bool)) for v in dest_ranges
+        )
+    ):
+        dest_ranges = [dest_ranges]
+    source = _range_to_gridrange_object(source_range, source_worksheet.id)
+    requests = [
+        {
+            'copyPaste': {
+                'source': source,
+                'destination': _range_to_gridrange_object(dest_range, worksheet.id),
+                'pasteType': 'PASTE_FORMAT',
+                'pasteOrientation': 'NORMAL'
+            }
+        }
+        for dest_range in dest_ranges
+    ]
+    if not requests:
+        raise ValueError("Must specify at least one destination range")
+    return requests
+
+
+def _same_spreadsheet(a, b):
+    # gspread opens a new Spreadsheet object for each open_by_key() call
+    a_id, b_id = getattr(a, 'id', None), getattr(b, 'id', None)
+    return a is b or (a_id is not None and a_id == b_id)
+
+
+def update_borders(worksheet, range, top=None, bottom=None, left=None, right=None,
+                   inner_horizontal=None, inner_vertical=None):
+    """Draw borders around and inside a range of the given ``Worksheet``, with one request.
+    Unlike the ``borders`` of a ``CellFormat``, sides not given are left unchanged.
+
+    :param worksheet: The ``Worksheet`` object.
+    :param range: A string with range value in A1 notation, e.g. 'A1:D5',
+                  a tuple of 1-based numeric coordinates, or a ``GridRange`` object.
+    :param top: A ``Border`` object for the top edge of the range, or None.
+    :param bottom: A ``Border`` for the bottom edge, or None.
+    :param left: A ``Border`` for the left edge, or None.
+    :param right: A ``Border`` for the right edge, or None.
+    :param inner_horizontal: A ``Border`` for the lines between the range's rows, or None.
+    :param inner_vertical: A ``Border`` for the lines between the range's columns, or None.
+
+    A ``Border`` with style ``NONE`` erases that side.
+    """
+    sides = dict(
+        (key, border.to_props()) for key, border in (
+            ('top', top), ('bottom', bottom), ('left', left), ('right', right),
+            ('innerHorizontal', inner_horizontal), ('innerVertical', inner_vertical)
+        )
+        if border is not None
+    )
+    if not sides:
+        raise ValueError("Must specify at least one of top, bottom, left, right, inner_horizontal and inner_vertical")
+    sides['range'] = _range_to_gridrange_object(range, worksheet.id)
+    return [{'updateBorders': sides}]
+
+
+def _border_edges(worksheet, ranges):
+    """The border of each cell edge set by ``(range, Borders)`` pairs, as two dicts keyed by
+    ``(boundary row, column)`` and ``(boundary column, row)``, holding the borders' ``_props_key``."""
+    horizontal, vertical = {}, {}
+    for cell_range, borders in ranges:
+        gridrange = _range_to_gridrange_object(cell_range, worksheet.id)
+        if gridrange.get('endRowIndex') is None or gridrange.get('endColumnIndex') is None:
+            raise ValueError("Cell borders need bounded ranges, not %r" % (cell_range,))
+        r0, r1 = gridrange.get('startRowIndex', 0), gridrange['endRowIndex']
+        c0, c1 = gridrange.get('startColumnIndex', 0), gridrange['endColumnIndex']
+        for border, edges, row_offset, col_offset in (
+            (borders.top, horizontal, 0, 0), (borders.bottom, horizontal, 1, 0),
+            (borders.left, vertical, 0, 0), (borders.right, vertical, 0, 1)
+        ):
+            if border is None:
+                continue
+            key = _props_key(border.to_props())
+            for r in range(r0 + row_offset, r1 + row_offset):
+                for c in range(c0 + col_offset, c1 + col_offset):
+                    edges[(r, c) if edges is horizontal else (c, r)] = key
+    return horizontal, vertical
+
+def _edge_blocks(edges):
+    """
+    Groups edges, keyed by ``(boundary, position along it)``, into blocks that one
+    ``updateBorders`` request can draw: consecutive boundaries over the same span, the
+    first and last of any border, and those between them all of one border.
+    Yields ``(first boundary, last boundary, span start, span end, borders)``.
+    """
+    # maximal runs of one border along each boundary, grouped by their span
+    by_boundary = {}
+    for boundary, position in edges:
+        by_boundary.setdefault(boundary, []).append(position)
+    by_span = {}
+    for boundary in sorted(by_boundary):
+        positions = sorted(by_boundary[boundary])
+        start = positions[0]
+        for prev, pos in zip(positions, positions[1:] + [None]):
+            if pos != prev + 1 or edges[boundary, pos] != edges[boundary, prev]:
+                by_span.setdefault((start, prev + 1), []).append((boundary, edges[boundary, prev]))
+                start = pos
+    for (start, end), boundaries in sorted(by_span.items()):
+        block = []
+        for boundary, key in boundaries:
+            if block and (
+                boundary != block[-1][0] + 1 or (len(block) > 2 and block[-1][1] != block[1][1])
+            ):
+                yield block[0][0], block[-1][0], start, end, [k for b, k in block]
+                block = []
+            block.append((boundary, key))
+        yield block[0][0], block[-1][0], start, end, [k for b, k in block]
+
+def _block_sides(first, last, keys, before, after, inner):
+    """The cell indexes spanned by a block of boundaries, and the sides drawing it."""
+    if first == last:
+        # a lone line: the edge after the cell before it, or before the first cell
+        return ((first - 1, first), {after: keys[0]}) if first else ((0, 1), {before: keys[0]})
+    sides = {before: keys[0], after: keys[-1]}
+    if len(keys) > 2:
+        sides[inner] = keys[1]
+    return (first, last), sides
+
+def update_cell_borders(worksheet, ranges):
+    """Set the borders of the cells of ranges of the given ``Worksheet``, as the ``borders``
+    of a ``CellFormat`` would, but with as few ``updateBorders`` requests as can be found,
+    each drawing lines around and across a rectangle, and without changing other formatting.
+
+    :param worksheet: The ``Worksheet`` object.
+    :param ranges: An iterable whose elements are pairs of a range (a string in A1 notation,
+                   a tuple of 1-based numeric coordinates, or a bounded ``GridRange`` object)
+                   and a ``Borders`` object, whose sides are given to every cell of the range.
+
+    The bottom of one cell is the top of the cell below it (and the right side of a cell,
+    the left side of the next): where they differ, the later range wins, and within a range,
+    the bottom and right sides win.
+    """
+    horizontal, vertical = _border_edges(worksheet, ranges)
+    rects = {}
+    for first, last, start, end, keys in _edge_blocks(horizontal):
+        rows, sides = _block_sides(first, last, keys, 'top', 'bottom', 'innerHorizontal')
+        rects.setdefault((rows, (start, end)), []).append(sides)
+    for first, last, start, end, keys in _edge_blocks(vertical):
+        cols, sides = _block_sides(first, last, keys, 'left', 'right', 'innerVertical')
+        found = rects.setdefault(((start, end), cols), [])
+        # a rectangle's horizontal and vertical lines share one request
+        for other in found:
+            if not set(other) & set(sides):
+                other.update(sides)
+                break
+        else:
+            found.append(sides)
+    requests = []
+    for ((r0, r1), (c0, c1)), all_sides in sorted(rects.items()):
+        for sides in all_sides:
+            body = dict((side, json.loads(key)) for side, key in sides.items())
+            body['range'] = {
+                'sheetId': worksheet.id,
+                'startRowIndex': r0, 'endRowIndex': r1, 'startColumnIndex': c0, 'endColumnIndex': c1
+            }
+            requests.append({'updateBorders': body})
+    return requests
@@ -1,16 +1,23 @@
 # -*- coding: utf-8 -*-
 
-from .util import _parse_string_enum, _underlower, _enforce_type
+from .util import _parse_string_enum, _underlower, _enforce_type, _make_worksheet
 from .models import FormattingComponent, GridRange, _CLASSES
+from .ranges import GridRangeIndex, coalesce_ranges
+from .instrumentation import _span, _batch_update, _fetch_sheet_metadata
+
+from bisect import bisect_left
+import json
 
 try:
-    from collections.abc import MutableSequence, Iterable
+    from collections.abc import MutableSequence, Iterable, Mapping
 except ImportError:
-    from collections import MutableSequence, Iterable
+    from collections import MutableSequence, Iterable, Mapping
 
 
 def get_conditional_format_rules(worksheet):
-    resp = worksheet.spreadsheet.fetch_sheet_metadata()
+    resp = _fetch_sheet_metadata(worksheet.spreadsheet, {
+        'fields': 'sheets(properties.sheetId,conditionalFormats)'
+    }, 'get_conditional_format_rules')
     rules = []
     for sheet in resp['sheets']:
         if sheet['properties']['sheetId'] == worksheet.id:
@@ -18,6 +25,25 @@ def get_conditional_format_rules(worksheet):
             break
     return ConditionalFormatRules(worksheet, rules)
 
+def get_all_conditional_format_rules(spreadsheet):
+    """Fetches the conditional format rules of every worksheet in the spreadsheet
+    with a single API call.
+
+    :param spreadsheet: The ``Spreadsheet`` object.
+
+    :return: A ``SpreadsheetConditionalFormatRules`` object, mapping each worksheet's
+             id (or the ``Worksheet`` itself) to its ``ConditionalFormatRules``.
+    """
+    resp = _fetch_sheet_metadata(spreadsheet, {
+        'fields': 'sheets(properties,conditionalFormats)'
+    }, 'get_all_conditional_format_rules')
+    by_sheet = []
+    for sheet in resp['sheets']:
+        worksheet = _make_worksheet(spreadsheet, sheet['properties'])
+        rules = [ ConditionalFormatRule.from_props(p) for p in sheet.get('conditionalFormats', []) ]
+        by_sheet.append(ConditionalFormatRules(worksheet, rules))
+    return SpreadsheetConditionalFormatRules(spreadsheet, by_sheet)
+
 def _make_delete_rule_request(worksheet, rule, ruleIndex):
    return {
        'deleteConditionalFormatRule': {
@@ -34,13 +60,162 @@ def _make_add_rule_request(worksheet, rule, ruleIndex):
        }
    }
 
+def _make_update_rule_request(worksheet, rule, ruleIndex):
+   return {
+       'updateConditionalFormatRule': {
+           'sheetId': worksheet.id,
+           'index': ruleIndex,
+           'rule': rule.to_props()
+       }
+   }
+
+def _make_move_rule_request(worksheet, ruleIndex, newIndex):
+   return {
+       'updateConditionalFormatRule': {
+           'sheetId': worksheet.id,
+           'index': ruleIndex,
+           'newIndex': newIndex
+       }
+   }
+
+def _rule_key(rule):
+    # structural identity of a rule, immune to later in-place mutation of the rule object
+    return json.dumps(rule.to_props(), sort_keys=True)
+
+def _longest_increasing_subsequence(seq):
+    """Returns the set of positions in ``seq`` forming a longest strictly increasing subsequence."""
+    tails = []
+    tail_positions = []
+    predecessors = [None] * len(seq)
+    for pos, value in enumerate(seq):
+        i = bisect_left(tails, value)
+        if i == len(tails):
+            tails.append(value)
+            tail_positions.append(pos)
+        else:
+            tails[i] = value
+            tail_positions[i] = pos
+        predecessors[pos] = tail_positions[i - 1] if i > 0 else None
+    rv = set()
+    pos = tail_positions[-1] if tail_positions else None
+    while pos is not None:
+        rv.add(pos)
+        pos = predecessors[pos]
+    return rv
+
+def _rules_edit_script(worksheet, original_keys, rules):
+    """
+    Computes the requests that turn the rule list whose structural keys are ``original_keys``
+    into ``rules``. Unchanged rules are matched by key; unmatched original rules are
+    replaced in place by unmatched new rules where possible, and otherwise deleted; 
+    only rules outside a longest increasing subsequence of matched positions are moved;
+    remaining new rules are added at their final positions.
+    """
+    new_keys = [_rule_key(r) for r in rules]
+    unmatched_originals = {}
+    for idx, key in enumerate(original_keys):
+        unmatched_originals.setdefault(key, []).append(idx)
+    # target[original index] = index in new rules list
+    target = {}
+    added = []
+    for new_idx, key in enumerate(new_keys):
+        candidates = unmatched_originals.get(key)
+        if candidates:
+            target[candidates.pop(0)] = new_idx
+        else:
+            added.append(new_idx)
+    removed = sorted(idx for idxs in unmatched_originals.values() for idx in idxs)
+
+    requests = []
+    # replace rules in place, which costs one request instead of a delete plus an add
+    for orig_idx, new_idx in zip(removed, added):
+        requests.append(_make_update_rule_request(worksheet, rules[new_idx], orig_idx))
+        target[orig_idx] = new_idx
+    deleted = removed[len(added):]
+    added = added[len(removed):]
+    for orig_idx in reversed(deleted):
+        requests.append(_make_delete_rule_request(worksheet, None, orig_idx))
+
+    # current holds, in server order, the new-list index of each rule on the server
+    current = [target[idx] for idx in range(len(original_keys)) if idx in target]
+    stationary = set(current[pos] for pos in _longest_increasing_subsequence(current))
+    added = set(added)
+    for new_idx in range(len(rules)):
+        if new_idx in stationary:
+            continue
+        # place this rule immediately after its predecessor in the new list
+        if new_idx in added:
+            dest = current.index(new_idx - 1) + 1 if new_idx > 0 else 0
+            current.insert(dest, new_idx)
+            requests.append(_make_add_rule_request(worksheet, rules[new_idx], dest))
+        else:
+            src = current.index(new_idx)
+            del current[src]
+            dest = current.index(new_idx - 1) + 1 if new_idx > 0 else 0
+            current.insert(dest, new_idx)
+            if dest != src:
+                requests.append(_make_move_rule_request(worksheet, src, dest))
+    return requests
+
+def _is_mergeable(rule):
+    # A formula's relative references are anchored at the first range's top-left cell, 
+    # whether it is a custom formula or a condition value such as '=B1', and 
+    # MIN/MAX/PERCENT/PERCENTILE gradient points are computed over all of a rule's cells, 
+    # so changing the ranges of such rules would change their meaning.
+    if rule.booleanRule is not None:
+        condition = rule.booleanRule.condition
+        return condition.type != 'CUSTOM_FORMULA' and not any(
+            _is_formula(v.userEnteredValue) for v in condition.values
+        )
+    points = (rule.gradientRule.minpoint, rule.gradientRule.midpoint, rule.gradientRule.maxpoint)
+    return all(p.type == 'NUMBER' and not _is_formula(p.value) for p in points if p is not None)
+
+def _is_formula(value):
+    return isinstance(value, str) and value.startswith('=')
+
+def _consolidate_rules(rules):
+    """
+    Merges rules having identical condition and format into a single rule with coalesced ranges.
+    A rule is merged into the most recent earlier rule of the same content only if no rule
+    positioned between them overlaps its ranges, so every cell is still governed by the
+    same first-matching rule as before.
+    """
+    groups = []
+    latest_group_for_key = {}
+    index = GridRangeIndex()
+    for rule in rules:
+        key = None
+        if _is_mergeable(rule):
+            props = rule.to_props()
+            del props['ranges']
+            key = json.dumps(props, sort_keys=True)
+        pos = latest_group_for_key.get(key)
+        if pos is not None and not any(
+            p > pos for gr in rule.ranges for p in index.query_range(gr)
+        ):
+            groups[pos][1].extend(rule.ranges)
+        else:
+            pos = len(groups)
+            groups.append((rule, list(rule.ranges)))
+            if key is not None:
+                latest_group_for_key[key] = pos
+        for gr in rule.ranges:
+            index.add(gr, pos)
+    consolidated = []
+    for rule, ranges in groups:
+        if len(ranges) > len(rule.ranges):
+            rule = ConditionalFormatRule.from_props(rule.to_props())
+            rule.ranges = coalesce_ranges(ranges)
+        consolidated.append(rule)
+    return consolidated
+
 class ConditionalFormatRules(MutableSequence):
     def __init__(self, worksheet, *rules):
         self.worksheet = worksheet
         if len(rules) == 1 and isinstance(rules[0], Iterable):
             rules = rules[0]
         self.rules = list(rules)
-        self._original_rules = list(rules)
+        self._original_keys = [_rule_key(r) for r in self.rules]
 
     def __getitem__(self, idx):
         return self.rules[idx]
@@ -61,27 +236,76 @@ class ConditionalFormatRules(MutableSequence):
     def insert(self, idx, value):
         return self.rules.insert(idx, _enforce_type('rule', ConditionalFormatRule, value, True))
 
+    def consolidate(self):
+        """
+        Merges rules that differ only in their ranges into single rules, wherever doing
+        so does not change which rule applies to any cell. Custom-formula rules and
+        gradient rules with MIN, MAX, PERCENT or PERCENTILE points are never merged.
+        As with other changes, call ``save()`` to store the result.
+        """
+        self.rules = _consolidate_rules(self.rules)
+
+    def _save_requests(self):
+        return _rules_edit_script(self.worksheet, self._original_keys, self.rules)
+
+    def _mark_saved(self):
+        self._original_keys = [_rule_key(r) for r in self.rules]
+
     def save(self):
-        # ideally, we would determine the longest "increasing" subsequence
-        # between the original and new rule lists, then determine the add/upd/del
-        # operations to position the remaining items.
-        # But until I implement that correctly, we are just going to delete all rules
-        # and re-add them.
-        delete_requests = [ 
-            _make_delete_rule_request(self.worksheet, r, idx) for idx, r in enumerate(self._original_rules) 
-        ]
-        # want to delete from highest index to lowest...
-        delete_requests.reverse()
-        add_requests = [ 
-            _make_add_rule_request(self.worksheet, r, idx) for idx, r in enumerate(self.rules) 
-        ]
-        if not delete_requests and not add_requests:
-            return
-        body = {
-            'requests': delete_requests + add_requests
-        }
-        resp = self.worksheet.spreadsheet.batch_update(body)
-        self._original_rules = list(self.rules)
+        """
+        Stores changes made to the rules since they were fetched (or last saved),
+        sending only the requests needed to add, delete, replace and move rules.
+        Returns the API response, or None if there were no changes to store.
+        """
+        with _span('build', operation='ConditionalFormatRules.save'):
+            requests = self._save_requests()
+        if not requests:
+            return None
+        resp = _batch_update(self.worksheet.spreadsheet, {'requests': requests}, 'ConditionalFormatRules.save')
+        self._mark_saved()
+        return resp
+
+
+class SpreadsheetConditionalFormatRules(Mapping):
+    """
+    The ``ConditionalFormatRules`` of several worksheets of one spreadsheet, keyed by
+    worksheet id. A ``Worksheet`` object may also be used as a key. Calling ``save()``
+    stores the changes to all worksheets' rules in a single API call.
+    """
+    def __init__(self, spreadsheet, rules_by_sheet):
+        self.spreadsheet = spreadsheet
+        self._rules = {}
+        for rules in rules_by_sheet:
+            if rules.worksheet.spreadsheet != spreadsheet:
+                raise ValueError(
+                    "Worksheet %r belongs to spreadsheet %r, not %r" 
+                    % (rules.worksheet, rules.worksheet.spreadsheet, spreadsheet)
+                )
+            self._rules[rules.worksheet.id] = rules
+
+    def __getitem__(self, key):
+        return self._rules[getattr(key, 'id', key)]
+
+    def __iter__(self):
+        return iter(self._rules)
+
+    def __len__(self):
+        return len(self._rules)
+
+    def save(self):
+        """
+        Stores the changes made to every worksheet's rules, using one API call.
+        Returns the API response, or None if there were no changes to store.
+        """
+        requests = []
+        with _span('build', operation='SpreadsheetConditionalFormatRules.save'):
+            for rules in self._rules.values():
+                requests.extend(rules._save_requests())
+        if not requests:
+            return None
+        resp = _batch_update(self.spreadsheet, {'requests': requests}, 'SpreadsheetConditionalFormatRules.save')
+        for rules in self._rules.values():
+            rules._mark_saved()
         return resp
 
 
@@ -5,42 +5,141 @@ try:
 except ImportError:
     from itertools import izip_longest as zip_longest
 
-from gspread_formatting.batch_update_requests import format_cell_ranges, set_frozen
-from gspread_formatting.models import cellFormat, numberFormat, Color, textFormat
-
-from gspread.utils import rowcol_to_a1
+from gspread_formatting.batch_update_requests import format_cell_ranges, set_frozen, add_banding, update_banding
+from gspread_formatting.functions import get_banded_ranges
+from gspread_formatting.models import cellFormat, numberFormat, Color, textFormat, GridRange
+from gspread_formatting.conditionals import ConditionalFormatRule, BooleanRule, GradientRule, \
+    get_conditional_format_rules, _consolidate_rules, _rule_key, _rules_edit_script
+from gspread_formatting.util import _range_to_gridrange_object, _convert_to_properties, \
+    _affected_fields_for, _props_key
+from gspread_formatting.arrow import _as_frame
+from gspread_formatting.ranges import GridRangeIndex, coalesce_ranges
+from gspread_formatting.instrumentation import _span, _batch_update
 
+from collections import OrderedDict
 from functools import wraps
+import threading
+import datetime
+import numbers
+import re
 
 __all__ = (
     'format_with_dataframe', 
+    'format_with_dataframes', 
+    'iter_format_with_dataframe', 
+    'FormattingPlanCache', 
     'DataFrameFormatter', 
     'BasicFormatter', 
+    'ConditionalFormatter', 
+    'ColumnTypeInference', 
     'DEFAULT_FORMATTER', 
     'DEFAULT_HEADER_BACKGROUND_COLOR'
 )
 
 DEFAULT_HEADER_BACKGROUND_COLOR = Color(0.8980392, 0.8980392, 0.8980392)
+DEFAULT_CHUNK_SIZE = 1000
+DEFAULT_PLAN_CACHE_SIZE = 128
+DEFAULT_INFERENCE_SAMPLE_SIZE = 200
+DEFAULT_INFERENCE_EDGE_SIZE = 10
 
 def _determine_index_or_columns_size(obj):
     if hasattr(obj, 'levshape'):
         return len(obj.levshape)
     return 1
         
+def _requests_for_ranges(worksheet, formatting_ranges):
+    formatting_ranges = [ r for r in formatting_ranges if r[1] and r[1].to_props() ]
+    return format_cell_ranges(worksheet, formatting_ranges) if formatting_ranges else []
+
+def _compile_conditional_rules(worksheet, column_rules, first_row, last_row):
+    """
+    Compiles the ``(col_number, rules)`` pairs returned by ``conditional_rules_for_column``
+    into ``ConditionalFormatRule`` objects over the data cells of each column, in declared
+    order, merging rules that are equal across columns.
+    """
+    if first_row > last_row:
+        return []
+    rules = []
+    for col_number, column_rules in column_rules:
+        gridrange = GridRange.from_props(
+            _range_to_gridrange_object((first_row, col_number, last_row, col_number), worksheet.id)
+        )
+        for rule in column_rules:
+            if isinstance(rule, BooleanRule):
+                rules.append(ConditionalFormatRule(ranges=[gridrange], booleanRule=rule))
+            elif isinstance(rule, GradientRule):
+                rules.append(ConditionalFormatRule(ranges=[gridrange], gradientRule=rule))
+            else:
+                raise ValueError("conditional rule must be instance of: %s or %s" % (BooleanRule, GradientRule))
+    return _consolidate_rules(rules)
+
+def _conditional_rule_requests(worksheet, current_rules, rules):
+    """
+    The requests placing the compiled ``rules`` first among the worksheet's rules,
+    ``current_rules`` (a ``ConditionalFormatRules``), which are updated to match. If the
+    compiled rules are already among the current rules, in order, nothing changes, so
+    formatting the same area twice leaves the worksheet's rules as they were; otherwise
+    current rules equal to a compiled rule are moved rather than added again.
+    """
+    current_keys = [_rule_key(rule) for rule in current_rules]
+    new_keys = [_rule_key(rule) for rule in rules]
+    if _contains_run(current_keys, new_keys):
+        return []
+    keys = set(new_keys)
+    desired = list(rules) + [rule for rule, key in zip(current_rules, current_keys) if key not in keys]
+    return _replace_rules(worksheet, current_rules, desired)
+
+def _extended_rule_requests(worksheet, current_rules, old_rules, new_rules):
+    """
+    The requests replacing the rules compiled for the rows formatted before, ``old_rules``,
+    with those compiled for all rows, ``new_rules``, among the worksheet's rules
+    ``current_rules``, which are updated to match. The earlier rules are found by their
+    content, wherever they now are; if the new rules are already there, nothing changes.
+    """
+    current_keys = [_rule_key(rule) for rule in current_rules]
+    if _contains_run(current_keys, [_rule_key(rule) for rule in new_rules]):
+        return []
+    positions = {}
+    for idx, key in enumerate(current_keys):
+        positions.setdefault(key, []).append(idx)
+    desired = list(current_rules)
+    for old_rule, new_rule in zip(old_rules, new_rules):
+        candidates = positions.get(_rule_key(old_rule))
+        if not candidates:
+            raise ValueError(
+                "Worksheet %r has no conditional format rule %r, as added when the formatted "
+                "rows were formatted" % (worksheet.title, old_rule.to_props())
+            )
+        desired[candidates.pop(0)] = new_rule
+    return _replace_rules(worksheet, current_rules, desired)
+
+def _contains_run(keys, run):
+    return any(keys[start:start + len(run)] == run for start in range(len(keys) - len(run) + 1))
+
+def _replace_rules(worksheet, current_rules, rules):
+    requests = _rules_edit_script(worksheet, current_rules._original_keys, rules)
+    current_rules.rules = rules
+    current_rules._mark_saved()
+    return requests
+
 def _format_with_dataframe(worksheet,
                           dataframe,
                           formatter=None,
                           row=1,
                           col=1,
                           include_index=False,
-                          include_column_header=True):
+                          include_column_header=True,
+                          formatted_rows=0,
+                          plan_cache=None,
+                          conditional_rules=None):
     """
     Modifies the cell formatting of an area of the provided Worksheet, using
     the provided DataFrame to determine the area to be formatted and the formats
     to be used.
 
     :param worksheet: the gspread worksheet to set with content of DataFrame.
-    :param dataframe: the DataFrame.
+    :param dataframe: the DataFrame; or a ``pyarrow.Table`` or ``polars.DataFrame``, which
+                      formatters then receive as an ``ArrowFrame``.
     :param formatter: an optional instance of ``DataFrameFormatter`` class, which
                       will examine the contents of the DataFrame and
                       assemble a set of ``gspread_formatter`` operations
@@ -55,122 +154,643 @@ def _format_with_dataframe(worksheet,
             additional column when performing formatting. Defaults to False.
     :param include_column_header: if True, format a header row before data.
             Defaults to True.
+    :param formatted_rows: the number of leading data rows of the DataFrame already formatted
+            by an earlier call with the same arguments, e.g. before rows were appended. Only
+            the rows after them, and earlier rows whose ``format_for_data_row`` result has
+            changed, are then formatted; column formats, banding and conditional rules are
+            extended to the new rows, and the header and freezing are left as they are.
+            The banding and rules added by the earlier call are looked up in the worksheet
+            by their range and content; a ``ValueError`` is raised if they are missing.
+            Defaults to 0.
+    :param plan_cache: an optional ``FormattingPlanCache``, which reuses the column,
+            header and freeze formats computed for an earlier DataFrame of the same
+            schema formatted with the same formatter.
+    :param conditional_rules: the worksheet's ``ConditionalFormatRules``, as returned by
+            ``get_conditional_format_rules``, against which the formatter's conditional
+            rules are placed; they are updated to include them. Fetched if the formatter
+            declares conditional rules and none are given.
+    """
+    requests = []
+    for batch in iter_format_with_dataframe(
+        worksheet, dataframe, formatter, row, col, include_index, include_column_header,
+        formatted_rows=formatted_rows, plan_cache=plan_cache, conditional_rules=conditional_rules
+    ):
+        requests.extend(batch)
+    return requests
+
+def iter_format_with_dataframe(worksheet,
+                               dataframe,
+                               formatter=None,
+                               row=1,
+                               col=1,
+                               include_index=False,
+                               include_column_header=True,
+                               chunk_size=DEFAULT_CHUNK_SIZE,
+                               plan_cache=None,
+                               formatted_rows=0,
+                               conditional_rules=None):
+    """
+    Generates the formatting requests of ``format_with_dataframe`` in batches, walking
+    the DataFrame ``chunk_size`` rows at a time so that neither the DataFrame's values
+    nor the full request list are ever held in memory at once. Each yielded batch is a
+    list of requests (possibly empty) that can be sent in its own API call, e.g. via
+    ``SpreadsheetBatchUpdater.format_with_dataframe_in_chunks``.
+
+    Parameters are as for ``format_with_dataframe``, plus:
+
+    :param chunk_size: number of DataFrame rows formatted per batch. Defaults to 1000.
+    :param plan_cache: as for ``format_with_dataframe``.
+    :param formatted_rows: as for ``format_with_dataframe``.
+    :param conditional_rules: as for ``format_with_dataframe``.
     """
     if not formatter:
         formatter = DEFAULT_FORMATTER
+    if chunk_size < 1:
+        raise ValueError("chunk_size must be a positive number of rows")
+    dataframe = _as_frame(dataframe)
 
-    formatting_ranges = []
+    if plan_cache is not None:
+        plan = plan_cache._plan_for(dataframe, formatter, row, col, include_index, include_column_header)
+    else:
+        plan = _FormattingPlan(dataframe, formatter, row, col, include_index, include_column_header)
+    index_column_size = plan.index_column_size
+    freeze_args = plan.freeze_args
 
-    columns = [ dataframe[c] for c in dataframe.columns ]
-    index_column_size = _determine_index_or_columns_size(dataframe.index)
-    column_header_size = _determine_index_or_columns_size(dataframe.columns)
+    if not 0 <= formatted_rows <= dataframe.shape[0]:
+        raise ValueError("formatted_rows must be between 0 and the number of rows in the DataFrame")
+    if plan.conditional_rules and conditional_rules is None and dataframe.shape[0] > formatted_rows:
+        conditional_rules = get_conditional_format_rules(worksheet)
+    if formatted_rows:
+        banded_ranges = ()
+        if plan.banding is not None and dataframe.shape[0] > formatted_rows:
+            banded_ranges = get_banded_ranges(worksheet)
+        yield plan.extension_requests(
+            worksheet, row, formatted_rows, dataframe.shape[0], conditional_rules, banded_ranges
+        )
+        freeze_args = {}
+    else:
+        yield plan.requests(worksheet, row, dataframe.shape[0], conditional_rules)
+    row += plan.header_rows
 
-    if include_index:
-        # allow for multi-index index
-        if index_column_size > 1:
-            reset_df = dataframe.reset_index()
-            index_elts = [ reset_df[c] for c in list(reset_df.columns)[:index_column_size] ]
-        else:
-            index_elts = [ dataframe.index ]
-        columns = index_elts + columns
+    cell_formats = formatter.format_for_cells(dataframe)
+    data_col = col + (index_column_size if include_index else 0)
+    if cell_formats is not None:
+        formatting_ranges = _format_id_grid_to_ranges(dataframe, cell_formats, row, data_col, formatted_rows)
+        for start in range(0, len(formatting_ranges), chunk_size):
+            yield _requests_for_ranges(worksheet, formatting_ranges[start:start + chunk_size])
 
-    for idx, column in enumerate(columns):
-        column_fmt = formatter.format_for_column(column, col + idx, dataframe)
-        if not column_fmt or not column_fmt.to_props():
-            continue
-        range = '{}:{}'.format(
-            rowcol_to_a1(row, col + idx), 
-            rowcol_to_a1(row + dataframe.shape[0], col + idx)
+    # unless cells or rows are formatted individually, there is no need to visit each row
+    data_rows = dataframe.shape[0]
+    if cell_formats is not None and type(formatter).format_for_data_row is BasicFormatter.format_for_data_row:
+        data_rows = 0
+
+    # when appending, existing rows are compared with their formats in the DataFrame as it was
+    previous = dataframe.iloc[:formatted_rows] if formatted_rows else None
+    vector_ids = None
+    if previous is not None and cell_formats is not None and cell_formats[0] is not None and len(cell_formats[1]):
+        import numpy as np
+        vector_ids = np.asarray(cell_formats[0])
+
+    # consecutive rows with equal formats are formatted as one range, which may span chunks
+    row_run = None
+    for chunk_start in range(0, data_rows, chunk_size):
+        # only this chunk's values are copied out of the DataFrame
+        chunk = dataframe.iloc[chunk_start:chunk_start + chunk_size]
+        palette = _FormatPalette()
+        row_palette = _FormatPalette()
+        cell_ids = []
+        row_ranges = []
+        changed_rows = []
+        for y_idx, (value_row, index_value) in enumerate(zip_longest(chunk.values, chunk.index), chunk_start):
+            if include_index:
+                if index_column_size > 1:
+                    index_values = list(index_value)
+                else:
+                    index_values = [index_value]
+                value_row = index_values + list(value_row)
+            existing = y_idx < formatted_rows
+            if existing:
+                # an existing row is formatted again only if its row format has changed
+                row_fmt = formatter.format_for_data_row(value_row, y_idx+row, dataframe)
+                previous_fmt = formatter.format_for_data_row(value_row, y_idx+row, previous)
+                if row_palette.id_for(row_fmt) == row_palette.id_for(previous_fmt):
+                    if cell_formats is None or vector_ids is not None:
+                        cell_ids.append([-1] * len(value_row))
+                    if row_run is not None:
+                        row_ranges.append(_row_run_to_range(row_run, row, col, dataframe))
+                        row_run = None
+                    continue
+                changed_rows.append((y_idx, previous_fmt))
+            if cell_formats is None:
+                cell_ids.append([
+                    palette.id_for(formatter.format_for_cell(cell_value, y_idx+row, x_idx+col, dataframe))
+                    for x_idx, cell_value in enumerate(value_row)
+                ])
+            elif vector_ids is not None:
+                # the cell formats of new rows were formatted above
+                cell_ids.append([-1] * (data_col - col) + [
+                    palette.id_for(cell_formats[1][fmt_id]) if existing and fmt_id >= 0 else -1
+                    for fmt_id in vector_ids[y_idx].tolist()
+                ])
+            if not existing:
+                row_fmt = formatter.format_for_data_row(value_row, y_idx+row, dataframe)
+            if row_run is not None and row_fmt is not None and row_run[1] == y_idx - 1 \
+                    and (row_fmt is row_run[2] or row_fmt == row_run[2]):
+                row_run[1] = y_idx
+                continue
+            if row_run is not None:
+                row_ranges.append(_row_run_to_range(row_run, row, col, dataframe))
+            row_run = [y_idx, y_idx, row_fmt] if row_fmt else None
+        formatting_ranges = _merge_column_runs(
+            (_runs_in_column([ids[x_idx] for ids in cell_ids]) for x_idx in range(len(cell_ids[0]) if cell_ids else 0)),
+            palette.formats, row + chunk_start, col
         )
-        formatting_ranges.append( (range, column_fmt) )
+        # changed rows are reset and given their column formats again, then cell formats are
+        # applied, then row formats, which override them
+        yield _changed_row_requests(worksheet, plan, changed_rows, row, col, dataframe) + \
+            _requests_for_ranges(worksheet, formatting_ranges + row_ranges)
+
+    if row_run is not None:
+        yield _requests_for_ranges(worksheet, [_row_run_to_range(row_run, row, col, dataframe)])
+
+    if freeze_args:
+        yield set_frozen(worksheet, **freeze_args)
+
+class _FormattingPlan(object):
+    """
+    The formats that depend only on a DataFrame's schema and the formatter: column and
+    header formats, freezing, banding, and declared conditional rules. ``requests`` places
+    them for a given first row and number of data rows.
+    """
+    def __init__(self, dataframe, formatter, row, col, include_index, include_column_header):
+        # (first col, last col, spans data rows, last row offset, cell, fields) per format
+        self._templates = []
+        self.conditional_rules = []
+        self.freeze_args = {}
+        self.header_rows = 0
+        self.banding = None
+
+        columns = [ dataframe[c] for c in dataframe.columns ]
+        self.index_column_size = index_column_size = _determine_index_or_columns_size(dataframe.index)
+        column_header_size = _determine_index_or_columns_size(dataframe.columns)
 
-    freeze_args = {}
-    if include_column_header:
-        # TODO allow for multi-index columns object
-        elts = list(dataframe.columns)
         if include_index:
             # allow for multi-index index
             if index_column_size > 1:
-                index_names = list(dataframe.index.names)
+                reset_df = dataframe.reset_index()
+                index_elts = [ reset_df[c] for c in list(reset_df.columns)[:index_column_size] ]
             else:
-                index_names = [ dataframe.index.name ]
-            elts = index_names + elts
-            header_fmt = formatter.format_for_header(dataframe.index, dataframe)
-            if header_fmt:
-                formatting_ranges.append( 
-                    (
-                        '{}:{}'.format(
-                            rowcol_to_a1(row, col), 
-                            rowcol_to_a1(row + dataframe.shape[0], col + index_column_size - 1)
-                        ), 
-                        header_fmt
+                index_elts = [ dataframe.index ]
+            columns = index_elts + columns
+
+        for idx, column in enumerate(columns):
+            column_rules = formatter.conditional_rules_for_column(column, col + idx, dataframe)
+            if column_rules:
+                self.conditional_rules.append( (col + idx, column_rules) )
+            column_fmt = formatter.format_for_column(column, col + idx, dataframe)
+            self._add(col + idx, col + idx, True, 0, column_fmt)
+
+        if include_column_header:
+            # TODO allow for multi-index columns object
+            elts = list(dataframe.columns)
+            if include_index:
+                # allow for multi-index index
+                if index_column_size > 1:
+                    index_names = list(dataframe.index.names)
+                else:
+                    index_names = [ dataframe.index.name ]
+                elts = index_names + elts
+                header_fmt = formatter.format_for_header(dataframe.index, dataframe)
+                self._add(col, col + index_column_size - 1, True, 0, header_fmt)
+
+            header_fmt = formatter.format_for_header(elts, dataframe)
+            self._add(col, col + len(elts) - 1, False, column_header_size - 1, header_fmt)
+
+            if row == 1 and formatter.should_freeze_header(elts, dataframe):
+                self.freeze_args['rows'] = column_header_size
+
+            if include_index and col == 1 and formatter.should_freeze_header(dataframe.index, dataframe):
+                self.freeze_args['cols'] = index_column_size
+
+            self.header_rows = column_header_size
+
+        banding = formatter.banding_for_dataframe(dataframe)
+        if banding is not None and banding.to_props():
+            if not self.header_rows:
+                banding = banding.__class__.from_props(banding.to_props())
+                banding.headerColor = banding.headerColorStyle = None
+            self.banding = (col, col + len(columns) - 1, banding)
+
+    def _add(self, first_col, last_col, spans_data, last_row_offset, fmt):
+        if not fmt or not fmt.to_props():
+            return
+        self._templates.append((
+            first_col, last_col, spans_data, last_row_offset,
+            { 'userEnteredFormat': _convert_to_properties(fmt) },
+            ",".join(_affected_fields_for(fmt, 'userEnteredFormat'))
+        ))
+
+    def requests(self, worksheet, row, data_rows, conditional_rules=None):
+        requests = [
+            _placed_request(
+                worksheet, row, first_col, row + (data_rows if spans_data else 0) + last_row_offset, 
+                last_col, cell, fields
+            )
+            for first_col, last_col, spans_data, last_row_offset, cell, fields in self._templates
+        ]
+        if self.banding is not None and self.header_rows + data_rows > 0:
+            first_col, last_col, banding = self.banding
+            requests.extend(add_banding(
+                worksheet, (row, first_col, row + self.header_rows + data_rows - 1, last_col),
+                row_properties=banding
+            ))
+        rules = _compile_conditional_rules(
+            worksheet, self.conditional_rules, row + self.header_rows, row + self.header_rows + data_rows - 1
+        )
+        if rules:
+            requests.extend(_conditional_rule_requests(worksheet, conditional_rules, rules))
+        return requests
+
+    def column_requests(self, worksheet, first_row, last_row):
+        """The formats spanning the data rows, applied to the given worksheet rows only."""
+        return [
+            _placed_request(worksheet, first_row, first_col, last_row, last_col, cell, fields)
+            for first_col, last_col, spans_data, last_row_offset, cell, fields in self._templates
+            if spans_data
+        ]
+
+    def extension_requests(self, worksheet, row, formatted_rows, data_rows, conditional_rules=None, banded_ranges=()):
+        """
+        The formats spanning the data rows, extended from ``formatted_rows`` to ``data_rows`` rows:
+        column formats for the new rows, and the banding and conditional rules added by
+        ``requests`` grown to cover them. The banding is found among ``banded_ranges`` by its
+        range, and the rules among ``conditional_rules`` by their content.
+        """
+        if data_rows <= formatted_rows:
+            return []
+        requests = self.column_requests(worksheet, row + formatted_rows + 1, row + data_rows)
+        if self.banding is not None:
+            first_col, last_col, banding = self.banding
+            old_range, new_range = [
+                GridRange.from_props(_range_to_gridrange_object(
+                    (row, first_col, row + self.header_rows + rows - 1, last_col), worksheet.id
+                ))
+                for rows in (formatted_rows, data_rows)
+            ]
+            ranges = [banded_range.range for banded_range in banded_ranges]
+            if new_range not in ranges:
+                if old_range not in ranges:
+                    raise ValueError(
+                        "Worksheet %r has no banding over %r, as added when the formatted rows "
+                        "were formatted" % (worksheet.title, old_range.to_props())
                     )
-                )
-
-        header_fmt = formatter.format_for_header(elts, dataframe)
-        if header_fmt:
-            formatting_ranges.append( 
-                (
-                    '{}:{}'.format(
-                        rowcol_to_a1(row, col), 
-                        rowcol_to_a1(row + column_header_size - 1, col + len(elts) - 1)
-                    ), 
-                    header_fmt
-                )
+                banded_range = banded_ranges[ranges.index(old_range)]
+                requests.extend(update_banding(worksheet, banded_range.bandedRangeId, range=new_range))
+        first_data_row = row + self.header_rows
+        old_rules, new_rules = [
+            _compile_conditional_rules(
+                worksheet, self.conditional_rules, first_data_row, first_data_row + rows - 1
             )
+            for rows in (formatted_rows, data_rows)
+        ]
+        if new_rules:
+            requests.extend(_extended_rule_requests(worksheet, conditional_rules, old_rules, new_rules))
+        return requests
 
-        if row == 1 and formatter.should_freeze_header(elts, dataframe):
-            freeze_args['rows'] = column_header_size
+def _placed_request(worksheet, first_row, first_col, last_row, last_col, cell, fields):
+    return {
+        'repeatCell': {
+            'range': _range_to_gridrange_object((first_row, first_col, last_row, last_col), worksheet.id),
+            'cell': cell,
+            'fields': fields
+        }
+    }
 
-        if include_index and col == 1 and formatter.should_freeze_header(dataframe.index, dataframe):
-            freeze_args['cols'] = index_column_size
+def _schema_key(dataframe, formatter, row, col, include_index, include_column_header):
+    index = dataframe.index
+    return (
+        id(formatter),
+        tuple(dataframe.columns),
+        tuple(str(dtype) for dtype in dataframe.dtypes),
+        tuple(index.names),
+        tuple(str(index.get_level_values(i).dtype) for i in range(index.nlevels)) if include_index else None,
+        # freezing depends on whether formatting starts in the first row and column
+        row == 1,
+        col,
+        include_index,
+        include_column_header
+    )
 
-        row += column_header_size
+class FormattingPlanCache(object):
+    """
+    A least-recently-used cache of the column, header and freeze formats computed by
+    ``format_with_dataframe``, keyed by the DataFrame's schema (column names, dtypes and
+    index), the formatter and the starting column. Pass the same cache to many calls
+    formatting DataFrames that differ only in their rows, so the formatter's
+    ``format_for_column`` and ``format_for_header`` run once per schema.
 
+    A cached plan assumes that those formatter methods depend only on the schema; in
+    particular, the type inferred for an ``object`` column of the first DataFrame
+    is reused for later DataFrames.
+    """
+    def __init__(self, maxsize=DEFAULT_PLAN_CACHE_SIZE):
+        if maxsize < 1:
+            raise ValueError("maxsize must be a positive number of plans")
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._plans = OrderedDict()
+        # a cache may be shared by several threads
+        self._lock = threading.Lock()
 
-    values = []
-    for value_row, index_value in zip_longest(dataframe.values, dataframe.index):
-        if include_index:
-            if index_column_size > 1:
-                index_values = list(index_value)
+    def __len__(self):
+        return len(self._plans)
+
+    def clear(self):
+        with self._lock:
+            self._plans.clear()
+
+    def _plan_for(self, dataframe, formatter, row, col, include_index, include_column_header):
+        key = _schema_key(dataframe, formatter, row, col, include_index, include_column_header)
+        with self._lock:
+            entry = self._plans.pop(key, None)
+            # the formatter is kept with its plan, so that its id() cannot be reused while cached
+            if entry is not None and entry[0] is formatter:
+                self.hits += 1
             else:
-                index_values = [index_value]
-            value_row = index_values + list(value_row)
-        values.append(value_row)
-    for y_idx, value_row in enumerate(values):
-        for x_idx, cell_value in enumerate(value_row):
-            cell_fmt = formatter.format_for_cell(cell_value, y_idx+row, x_idx+col, dataframe)
-            if cell_fmt:
-                formatting_ranges.append((rowcol_to_a1(y_idx+row, x_idx+col), cell_fmt))
-        row_fmt = formatter.format_for_data_row(values, y_idx+row, dataframe)
-        if row_fmt:
-            formatting_ranges.append(
-                (
-                    '{}:{}'.format(
-                        rowcol_to_a1(y_idx+row, col), 
-                        rowcol_to_a1(y_idx+row, col+dataframe.shape[1])
-                    ), 
-                row_fmt
-                )
-            )
+                self.misses += 1
+                entry = (formatter, _FormattingPlan(dataframe, formatter, row, col, include_index, include_column_header))
+                if len(self._plans) >= self.maxsize:
+                    self._plans.popitem(last=False)
+            self._plans[key] = entry
+            return entry[1]
 
+def _changed_row_requests(worksheet, plan, changed_rows, row, col, dataframe):
+    """
+    For existing rows whose row format has changed, given as (row index, previous row format)
+    pairs, returns requests clearing the fields set by the previous row formats and
+    reapplying the column formats, one request per run of consecutive rows.
+    """
     requests = []
+    runs = []
+    for y_idx, previous_fmt in changed_rows:
+        fields = ",".join(_affected_fields_for(previous_fmt, 'userEnteredFormat')) \
+            if previous_fmt and previous_fmt.to_props() else None
+        if runs and runs[-1][1] == y_idx - 1 and runs[-1][2] == fields:
+            runs[-1][1] = y_idx
+        else:
+            runs.append([y_idx, y_idx, fields])
+    for first_y, last_y, fields in runs:
+        if fields:
+            requests.append({
+                'repeatCell': {
+                    'range': _range_to_gridrange_object(
+                        (first_y+row, col, last_y+row, col+dataframe.shape[1]), worksheet.id
+                    ),
+                    'cell': { 'userEnteredFormat': {} },
+                    'fields': fields
+                }
+            })
+    spans = []
+    for first_y, last_y, fields in runs:
+        if spans and spans[-1][1] == first_y - 1:
+            spans[-1][1] = last_y
+        else:
+            spans.append([first_y, last_y])
+    for first_y, last_y in spans:
+        requests.extend(plan.column_requests(worksheet, first_y+row, last_y+row))
+    return requests
 
-    if formatting_ranges:
-        formatting_ranges = [ r for r in formatting_ranges if r[1] and r[1].to_props() ]
-        requests.extend(format_cell_ranges(worksheet, formatting_ranges))
+def _row_run_to_range(row_run, row, col, dataframe):
+    first_y, last_y, row_fmt = row_run
+    return ((first_y+row, col, last_y+row, col+dataframe.shape[1]), row_fmt)
 
-    if freeze_args:
-        requests.extend(set_frozen(worksheet, **freeze_args))
+class _FormatPalette(object):
+    """Interns formats by value, assigning each distinct format an integer id (-1 for no format)."""
+    def __init__(self):
+        self.formats = []
+        self._by_key = {}
 
-    return requests
+    def id_for(self, fmt):
+        if fmt is None:
+            return -1
+        props = fmt.to_props()
+        if not props:
+            return -1
+        key = _props_key(props)
+        fmt_id = self._by_key.get(key)
+        if fmt_id is None:
+            fmt_id = self._by_key[key] = len(self.formats)
+            # a copy, in case the formatter changes and returns the same object again
+            self.formats.append(type(fmt).from_props(props))
+        return fmt_id
+
+def _runs_in_column(column):
+    """Returns (start, end, id) for each maximal run of equal ids in a list of ids."""
+    runs = []
+    start = 0
+    for y_idx in range(1, len(column) + 1):
+        if y_idx == len(column) or column[y_idx] != column[start]:
+            runs.append((start, y_idx, column[start]))
+            start = y_idx
+    return runs
+
+def _merge_column_runs(column_runs, palette, row, col):
+    """
+    Given, for each column in turn, the runs of format ids in that column, merges identical
+    runs in adjacent columns into rectangles, and returns one (range, format) pair per
+    rectangle, skipping runs with id -1.
+    """
+    rects = []
+    open_runs = {}
+    for x_idx, runs in enumerate(column_runs):
+        next_open = {}
+        for run in runs:
+            if run[2] < 0:
+                continue
+            rect = open_runs.get(run)
+            if rect is None:
+                rect = [run[0], run[1], x_idx, x_idx, run[2]]
+                rects.append(rect)
+            rect[3] = x_idx
+            next_open[run] = rect
+        open_runs = next_open
+    return [
+        ((row + start, col + first_x, row + end - 1, col + last_x), palette[fmt_id])
+        for start, end, first_x, last_x, fmt_id in rects
+    ]
+
+def _format_id_grid_to_ranges(dataframe, cell_formats, row, col, first_row=0):
+    """
+    Turns the ``(ids, palette)`` result of ``DataFrameFormatter.format_for_cells`` into
+    (range, format) pairs, one per maximal vertical run of a format id, with identical runs 
+    in adjacent columns merged into one rectangle. Work per column is done with numpy.
+    Rows before ``first_row`` are skipped.
+    """
+    if hasattr(cell_formats, 'ids') and hasattr(cell_formats, 'palette'):
+        # a FormatGrid
+        cell_formats = (cell_formats.ids, cell_formats.palette)
+    ids, palette = cell_formats
+    if ids is None or not len(palette):
+        return []
+    import numpy as np
+    ids = np.asarray(ids)
+    if ids.shape != tuple(dataframe.shape):
+        raise ValueError(
+            "format_for_cells ids have shape %s, not the DataFrame's shape %s" 
+            % (ids.shape, tuple(dataframe.shape))
+        )
+    ids = ids[first_row:]
+    row += first_row
+    if not ids.shape[0]:
+        return []
+    def column_runs():
+        for x_idx in range(ids.shape[1]):
+            column = ids[:, x_idx]
+            boundaries = np.flatnonzero(column[1:] != column[:-1]) + 1
+            starts = np.concatenate(([0], boundaries))
+            ends = np.concatenate((boundaries, [len(column)]))
+            yield zip(starts.tolist(), ends.tolist(), column[starts].tolist())
+    return _merge_column_runs(column_runs(), palette, row, col)
 
 @wraps(_format_with_dataframe)
 def format_with_dataframe(worksheet, *args, **kwargs):
-    return worksheet.spreadsheet.batch_update(
-        {'requests': _format_with_dataframe(worksheet, *args, **kwargs)}
+    with _span('build', operation='format_with_dataframe'):
+        requests = _format_with_dataframe(worksheet, *args, **kwargs)
+    return _batch_update(worksheet.spreadsheet, {'requests': requests}, 'format_with_dataframe')
+
+def _coalesce_format_requests(requests):
+    """
+    Merges repeatCell requests that set the same cell data and fields. As with
+    ``ConditionalFormatRules.consolidate``, a request is merged into the most recent
+    earlier request of the same content only if no request between them overlaps its
+    range, so every cell still ends up with the same format. Each merged group's ranges
+    are coalesced into as few rectangles as possible, one request per rectangle.
+    Requests other than repeatCell are kept in place.
+    """
+    keys = []
+    for request in requests:
+        body = request.get('repeatCell')
+        keys.append(_props_key([body['cell'], body['fields']]) if body is not None else None)
+    key_counts = {}
+    for key in keys:
+        key_counts[key] = key_counts.get(key, 0) + 1
+    # only requests whose content recurs can merge; the others are indexed, but never queried
+    gridranges = [
+        GridRange.from_props(request['repeatCell']['range']) if key is not None else None
+        for request, key in zip(requests, keys)
+    ]
+    index = GridRangeIndex((gr, i) for i, gr in enumerate(gridranges) if gr is not None)
+
+    groups = []
+    latest_group_for_key = {}
+    for i, (request, key, gridrange) in enumerate(zip(requests, keys, gridranges)):
+        if key is None or key_counts[key] == 1:
+            groups.append((request, None))
+            continue
+        latest = latest_group_for_key.get(key)
+        # requests of the same content since the group's first are all in the group;
+        # other requests are checked at their original position, which is never earlier
+        # than the one they were merged into
+        if latest is not None and not any(
+            latest[1] < k < i and keys[k] != key for k in index.query_range(gridrange)
+        ):
+            groups[latest[0]][1].append(gridrange)
+        else:
+            latest_group_for_key[key] = (len(groups), i)
+            groups.append((request, [gridrange]))
+    coalesced = []
+    for request, ranges in groups:
+        if ranges is None or len(ranges) == 1:
+            coalesced.append(request)
+            continue
+        rects = coalesce_ranges(ranges)
+        if len(rects) > len(ranges):
+            rects = ranges
+        coalesced.extend(
+            { 'repeatCell': dict(request['repeatCell'], range=gridrange.to_props()) }
+            for gridrange in rects
+        )
+    return coalesced
+
+def _format_with_dataframes(jobs, plan_cache=None):
+    """
+    Builds the formatting requests for many DataFrames, each job being a tuple of the
+    positional arguments to ``format_with_dataframe``: ``(worksheet, dataframe)``, optionally
+    followed by ``formatter``, ``row``, ``col``, ``include_index`` and ``include_column_header``.
+
+    Returns a list of ``(spreadsheet, requests)`` pairs, one per spreadsheet in order of first
+    appearance, where ``requests`` holds the jobs' requests in job order, with equal formats
+    merged and coalesced across DataFrames.
+    """
+    if plan_cache is None:
+        plan_cache = FormattingPlanCache()
+    by_spreadsheet = []
+    # the conditional rules of each worksheet, shared by its jobs so that each job's rules
+    # are placed against those of the jobs before it
+    rules_by_worksheet = []
+    for job in jobs:
+        if len(job) < 2:
+            raise ValueError("each job must provide at least a worksheet and a DataFrame: %r" % (job,))
+        worksheet = job[0]
+        spreadsheet = worksheet.spreadsheet
+        conditional_rules = None
+        if _plan_for_job(plan_cache, *job).conditional_rules:
+            for rules in rules_by_worksheet:
+                if rules.worksheet.id == worksheet.id and (
+                    rules.worksheet.spreadsheet is spreadsheet or rules.worksheet.spreadsheet == spreadsheet
+                ):
+                    conditional_rules = rules
+                    break
+            else:
+                conditional_rules = get_conditional_format_rules(worksheet)
+                rules_by_worksheet.append(conditional_rules)
+        requests = _format_with_dataframe(*job, plan_cache=plan_cache, conditional_rules=conditional_rules)
+        for pair in by_spreadsheet:
+            if pair[0] is spreadsheet or pair[0] == spreadsheet:
+                pair[1].extend(requests)
+                break
+        else:
+            by_spreadsheet.append((spreadsheet, list(requests)))
+    return [
+        (spreadsheet, _coalesce_format_requests(requests)) 
+        for spreadsheet, requests in by_spreadsheet
+    ]
+
+def _plan_for_job(plan_cache, worksheet, dataframe, formatter=None, row=1, col=1,
+                  include_index=False, include_column_header=True):
+    return plan_cache._plan_for(
+        _as_frame(dataframe), formatter or DEFAULT_FORMATTER, row, col, include_index, include_column_header
     )
 
+def format_with_dataframes(jobs, plan_cache=None, max_requests_per_call=None):
+    """
+    Formats many worksheet areas, each from its own DataFrame, with as few API calls as
+    possible: equal formats are merged across DataFrames, and each spreadsheet's requests
+    are sent in a single ``batchUpdate`` call (or in calls of at most ``max_requests_per_call``
+    requests, if given).
+
+    :param jobs: an iterable of tuples, each holding the positional arguments to 
+                 ``format_with_dataframe``: ``(worksheet, dataframe)``, optionally followed by
+                 ``formatter``, ``row``, ``col``, ``include_index`` and ``include_column_header``.
+    :param plan_cache: an optional ``FormattingPlanCache``, shared by all jobs.
+    :param max_requests_per_call: optional maximum number of requests per API call.
+
+    :return: a list of the API responses, in order of the spreadsheets' first appearance in ``jobs``.
+    """
+    if max_requests_per_call is not None and max_requests_per_call < 1:
+        raise ValueError("max_requests_per_call must be a positive number of requests")
+    responses = []
+    with _span('build', operation='format_with_dataframes'):
+        by_spreadsheet = _format_with_dataframes(jobs, plan_cache)
+    for spreadsheet, requests in by_spreadsheet:
+        step = max_requests_per_call or max(len(requests), 1)
+        for start in range(0, len(requests), step):
+            responses.append(_batch_update(
+                spreadsheet, {'requests': requests[start:start + step]}, 'format_with_dataframes'
+            ))
+    return responses
+
 class DataFrameFormatter(object):
     """
     An abstract base class defining the interface for producing formats
@@ -263,6 +883,62 @@ class DataFrameFormatter(object):
         """
         raise NotImplementedError()
 
+    def conditional_rules_for_column(self, column, col_number, dataframe):
+        """
+        Called by ``format_with_dataframe`` once for each column in the dataframe.
+        Declares value-dependent formatting for the column's data cells as conditional
+        format rules, evaluated by Google Sheets itself, instead of as per-cell formats.
+        Equal rules returned for several columns are combined into a single rule, and
+        the rules are inserted ahead of any existing conditional format rules, covering
+        the DataFrame's rows. The worksheet's rules are fetched first, so that rules added
+        by an earlier call over the same area are left as they are rather than added
+        again; with ``formatted_rows``, the worksheet's first rules are extended over
+        the new rows instead.
+
+        :param column: A ``pandas.Series`` object representing the column.
+        :param col_number: The index (starting with 1) of the column in the worksheet.
+        :param dataframe: The ``pandas.DataFrame`` object, as additional context.
+
+        :return: A sequence of ``BooleanRule`` and ``GradientRule`` objects, possibly empty.
+        """
+        return ()
+
+    def banding_for_dataframe(self, dataframe):
+        """
+        Called by ``format_with_dataframe`` once per DataFrame. Declares alternating row
+        colors for the whole table, header and index included, which Google Sheets applies
+        itself: a single addBanding request instead of a format per row. Header colors
+        are ignored if the column header is not included.
+
+        When ``formatted_rows`` is given, the banding added by the earlier call is extended
+        over the new rows instead; it is found among the worksheet's banded ranges by its
+        range. A range can have only one banding: delete the banding added by a previous
+        call before formatting the same range again.
+
+        :param dataframe: The ``pandas.DataFrame`` object, as additional context.
+
+        :return: Either a ``BandingProperties`` object or ``None``.
+        """
+        return None
+
+    def format_for_cells(self, dataframe):
+        """
+        Optional vectorized alternative to ``format_for_cell``, called by ``format_with_dataframe``
+        once per DataFrame. Implementations should compute formats column-wise (e.g. with
+        pandas or numpy operations) rather than cell by cell.
+
+        :param dataframe: The ``pandas.DataFrame`` object.
+
+        :return: ``None`` to have ``format_for_cell`` called for every cell instead; or a pair
+                 ``(ids, palette)``, where ``palette`` is a sequence of ``CellFormat`` objects and
+                 ``ids`` is a 2-D integer array with the DataFrame's shape whose elements are
+                 indices into ``palette``, or -1 for cells needing no format. Index cells
+                 (if ``include_index`` is ``True``) are not formatted when this method
+                 returns a pair. An empty ``palette`` means that no cell needs a format.
+                 A ``FormatGrid`` of the DataFrame's shape may be returned instead of a pair.
+        """
+        return None
+
     def should_freeze_header(self, series, dataframe):
         """
         Called by ``format_with_dataframe`` once for each header row or column.
@@ -275,6 +951,106 @@ class DataFrameFormatter(object):
         """
         raise NotImplementedError()
 
+_ISO_DATE_PATTERN = re.compile(r'^\s*\d{4}-\d{2}-\d{2}([ T]\d{2}:\d{2}(:\d{2}(\.\d+)?)?)?\s*$')
+_CURRENCY_PATTERN = re.compile(
+    r'^\s*[-+]?\s*(?:[$\u00a2-\u00a5\u20ac]\s*[-+]?\d[\d,]*(?:\.\d+)?|\d[\d,]*(?:\.\d+)?\s*[$\u00a2-\u00a5\u20ac])\s*$'
+)
+_PERCENT_PATTERN = re.compile(r'^\s*[-+]?\d[\d,]*(?:\.\d+)?\s*%\s*$')
+
+class ColumnTypeInference(object):
+    """
+    Infers the type of the values in an ``object``-dtype column, so that ``BasicFormatter``
+    can choose a number format for it, without converting or scanning the whole column.
+
+    Only a bounded sample is inspected: the first and last ``edge_size`` values, plus 
+    ``sample_size`` values spread evenly in between. With ``strict=True``, every value is 
+    inspected instead. Python numbers and datetimes are typed as ``infer_objects()`` would 
+    type them. If ``parse_strings`` is True, strings holding ISO dates, currency amounts
+    (e.g. ``$1,024.50``) and percentages (e.g. ``12.5%``) are recognized too.
+
+    ``infer`` returns a NumPy dtype kind (``'i'``, ``'f'`` or ``'M'``), ``CURRENCY``,
+    ``PERCENT``, or ``None`` if the values are of no single recognized type.
+    """
+    CURRENCY = 'CURRENCY'
+    PERCENT = 'PERCENT'
+
+    def __init__(self, 
+        sample_size=DEFAULT_INFERENCE_SAMPLE_SIZE, 
+        edge_size=DEFAULT_INFERENCE_EDGE_SIZE, 
+        strict=False, 
+        parse_strings=False):
+        if sample_size < 0 or edge_size < 0:
+            raise ValueError("sample_size and edge_size must not be negative")
+        self.sample_size = sample_size
+        self.edge_size = edge_size
+        self.strict = bool(strict)
+        self.parse_strings = bool(parse_strings)
+
+    def sample(self, column):
+        """Returns the values of the column that ``infer`` inspects."""
+        n = len(column)
+        edge, size = self.edge_size, self.sample_size
+        if self.strict or n <= 2 * edge + size:
+            return list(column)
+        middle = n - 2 * edge
+        positions = list(range(edge))
+        positions.extend(edge + (i * middle) // size for i in range(size))
+        positions.extend(range(n - edge, n))
+        values = column.iloc if hasattr(column, 'iloc') else column
+        return list(values[positions])
+
+    def infer(self, column):
+        kinds = set()
+        has_none = False
+        for value in self.sample(column):
+            if value is None:
+                has_none = True
+                continue
+            kind = self._kind_of(value)
+            if kind is None:
+                return None
+            kinds.add(kind)
+        # as with infer_objects(), NaN is a float and makes integers floats, as does None;
+        # NaN and NaT are missing datetimes
+        if kinds and kinds <= _NUMERIC_KINDS:
+            return 'i' if kinds == set(['i']) and not has_none else 'f'
+        if 'M' in kinds and kinds <= _DATETIME_KINDS:
+            return 'M'
+        kinds -= _MISSING_KINDS
+        if len(kinds) == 1 and kinds <= _STRING_KINDS:
+            return kinds.pop()
+        return None
+
+    def _kind_of(self, value):
+        if isinstance(value, float) and value != value:
+            return 'nan'
+        if type(value).__name__ == 'NaTType':
+            return 'nat'
+        if isinstance(value, bool):
+            return 'b'
+        if isinstance(value, numbers.Integral):
+            return 'i'
+        # numpy and pandas booleans and pandas.NA are not numbers
+        if isinstance(value, numbers.Real):
+            return 'f'
+        if isinstance(value, datetime.datetime) or type(value).__name__ == 'datetime64':
+            return 'M'
+        if self.parse_strings and isinstance(value, str):
+            if _ISO_DATE_PATTERN.match(value):
+                return 'M'
+            if _CURRENCY_PATTERN.match(value):
+                return ColumnTypeInference.CURRENCY
+            if _PERCENT_PATTERN.match(value):
+                return ColumnTypeInference.PERCENT
+        return None
+
+_NUMERIC_KINDS = frozenset(['i', 'f', 'nan'])
+_MISSING_KINDS = frozenset(['nan', 'nat'])
+_DATETIME_KINDS = frozenset(['M']) | _MISSING_KINDS
+_STRING_KINDS = frozenset([ColumnTypeInference.CURRENCY, ColumnTypeInference.PERCENT, 'M'])
+
+DEFAULT_TYPE_INFERENCE = ColumnTypeInference()
+
 class BasicFormatter(DataFrameFormatter):
     """
     A basic formatter class that offers: selection of format based on
@@ -291,7 +1067,8 @@ class BasicFormatter(DataFrameFormatter):
         decimal_format=None,
         integer_format=None,
         freeze_headers=None,
-        column_formats=None):
+        column_formats=None,
+        **kwargs):
         """
         Returns an instance of this class, with any unspecified parameters
         being substituted with this package's default values for the parameters.
@@ -299,13 +1076,14 @@ class BasicFormatter(DataFrameFormatter):
         and thus always be omitted from formatting operations.
         """
         return cls(
-            (header_background_color or DEFAULT_HEADER_BACKGROUND_COLOR),
-            header_text_color,
-            date_format,
-            decimal_format,
-            integer_format,
-            freeze_headers,
-            column_formats
+            header_background_color=(header_background_color or DEFAULT_HEADER_BACKGROUND_COLOR),
+            header_text_color=header_text_color,
+            date_format=date_format,
+            decimal_format=decimal_format,
+            integer_format=integer_format,
+            freeze_headers=freeze_headers,
+            column_formats=column_formats,
+            **kwargs
         )
 
     def __init__(self, 
@@ -315,14 +1093,32 @@ class BasicFormatter(DataFrameFormatter):
         decimal_format=None,
         integer_format=None,
         freeze_headers=None,
-        column_formats=None):
+        column_formats=None,
+        type_inference=None,
+        currency_format=None,
+        percent_format=None,
+        banding=None):
+        """
+        :param type_inference: a ``ColumnTypeInference`` used to choose the format of 
+                ``object``-dtype columns. Defaults to ``DEFAULT_TYPE_INFERENCE``.
+        :param currency_format: number format for columns of currency strings, which are
+                only detected if ``type_inference`` parses strings.
+        :param percent_format: number format for columns of percentage strings, which are
+                only detected if ``type_inference`` parses strings.
+        :param banding: a ``BandingProperties`` object giving alternating row colors
+                for the table; see ``DataFrameFormatter.banding_for_dataframe``.
+        """
         self.header_background_color = header_background_color
         self.header_text_color = header_text_color
         self.date_format = BasicFormatter.resolve_number_format(date_format or '', 'DATE')
         self.decimal_format = BasicFormatter.resolve_number_format(decimal_format or '', 'NUMBER')
         self.integer_format = BasicFormatter.resolve_number_format(integer_format or '', 'NUMBER')
+        self.currency_format = BasicFormatter.resolve_number_format(currency_format or '', 'CURRENCY')
+        self.percent_format = BasicFormatter.resolve_number_format(percent_format or '', 'PERCENT')
         self.freeze_headers = bool(freeze_headers)
         self.column_formats = column_formats or {}
+        self.type_inference = type_inference or DEFAULT_TYPE_INFERENCE
+        self.banding = banding
 
     def format_for_header(self, series, dataframe):
         return cellFormat(
@@ -333,25 +1129,69 @@ class BasicFormatter(DataFrameFormatter):
     def format_for_column(self, column, col_number, dataframe):
         if column.name in self.column_formats:
             return self.column_formats[column.name]
-        dtype = column.dtype
-        if dtype.kind == 'O' and hasattr(column, 'infer_objects'):
-            dtype = column.infer_objects().dtype
-        if dtype.kind == 'f':
+        kind = column.dtype.kind
+        if kind == 'O':
+            kind = self.type_inference.infer(column)
+        if kind == 'f':
             return cellFormat(numberFormat=self.decimal_format, horizontalAlignment='RIGHT')
-        elif dtype.kind == 'i':
+        elif kind == 'i':
             return cellFormat(numberFormat=self.integer_format, horizontalAlignment='RIGHT')
-        elif dtype.kind == 'M':
+        elif kind == 'M':
             return cellFormat(numberFormat=self.date_format, horizontalAlignment='CENTER')
+        elif kind == ColumnTypeInference.CURRENCY:
+            return cellFormat(numberFormat=self.currency_format, horizontalAlignment='RIGHT')
+        elif kind == ColumnTypeInference.PERCENT:
+            return cellFormat(numberFormat=self.percent_format, horizontalAlignment='RIGHT')
         else:
             return cellFormat(horizontalAlignment=('LEFT' if col_number == 1 else 'CENTER'))
 
     def format_for_cell(self, value, row_number, col_number, dataframe):
         return None
 
+    def format_for_cells(self, dataframe):
+        # unless a subclass formats individual cells, there is no need to visit each cell
+        if type(self).format_for_cell is BasicFormatter.format_for_cell:
+            return (None, ())
+        return None
+
     def format_for_data_row(self, values, row_number, dataframe):
         return None
 
+    def banding_for_dataframe(self, dataframe):
+        return self.banding
+
     def should_freeze_header(self, series, dataframe):
         return self.freeze_headers
 
+class ConditionalFormatter(BasicFormatter):
+    """
+    A ``BasicFormatter`` whose value-dependent formats are declared as data: ``column_rules``
+    maps column names to a ``BooleanRule`` or ``GradientRule``, or a list of them, which are
+    compiled into a handful of conditional format rules over the columns' data cells rather
+    than a request per cell. Because the rules are evaluated by Google Sheets, the formats
+    stay correct when the values of those cells later change. The rules cover the rows of
+    the DataFrame being formatted; formatting appended rows with ``formatted_rows`` extends
+    them.
+
+    The rules are placed ahead of the worksheet's existing rules, which are fetched to
+    compare them with: formatting the same area again leaves the rules added by an earlier
+    call as they are, rather than duplicating them.
+    """
+
+    def __init__(self, *args, **kwargs):
+        """
+        Accepts the parameters of ``BasicFormatter``, plus:
+
+        :param column_rules: a mapping from column names to a ``BooleanRule`` or ``GradientRule``,
+                or a sequence of them.
+        """
+        self.column_rules = kwargs.pop('column_rules', None) or {}
+        super(ConditionalFormatter, self).__init__(*args, **kwargs)
+
+    def conditional_rules_for_column(self, column, col_number, dataframe):
+        rules = self.column_rules.get(column.name, ())
+        if isinstance(rules, (BooleanRule, GradientRule)):
+            return (rules,)
+        return rules
+
 DEFAULT_FORMATTER = BasicFormatter.with_defaults()
@@ -0,0 +1,485 @@
+# -*- coding: utf-8 -*-
+"""
+Local evaluation of conditional formatting. Given a 2-D array of cell values, this module
+evaluates ``BooleanCondition`` objects, interpolates ``GradientRule`` colors, and resolves
+a list of ``ConditionalFormatRule`` objects to the per-cell format the Sheets UI would apply,
+without any API calls. It also computes effective formats (default, user-entered and
+conditional formats combined) for a whole range from a single API read. Requires ``numpy``.
+
+Cell values are Python or numpy values as they would be read from the sheet: numbers,
+strings, ``bool``, ``date``/``datetime`` (or ``numpy.datetime64``/``pandas.Timestamp``),
+and ``None``, ``''`` or NaN for blank cells.
+"""
+
+from .models import CellFormat, Color, GridRange
+from .conditionals import ConditionalFormatRule
+from .util import _range_to_gridrange_object
+from .instrumentation import _fetch_sheet_metadata
+
+import json
+
+from datetime import date, datetime, timedelta
+import numbers
+import re
+
+import numpy as np
+
+__all__ = (
+    'evaluate_condition', 'evaluate_gradient', 'evaluate_conditional_format_rules',
+    'resolve_effective_formats', 'get_effective_formats'
+)
+
+_EMAIL_RE = re.compile(r'^[^@\s]+@[^@\s]+\.[^@\s]+$')
+_URL_RE = re.compile(r'^(https?|ftp)://[^\s/$.?#].[^\s]*$', re.IGNORECASE)
+_DATE_PATTERNS = ('%Y-%m-%d', '%m/%d/%Y', '%Y/%m/%d')
+
+
+def _as_grid(values):
+    if hasattr(values, 'to_numpy'):
+        values = values.to_numpy()
+    # lists are read as object arrays, so mixed rows are not coerced to strings
+    arr = values if isinstance(values, np.ndarray) else np.asarray(values, dtype=object)
+    if arr.ndim != 2:
+        raise ValueError("values must be a 2-D array or list of rows")
+    return arr
+
+def _is_blank_value(v):
+    return v is None or (isinstance(v, str) and v == '') or (isinstance(v, float) and v != v)
+
+def _blank_mask(arr):
+    if arr.dtype.kind == 'f':
+        return np.isnan(arr)
+    if arr.dtype.kind in 'iub':
+        return np.zeros(arr.shape, dtype=bool)
+    if arr.dtype.kind == 'M':
+        return np.isnat(arr)
+    if arr.dtype.kind == 'U':
+        return arr == ''
+    return np.frompyfunc(_is_blank_value, 1, 1)(arr).astype(bool)
+
+def _to_number(v):
+    if isinstance(v, numbers.Number) and not isinstance(v, (bool, np.bool_)):
+        return float(v)
+    return np.nan
+
+def _numeric(arr):
+    """Float array of the numeric cells in ``arr``, with NaN for all others."""
+    if arr.dtype.kind in 'iuf':
+        return arr.astype(float)
+    if arr.dtype.kind in 'bUSM':
+        return np.full(arr.shape, np.nan)
+    return np.frompyfunc(_to_number, 1, 1)(arr).astype(float)
+
+def _to_text(v):
+    if _is_blank_value(v):
+        return ''
+    if isinstance(v, (bool, np.bool_)):
+        return 'TRUE' if v else 'FALSE'
+    return str(v)
+
+def _text(arr):
+    """Lower-cased string array of the cells in ``arr``; blanks become empty strings."""
+    if arr.dtype.kind != 'U':
+        arr = np.frompyfunc(_to_text, 1, 1)(arr).astype(str)
+    return np.char.lower(arr)
+
+def _to_day(v):
+    if isinstance(v, np.datetime64):
+        return v.astype('datetime64[D]')
+    if isinstance(v, datetime):
+        return np.datetime64(v.date(), 'D')
+    if isinstance(v, date):
+        return np.datetime64(v, 'D')
+    return np.datetime64('NaT', 'D')
+
+def _dates(arr):
+    """``datetime64[D]`` array of the date cells in ``arr``, with NaT for all others."""
+    if arr.dtype.kind == 'M':
+        return arr.astype('datetime64[D]')
+    if arr.dtype.kind != 'O':
+        return np.full(arr.shape, np.datetime64('NaT', 'D'))
+    return np.frompyfunc(_to_day, 1, 1)(arr).astype('datetime64[D]')
+
+def _condition_number(cv):
+    value = cv.userEnteredValue
+    if value is None or str(value).startswith('='):
+        raise ValueError("Condition value %r cannot be evaluated locally" % value)
+    return float(value)
+
+def _condition_text(cv):
+    value = cv.userEnteredValue
+    if value is not None and str(value).startswith('='):
+        raise ValueError("Condition value %r cannot be evaluated locally" % value)
+    return ('' if value is None else str(value)).lower()
+
+def _relative_date_bounds(relative, today):
+    """Returns (start, end) days for a RelativeDate value; end is always today for past periods."""
+    if relative == 'TODAY':
+        return today, today
+    if relative == 'YESTERDAY':
+        return today - timedelta(days=1), today - timedelta(days=1)
+    if relative == 'TOMORROW':
+        return today + timedelta(days=1), today + timedelta(days=1)
+    if relative == 'PAST_WEEK':
+        return today - timedelta(days=7), today
+    if relative == 'PAST_MONTH':
+        month = today.month - 1 or 12
+        year = today.year - (1 if today.month == 1 else 0)
+        day = min(today.day, 28) if month == 2 else min(today.day, 30 if month in (4, 6, 9, 11) else 31)
+        return date(year, month, day), today
+    if relative == 'PAST_YEAR':
+        day = 28 if (today.month, today.day) == (2, 29) else today.day
+        return date(today.year - 1, today.month, day), today
+    raise ValueError(relative)
+
+def _condition_date_bounds(cv, today):
+    if cv.relativeDate is not None:
+        relative = getattr(cv.relativeDate, 'value', cv.relativeDate)
+        start, end = _relative_date_bounds(relative, today)
+    else:
+        value = cv.userEnteredValue
+        parsed = None
+        for pattern in _DATE_PATTERNS:
+            try:
+                parsed = datetime.strptime(str(value), pattern).date()
+                break
+            except ValueError:
+                pass
+        if parsed is None:
+            raise ValueError("Condition value %r cannot be evaluated locally as a date" % value)
+        start = end = parsed
+    return np.datetime64(start, 'D'), np.datetime64(end, 'D')
+
+def evaluate_condition(condition, values, today=None):
+    """
+    Evaluates a ``BooleanCondition`` against every cell of a 2-D array of values.
+
+    :param condition: A ``BooleanCondition`` object.
+    :param values: A 2-D array-like of cell values.
+    :param today: The ``date`` against which relative dates are resolved. Defaults to today.
+
+    :return: A 2-D ``numpy`` boolean array, True where the condition holds.
+
+    Number conditions hold only for numeric cells, and date conditions only for date cells.
+    Text conditions compare case-insensitively against the cell value's string form.
+    ``CUSTOM_FORMULA`` and ``ONE_OF_RANGE`` conditions, and conditions with formula values,
+    raise ``ValueError`` because they need the spreadsheet to evaluate them.
+    """
+    arr = _as_grid(values)
+    ctype = condition.type
+    cvs = condition.values
+    today = today or date.today()
+
+    if ctype.startswith('NUMBER_'):
+        nums = _numeric(arr)
+        with np.errstate(invalid='ignore'):
+            if ctype in ('NUMBER_BETWEEN', 'NUMBER_NOT_BETWEEN'):
+                low, high = sorted(_condition_number(cv) for cv in cvs)
+                between = (nums >= low) & (nums <= high)
+                return between if ctype == 'NUMBER_BETWEEN' else (~between & ~np.isnan(nums))
+            operand = _condition_number(cvs[0])
+            if ctype == 'NUMBER_GREATER':
+                return nums > operand
+            if ctype == 'NUMBER_GREATER_THAN_EQ':
+                return nums >= operand
+            if ctype == 'NUMBER_LESS':
+                return nums < operand
+            if ctype == 'NUMBER_LESS_THAN_EQ':
+                return nums <= operand
+            if ctype == 'NUMBER_EQ':
+                return nums == operand
+            if ctype == 'NUMBER_NOT_EQ':
+                return (nums != operand) & ~np.isnan(nums)
+
+    if ctype in ('BLANK', 'NOT_BLANK'):
+        blank = _blank_mask(arr)
+        return blank if ctype == 'BLANK' else ~blank
+
+    if ctype.startswith('TEXT_') or ctype == 'ONE_OF_LIST':
+        text = _text(arr)
+        if ctype == 'TEXT_IS_EMAIL':
+            return np.frompyfunc(lambda t: bool(_EMAIL_RE.match(t)), 1, 1)(text).astype(bool)
+        if ctype == 'TEXT_IS_URL':
+            return np.frompyfunc(lambda t: bool(_URL_RE.match(t)), 1, 1)(text).astype(bool)
+        if ctype == 'ONE_OF_LIST':
+            return np.isin(text, [_condition_text(cv) for cv in cvs])
+        operand = _condition_text(cvs[0])
+        if ctype == 'TEXT_CONTAINS':
+            return np.char.find(text, operand) >= 0
+        if ctype == 'TEXT_NOT_CONTAINS':
+            return np.char.find(text, operand) < 0
+        if ctype == 'TEXT_STARTS_WITH':
+            return np.char.startswith(text, operand)
+        if ctype == 'TEXT_ENDS_WITH':
+            return np.char.endswith(text, operand)
+        if ctype == 'TEXT_EQ':
+            return text == operand
+
+    if ctype.startswith('DATE_'):
+        days = _dates(arr)
+        valid = ~np.isnat(days)
+        if ctype == 'DATE_IS_VALID':
+            return valid
+        if ctype in ('DATE_BETWEEN', 'DATE_NOT_BETWEEN'):
+            low = _condition_date_bounds(cvs[0], today)[0]
+            high = _condition_date_bounds(cvs[1], today)[1]
+            between = valid & (days >= low) & (days <= high)
+            return between if ctype == 'DATE_BETWEEN' else (valid & ~between)
+        start, end = _condition_date_bounds(cvs[0], today)
+        if ctype == 'DATE_EQ':
+            return valid & (days >= start) & (days <= end)
+        if ctype == 'DATE_BEFORE':
+            return valid & (days < start)
+        if ctype == 'DATE_AFTER':
+            return valid & (days > start)
+        if ctype == 'DATE_ON_OR_BEFORE':
+            return valid & (days <= start)
+        if ctype == 'DATE_ON_OR_AFTER':
+            return valid & (days >= start)
+
+    if ctype == 'BOOLEAN':
+        checked = cvs[0].userEnteredValue if cvs else True
+        if checked is True:
+            return np.frompyfunc(lambda v: v is True or v is np.True_, 1, 1)(arr).astype(bool)
+        return _text(arr) == _to_text(checked).lower()
+
+    raise ValueError("BooleanCondition type %s cannot be evaluated locally" % ctype)
+
+
+def _point_color(point):
+    color = point.color
+    if color is None and point.colorStyle is not None:
+        if point.colorStyle.rgbColor is None:
+            raise ValueError("Theme colors cannot be evaluated locally: %s" % point.colorStyle)
+        color = point.colorStyle.rgbColor
+    color = color or Color()
+    return [
+        color.red or 0.0,
+        color.green or 0.0,
+        color.blue or 0.0
+    ]
+
+def _point_value(point, nums):
+    if point.type == 'MIN':
+        return np.min(nums)
+    if point.type == 'MAX':
+        return np.max(nums)
+    value = float(point.value)
+    if point.type == 'NUMBER':
+        return value
+    if point.type == 'PERCENT':
+        low, high = np.min(nums), np.max(nums)
+        return low + (high - low) * value / 100.0
+    return np.percentile(nums, value)
+
+def evaluate_gradient(gradient_rule, values, range_values=None):
+    """
+    Interpolates the colors a ``GradientRule`` gives to every cell of a 2-D array of values.
+
+    :param gradient_rule: A ``GradientRule`` object.
+    :param values: A 2-D array-like of cell values.
+    :param range_values: Optional array-like of all values in the rule's ranges, from which
+                         MIN, MAX, PERCENT and PERCENTILE points are computed.
+                         Defaults to ``values``.
+
+    :return: A ``numpy`` float array of shape ``(rows, cols, 3)`` holding red, green and blue
+             components, with NaN for non-numeric cells.
+    """
+    nums = _numeric(_as_grid(values))
+    if range_values is None:
+        scope = nums[~np.isnan(nums)]
+    else:
+        scope = _numeric(np.asarray(range_values, dtype=object).reshape(1, -1))
+        scope = scope[~np.isnan(scope)]
+    result = np.full(nums.shape + (3,), np.nan)
+    if scope.size == 0:
+        return result
+    points = [
+        p for p in (gradient_rule.minpoint, gradient_rule.midpoint, gradient_rule.maxpoint)
+        if p is not None
+    ]
+    stops = np.array([_point_value(p, scope) for p in points], dtype=float)
+    colors = np.array([_point_color(p) for p in points], dtype=float)
+    numeric = ~np.isnan(nums)
+    flat = nums[numeric]
+    for channel in range(3):
+        # np.interp clamps values outside the stops to the end colors, as Sheets does
+        result[..., channel][numeric] = np.interp(flat, stops, colors[:, channel])
+    return result
+
+
+def _window_mask(gridrange, shape, sheetId, row_offset, col_offset):
+    mask = np.zeros(shape, dtype=bool)
+    if gridrange.sheetId != sheetId:
+        return mask
+    window = GridRange(sheetId, row_offset, row_offset + shape[0], col_offset, col_offset + shape[1])
+    overlap = gridrange.intersection(window)
+    if overlap is not None:
+        mask[
+            overlap.startRowIndex - row_offset:overlap.endRowIndex - row_offset,
+            overlap.startColumnIndex - col_offset:overlap.endColumnIndex - col_offset
+        ] = True
+    return mask
+
+def evaluate_conditional_format_rules(rules, values, sheetId=0, startRowIndex=0, startColumnIndex=0, today=None):
+    """
+    Resolves which conditional format applies to each cell of a block of a worksheet.
+    As in Sheets, rules are considered in order and the first rule that applies to a cell wins.
+
+    :param rules: An iterable of ``ConditionalFormatRule`` objects, e.g. a ``ConditionalFormatRules``.
+    :param values: A 2-D array-like of the block's cell values.
+    :param sheetId: The sheetId of the worksheet holding the block.
+    :param startRowIndex: 0-based row index of the block's top-left cell.
+    :param startColumnIndex: 0-based column index of the block's top-left cell.
+    :param today: The ``date`` against which relative dates are resolved. Defaults to today.
+
+    :return: A 2-D ``numpy`` object array holding, for each cell, the ``CellFormat`` of the
+             applicable rule (a ``backgroundColor`` format for gradient rules), or None.
+
+    Gradient MIN, MAX, PERCENT and PERCENTILE points are computed from the cells of the
+    rule's ranges that fall inside the block.
+    """
+    arr = _as_grid(values)
+    result = np.full(arr.shape, None, dtype=object)
+    unresolved = np.ones(arr.shape, dtype=bool)
+    for rule in rules:
+        in_rule = np.zeros(arr.shape, dtype=bool)
+        for gridrange in rule.ranges:
+            in_rule |= _window_mask(gridrange, arr.shape, sheetId, startRowIndex, startColumnIndex)
+        candidates = in_rule & unresolved
+        if not candidates.any():
+            continue
+        if rule.booleanRule is not None:
+            hit = candidates & evaluate_condition(rule.booleanRule.condition, arr, today)
+            result[hit] = rule.booleanRule.format
+        else:
+            colors = evaluate_gradient(rule.gradientRule, arr, arr[in_rule])
+            hit = candidates & ~np.isnan(colors[..., 0])
+            palette = {}
+            for r, c in zip(*np.nonzero(hit)):
+                rgb = tuple(float(channel) for channel in colors[r, c])
+                if rgb not in palette:
+                    palette[rgb] = CellFormat(backgroundColor=Color(*rgb))
+                result[r, c] = palette[rgb]
+        unresolved &= ~hit
+    return result
+
+
+def resolve_effective_formats(default_format, user_entered_formats, values, rules=(), 
+        sheetId=0, startRowIndex=0, startColumnIndex=0, today=None):
+    """
+    Combines a spreadsheet's default format, the user-entered formats of a block of cells,
+    and the conditional formats the given rules apply to the block's values, as Sheets does
+    when computing a cell's effective format.
+
+    :param default_format: The spreadsheet's default ``CellFormat``, or None.
+    :param user_entered_formats: A 2-D array-like of ``CellFormat`` objects (or None) of the same
+                                 shape as ``values``.
+    :param values: A 2-D array-like of the block's cell values.
+    :param rules: An iterable of ``ConditionalFormatRule`` objects for the worksheet.
+    :param sheetId: The sheetId of the worksheet holding the block.
+    :param startRowIndex: 0-based row index of the block's top-left cell.
+    :param startColumnIndex: 0-based column index of the block's top-left cell.
+    :param today: The ``date`` against which relative dates are resolved. Defaults to today.
+
+    :return: A 2-D ``numpy`` object array of effective ``CellFormat`` objects (or None).
+             Cells sharing the same combination of formats share one ``CellFormat`` object.
+    """
+    arr = _as_grid(values)
+    user = np.asarray(user_entered_formats, dtype=object).reshape(arr.shape)
+    conditional = evaluate_conditional_format_rules(
+        rules, arr, sheetId, startRowIndex, startColumnIndex, today
+    )
+    result = np.full(arr.shape, None, dtype=object)
+    content_keys = {id(None): None}
+    combined = {}
+    for (r, c), user_fmt in np.ndenumerate(user):
+        cond_fmt = conditional[r, c]
+        # equal user-entered formats may be distinct objects, so combinations are cached by content
+        if id(user_fmt) not in content_keys:
+            content_keys[id(user_fmt)] = json.dumps(user_fmt.to_props(), sort_keys=True)
+        key = (content_keys[id(user_fmt)], id(cond_fmt))
+        if key not in combined:
+            fmt = default_format
+            for layer in (user_fmt, cond_fmt):
+                if layer is not None:
+                    fmt = layer if fmt is None else fmt + layer
+            combined[key] = fmt
+        result[r, c] = combined[key]
+    return result
+
+_SERIAL_EPOCH = np.datetime64('1899-12-30', 'D')
+
+def _cell_value(cell, user_fmt, default_format):
+    ev = cell.get('effectiveValue')
+    if not ev:
+        return None
+    if 'numberValue' in ev:
+        number = ev['numberValue']
+        number_format = None
+        for fmt in (user_fmt, default_format):
+            if fmt is not None and fmt.numberFormat is not None:
+                number_format = fmt.numberFormat
+                break
+        if number_format is not None and number_format.type in ('DATE', 'DATE_TIME'):
+            return (_SERIAL_EPOCH + np.timedelta64(int(number), 'D')).astype(date)
+        return number
+    if 'boolValue' in ev:
+        return ev['boolValue']
+    return ev.get('stringValue')
+
+def get_effective_formats(worksheet, range, today=None):
+    """
+    Computes the effective format of every cell in a range of a worksheet, from a single
+    API read of the spreadsheet's default format, the worksheet's conditional format rules,
+    and the cells' user-entered formats and values. This is far cheaper than calling
+    ``get_effective_format`` for each cell of a large range.
+
+    :param worksheet: The ``Worksheet`` object.
+    :param range: A string with range value in A1 notation, e.g. 'A1:D100'.
+    :param today: The ``date`` against which relative dates are resolved. Defaults to today.
+
+    :return: A 2-D ``numpy`` object array of ``CellFormat`` objects (or None), one per cell of
+             the range (clipped to the worksheet's data for unbounded ranges).
+
+    Conditional formats are evaluated locally (see ``evaluate_conditional_format_rules``),
+    so rules with custom formulas cause ``ValueError``.
+    """
+    resp = _fetch_sheet_metadata(worksheet.spreadsheet, {
+        'includeGridData': True,
+        'ranges': ['%s!%s' % (worksheet.title, range)],
+        'fields': (
+            'properties.defaultFormat,sheets(properties.sheetId,conditionalFormats,'
+            'data(startRow,startColumn,rowData.values(userEnteredFormat,effectiveValue)))'
+        )
+    }, 'get_effective_formats')
+    default_props = resp.get('properties', {}).get('defaultFormat')
+    default_format = CellFormat.from_props(default_props) if default_props else None
+    sheet = resp['sheets'][0]
+    data = sheet['data'][0]
+    rules = [ConditionalFormatRule.from_props(p) for p in sheet.get('conditionalFormats', [])]
+
+    bounds = _range_to_gridrange_object(range, worksheet.id)
+    start_row = data.get('startRow', 0)
+    start_col = data.get('startColumn', 0)
+    row_data = data.get('rowData', [])
+    height = bounds.get('endRowIndex', start_row + len(row_data)) - start_row
+    width = bounds.get('endColumnIndex', start_col + max([len(r.get('values', [])) for r in row_data] or [0])) - start_col
+
+    values = np.full((height, width), None, dtype=object)
+    user = np.full((height, width), None, dtype=object)
+    parsed = {}
+    for r, row in enumerate(row_data[:height]):
+        for c, cell in enumerate(row.get('values', [])[:width]):
+            props = cell.get('userEnteredFormat')
+            fmt = None
+            if props:
+                key = json.dumps(props, sort_keys=True)
+                if key not in parsed:
+                    parsed[key] = CellFormat.from_props(props)
+                fmt = parsed[key]
+            user[r, c] = fmt
+            values[r, c] = _cell_value(cell, fmt, default_format)
+    return resolve_effective_formats(
+        default_format, user, values, rules, worksheet.id, start_row, start_col, today
+    )
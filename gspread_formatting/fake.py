@@ -0,0 +1,972 @@
+# -*- coding: utf-8 -*-
+"""
+An in-process stand-in for the Google Sheets API's ``spreadsheets.get`` and
+``spreadsheets.batchUpdate`` endpoints, for testing and benchmarking formatting jobs
+without a Google account. A ``FakeSheetsService`` keeps spreadsheets in memory;
+``FakeSpreadsheet`` and ``FakeWorksheet`` offer the parts of gspread's ``Spreadsheet``
+and ``Worksheet`` interfaces used by this package, so that its functions, batch updaters
+and ``format_with_dataframe`` run against them unchanged::
+
+    service = FakeSheetsService(latency=0.2, throttle_rate=0.05)
+    worksheet = service.create('Report').sheet1
+    format_with_dataframe(worksheet, dataframe)
+    get_user_entered_format(worksheet, 'A1')
+
+The supported requests are ``repeatCell``, ``updateCells``, ``setDataValidation``,
+``updateDimensionProperties``, ``updateSheetProperties``, ``addSheet``, ``deleteSheet``,
+``addConditionalFormatRule``, ``updateConditionalFormatRule``, ``deleteConditionalFormatRule``,
+``addBanding``, ``updateBanding``, ``deleteBanding``, ``copyPaste`` (not transposed) and
+``updateBorders``. As with the real API, requests
+of other kinds, ranges outside a sheet's grid and malformed field masks fail with an
+``APIError`` (status 400), and a failed ``batchUpdate`` leaves the spreadsheet unchanged.
+
+Formulas are not evaluated, and a cell's ``effectiveFormat`` is the spreadsheet's default
+format overlaid with the cell's ``userEnteredFormat``; conditional format rules are stored
+and returned but not applied (see ``gspread_formatting.evaluation`` for that).
+"""
+
+from .util import _range_to_gridrange_object
+
+try:
+    from gspread.http_client import HTTPClient
+except ImportError:
+    # gspread < 6.0.0 builds worksheets without a client
+    HTTPClient = None
+
+from collections import deque
+import itertools
+import json
+import random
+import re
+import threading
+import time
+
+__all__ = ('FakeSheetsService', 'FakeSpreadsheet', 'FakeWorksheet')
+
+DEFAULT_ROW_COUNT = 1000
+DEFAULT_COLUMN_COUNT = 26
+DEFAULT_ROW_HEIGHT = 21
+DEFAULT_COLUMN_WIDTH = 100
+DEFAULT_CELL_FORMAT = {
+    'backgroundColor': {'red': 1, 'green': 1, 'blue': 1},
+    'padding': {'top': 2, 'right': 3, 'bottom': 2, 'left': 3},
+    'verticalAlignment': 'BOTTOM',
+    'wrapStrategy': 'OVERFLOW_CELL',
+    'textFormat': {
+        'foregroundColor': {},
+        'fontFamily': 'arial,sans,sans-serif',
+        'fontSize': 10,
+        'bold': False,
+        'italic': False,
+        'strikethrough': False,
+        'underline': False
+    }
+}
+_MINUTE = 60.0
+
+_FIELD_NAME = re.compile(r'[A-Za-z_][A-Za-z0-9_]*|\*')
+
+
+def _parse_fields(fields):
+    """
+    Parses a field mask, such as ``'userEnteredFormat.textFormat.bold,userEnteredFormat.padding'``
+    or ``'sheets(properties.sheetId,data.rowData.values(userEnteredFormat))'``, into a tree
+    of nested dicts in which ``None`` marks a field selected with all its subfields.
+    """
+    fields = re.sub(r'\s+', '', fields)
+    tree = {}
+    pos = _parse_field_list(fields, 0, tree)
+    if pos != len(fields):
+        raise _InvalidRequest("Invalid field mask: %r" % fields)
+    return tree
+
+def _parse_field_list(fields, pos, tree):
+    while True:
+        node = tree
+        match = _FIELD_NAME.match(fields, pos)
+        while match and match.end() < len(fields) and fields[match.end()] in './':
+            node = _subtree(node, match.group())
+            match = _FIELD_NAME.match(fields, match.end() + 1)
+        if not match:
+            raise _InvalidRequest("Invalid field mask: %r" % fields)
+        name, pos = match.group(), match.end()
+        if fields[pos:pos + 1] == '(':
+            sub = _subtree(node, name)
+            pos = _parse_field_list(fields, pos + 1, {} if sub is None else sub)
+            if fields[pos:pos + 1] != ')':
+                raise _InvalidRequest("Invalid field mask: %r" % fields)
+            pos += 1
+        elif node is not None:
+            node[name] = None
+        if fields[pos:pos + 1] != ',':
+            return pos
+        pos += 1
+
+def _subtree(node, name):
+    # a field already selected in full (None) needs no narrower selection
+    if node is None:
+        return None
+    return node.setdefault(name, {})
+
+def _selects(tree, path):
+    for name in path:
+        if tree is None or '*' in tree:
+            return True
+        if name not in tree:
+            return False
+        tree = tree[name]
+    return True
+
+def _select(value, tree):
+    """The parts of ``value`` selected by a field mask tree, as in a partial response."""
+    if tree is None or '*' in tree:
+        return value
+    if isinstance(value, list):
+        return [_select(v, tree) for v in value]
+    if not isinstance(value, dict):
+        return value
+    return dict((name, _select(value[name], sub)) for name, sub in tree.items() if name in value)
+
+def _masked_update(target, source, tree):
+    """
+    Returns a copy of ``target`` whose fields selected by the field mask tree are
+    taken from ``source``, or removed where ``source`` lacks them. Neither argument
+    is modified, so stored objects can be shared between cells.
+    """
+    if tree is None or '*' in tree:
+        return source
+    result = dict(target or {})
+    for name, sub in tree.items():
+        # a repeated field, like textFormatRuns, is replaced as a whole
+        if sub is None or isinstance(source.get(name), list) or isinstance(result.get(name), list):
+            if name in source:
+                result[name] = source[name]
+            else:
+                result.pop(name, None)
+        else:
+            value = _masked_update(result.get(name) or {}, source.get(name) or {}, sub)
+            if value:
+                result[name] = value
+            else:
+                result.pop(name, None)
+    return result
+
+def _overlay(base, top):
+    result = dict(base)
+    for name, value in top.items():
+        if isinstance(value, dict) and isinstance(result.get(name), dict):
+            value = _overlay(result[name], value)
+        result[name] = value
+    return result
+
+def _copy(obj):
+    # requests and responses are JSON, which copies much faster than copy.deepcopy
+    return json.loads(json.dumps(obj))
+
+def _truthy(value):
+    if isinstance(value, str):
+        return value.lower() == 'true'
+    return bool(value)
+
+def _api_error(code, status, message):
+    from gspread.exceptions import APIError
+    from requests import Response
+    response = Response()
+    response.status_code = code
+    response.headers['Content-Type'] = 'application/json; charset=UTF-8'
+    response._content = json.dumps(
+        {'error': {'code': code, 'message': message, 'status': status}}
+    ).encode('utf-8')
+    return APIError(response)
+
+
+class _InvalidRequest(Exception):
+    pass
+
+
+class _Journal(object):
+    """Records changes to the stored dicts, so that a failed batch can be undone."""
+    def __init__(self):
+        self.entries = []
+
+    def put(self, mapping, key, value):
+        self.entries.append((mapping, key, key in mapping, mapping.get(key)))
+        mapping[key] = value
+
+    def pop(self, mapping, key):
+        if key in mapping:
+            self.entries.append((mapping, key, True, mapping.pop(key)))
+
+    def rollback(self):
+        for mapping, key, existed, value in reversed(self.entries):
+            if existed:
+                mapping[key] = value
+            else:
+                mapping.pop(key, None)
+        del self.entries[:]
+
+
+class FakeSheetsService(object):
+    """
+    Spreadsheets kept in memory, served by ``get`` and ``batch_update`` methods that take
+    and return the JSON bodies of the Sheets API's ``spreadsheets.get`` and
+    ``spreadsheets.batchUpdate`` endpoints. Calls can be slowed down, and made to fail with
+    a 429 ``APIError`` (status ``RESOURCE_EXHAUSTED``) as when a quota is exceeded, to
+    benchmark formatting jobs under realistic conditions.
+
+    ``calls`` counts calls by endpoint, ``request_counts`` counts the requests applied
+    by ``batchUpdate`` by kind, and ``throttled`` counts the calls failed with a 429.
+    """
+
+    def __init__(self,
+        latency=0,
+        throttle_rate=0,
+        max_calls_per_minute=None,
+        seed=None,
+        sleep=time.sleep,
+        clock=time.monotonic):
+        """
+        :param latency: seconds taken by each call, or a function of the endpoint name
+                        (``'get'`` or ``'batchUpdate'``) and the number of requests in the
+                        call (0 for ``get``) returning the seconds taken.
+        :param throttle_rate: probability that a call fails with a 429 ``APIError``.
+        :param max_calls_per_minute: if given, calls beyond this many in any 60 seconds
+                                     fail with a 429 ``APIError``.
+        :param seed: seed for the random failures, for repeatable runs.
+        :param sleep: function used to wait out the latency, e.g. a no-op in tests.
+        :param clock: function returning the time in seconds, for ``max_calls_per_minute``.
+        """
+        if not 0 <= throttle_rate <= 1:
+            raise ValueError("throttle_rate must be between 0 and 1")
+        self.latency = latency
+        self.throttle_rate = throttle_rate
+        self.max_calls_per_minute = max_calls_per_minute
+        self.sleep = sleep
+        self.clock = clock
+        self.calls = {'get': 0, 'batchUpdate': 0}
+        self.request_counts = {}
+        self.throttled = 0
+        self._random = random.Random(seed)
+        self._call_times = deque()
+        self._throttle_next = 0
+        self._spreadsheets = {}
+        self._spreadsheet_ids = itertools.count(1)
+        self._lock = threading.RLock()
+
+    def create(self, title='Untitled spreadsheet', rows=DEFAULT_ROW_COUNT, cols=DEFAULT_COLUMN_COUNT):
+        """Creates a spreadsheet with one worksheet, 'Sheet1', and returns it as a ``FakeSpreadsheet``."""
+        with self._lock:
+            spreadsheet_id = 'fake-spreadsheet-%d' % next(self._spreadsheet_ids)
+            self._spreadsheets[spreadsheet_id] = {
+                'spreadsheetId': spreadsheet_id,
+                'properties': {
+                    'title': title,
+                    'locale': 'en_US',
+                    'autoRecalc': 'ON_CHANGE',
+                    'timeZone': 'Etc/GMT',
+                    'defaultFormat': _copy(DEFAULT_CELL_FORMAT)
+                },
+                'sheets': [],
+                'nextSheetId': 0
+            }
+        spreadsheet = FakeSpreadsheet(self, spreadsheet_id, title)
+        spreadsheet.add_worksheet('Sheet1', rows, cols)
+        return spreadsheet
+
+    def open(self, spreadsheet_id):
+        """Returns the ``FakeSpreadsheet`` with the given id."""
+        with self._lock:
+            state = self._spreadsheet(spreadsheet_id)
+            return FakeSpreadsheet(self, spreadsheet_id, state['properties']['title'])
+
+    def throttle_next(self, calls=1):
+        """Makes the next ``calls`` calls fail with a 429 ``APIError``."""
+        with self._lock:
+            self._throttle_next += calls
+
+    def get(self, spreadsheet_id, params=None):
+        """
+        Serves ``spreadsheets.get``. ``params`` may have ``ranges`` (a list of A1 ranges,
+        optionally prefixed by a sheet title), ``includeGridData`` and ``fields``, a field mask
+        selecting the parts of the response. As in the real API, ``includeGridData`` is
+        ignored when ``fields`` is given, and grid data is then returned if it is selected.
+        """
+        params = params or {}
+        self._begin_call('get', 0)
+        with self._lock:
+            state = self._spreadsheet(spreadsheet_id)
+            try:
+                tree = _parse_fields(params['fields']) if params.get('fields') else None
+                if tree is None:
+                    include_data = _truthy(params.get('includeGridData'))
+                else:
+                    include_data = _selects(tree, ('sheets', 'data'))
+                ranges = params.get('ranges') or []
+                if isinstance(ranges, str):
+                    ranges = [ranges]
+                resp = self._spreadsheet_resource(
+                    state, ranges, include_data,
+                    _selects(tree, ('sheets', 'data', 'rowData', 'values', 'effectiveFormat'))
+                )
+            except _InvalidRequest as e:
+                raise _api_error(400, 'INVALID_ARGUMENT', str(e))
+            if tree is not None:
+                resp = _select(resp, tree)
+            return _copy(resp)
+
+    def batch_update(self, spreadsheet_id, body):
+        """
+        Serves ``spreadsheets.batchUpdate``, applying ``body['requests']`` in order; if any
+        request is invalid, or there are none, none are applied. Returns ``{'spreadsheetId': ..., 'replies': [...]}``.
+        """
+        requests = _copy(_flattened(body.get('requests') or []))
+        self._begin_call('batchUpdate', len(requests))
+        if not requests:
+            raise _api_error(400, 'INVALID_ARGUMENT', 'Must specify at least one request.')
+        with self._lock:
+            state = self._spreadsheet(spreadsheet_id)
+            journal = _Journal()
+            replies = []
+            for idx, request in enumerate(requests):
+                if not isinstance(request, dict) or len(request) != 1:
+                    journal.rollback()
+                    raise _api_error(400, 'INVALID_ARGUMENT', 'Invalid requests[%d]: exactly one kind of request must be set' % idx)
+                kind, request_body = next(iter(request.items()))
+                handler = _REQUEST_HANDLERS.get(kind)
+                try:
+                    if handler is None:
+                        raise _InvalidRequest('request kind is not supported by FakeSheetsService')
+                    reply = getattr(self, handler)(state, request_body, journal)
+                except _InvalidRequest as e:
+                    journal.rollback()
+                    raise _api_error(400, 'INVALID_ARGUMENT', 'Invalid requests[%d].%s: %s' % (idx, kind, e))
+                replies.append(reply or {})
+            for request in requests:
+                for kind in request:
+                    self.request_counts[kind] = self.request_counts.get(kind, 0) + 1
+            return {'spreadsheetId': spreadsheet_id, 'replies': replies}
+
+    def _begin_call(self, endpoint, request_count):
+        latency = self.latency(endpoint, request_count) if callable(self.latency) else self.latency
+        if latency:
+            self.sleep(latency)
+        with self._lock:
+            self.calls[endpoint] += 1
+            now = self.clock()
+            while self._call_times and self._call_times[0] <= now - _MINUTE:
+                self._call_times.popleft()
+            self._call_times.append(now)
+            if self._throttle_next:
+                self._throttle_next -= 1
+            elif not (
+                (self.throttle_rate and self._random.random() < self.throttle_rate) or
+                (self.max_calls_per_minute and len(self._call_times) > self.max_calls_per_minute)
+            ):
+                return
+            self.throttled += 1
+        raise _api_error(
+            429, 'RESOURCE_EXHAUSTED',
+            "Quota exceeded for quota metric '{0} requests' and limit '{0} requests per minute per user'"
+            .format('Read' if endpoint == 'get' else 'Write')
+        )
+
+    def _spreadsheet(self, spreadsheet_id):
+        try:
+            return self._spreadsheets[spreadsheet_id]
+        except KeyError:
+            raise _api_error(404, 'NOT_FOUND', 'Requested entity was not found.')
+
+    # reading
+
+    def _spreadsheet_resource(self, state, ranges, include_data, include_effective_format):
+        data_ranges = {}
+        for a1 in ranges:
+            sheet, gridrange = self._parse_a1(state, a1)
+            data_ranges.setdefault(sheet['properties']['sheetId'], []).append(
+                self._bounds(sheet, gridrange)
+            )
+        sheets = []
+        for sheet in state['sheets']:
+            sheet_id = sheet['properties']['sheetId']
+            if ranges and sheet_id not in data_ranges:
+                continue
+            resource = {'properties': sheet['properties']}
+            if include_data:
+                bounds = data_ranges.get(sheet_id) or [self._bounds(sheet, {})]
+                resource['data'] = [
+                    self._grid_data(state, sheet, include_effective_format, *b) for b in bounds
+                ]
+            if sheet['conditionalFormats']:
+                resource['conditionalFormats'] = sheet['conditionalFormats']
+            if sheet['bandedRanges']:
+                resource['bandedRanges'] = sheet['bandedRanges']
+            sheets.append(resource)
+        return {
+            'spreadsheetId': state['spreadsheetId'],
+            'properties': state['properties'],
+            'sheets': sheets,
+            'spreadsheetUrl': 'https://docs.google.com/spreadsheets/d/%s/edit' % state['spreadsheetId']
+        }
+
+    def _parse_a1(self, state, a1):
+        title, _, cells = a1.rpartition('!')
+        if not title:
+            for sheet in state['sheets']:
+                if sheet['properties']['title'] == cells:
+                    return sheet, {}
+            if not state['sheets']:
+                raise _InvalidRequest('Unable to parse range: %s' % a1)
+            sheet = state['sheets'][0]
+        else:
+            if len(title) > 1 and title[0] == title[-1] == "'":
+                title = title[1:-1].replace("''", "'")
+            for sheet in state['sheets']:
+                if sheet['properties']['title'] == title:
+                    break
+            else:
+                raise _InvalidRequest('Unable to parse range: %s' % a1)
+        try:
+            return sheet, _range_to_gridrange_object(cells, sheet['properties']['sheetId'])
+        except (ValueError, TypeError):
+            raise _InvalidRequest('Unable to parse range: %s' % a1)
+
+    def _grid_data(self, state, sheet, include_effective_format, first_row, last_row, first_col, last_col):
+        effective_format = None
+        if include_effective_format:
+            effective_format = _EffectiveFormats(state['properties'].get('defaultFormat', {}))
+        cells = sheet['cells']
+        by_row = {}
+        if (last_row - first_row) * (last_col - first_col) <= len(cells):
+            for r in range(first_row, last_row):
+                for c in range(first_col, last_col):
+                    cell = cells.get((r, c))
+                    if cell:
+                        by_row.setdefault(r, {})[c] = cell
+        else:
+            for (r, c), cell in cells.items():
+                if first_row <= r < last_row and first_col <= c < last_col:
+                    by_row.setdefault(r, {})[c] = cell
+        resources = {}
+        def resource(cell):
+            entry = resources.get(id(cell))
+            if entry is None:
+                entry = resources[id(cell)] = (cell, _cell_resource(effective_format, cell))
+            return entry[1]
+        row_data = []
+        for r in range(first_row, max(by_row) + 1 if by_row else first_row):
+            row = by_row.get(r)
+            if not row:
+                row_data.append({})
+                continue
+            row_data.append({'values': [
+                resource(row.get(c))
+                for c in range(first_col, max(row) + 1)
+            ]})
+        data = {
+            'rowMetadata': [
+                _overlay({'pixelSize': DEFAULT_ROW_HEIGHT}, sheet['rowMetadata'].get(r, {}))
+                for r in range(first_row, last_row)
+            ],
+            'columnMetadata': [
+                _overlay({'pixelSize': DEFAULT_COLUMN_WIDTH}, sheet['columnMetadata'].get(c, {}))
+                for c in range(first_col, last_col)
+            ]
+        }
+        # like the real API, empty row data and zero offsets are omitted
+        if row_data:
+            data['rowData'] = row_data
+        if first_row:
+            data['startRow'] = first_row
+        if first_col:
+            data['startColumn'] = first_col
+        return data
+
+    # writing
+
+    def _sheet(self, state, sheet_id):
+        for sheet in state['sheets']:
+            if sheet['properties']['sheetId'] == sheet_id:
+                return sheet
+        raise _InvalidRequest('No grid with id: %s' % sheet_id)
+
+    def _bounds(self, sheet, gridrange):
+        """(first row, end row, first column, end column) of a GridRange, which must lie in the grid."""
+        grid = sheet['properties']['gridProperties']
+        bounds = (
+            gridrange.get('startRowIndex', 0), gridrange.get('endRowIndex', grid['rowCount']),
+            gridrange.get('startColumnIndex', 0), gridrange.get('endColumnIndex', grid['columnCount'])
+        )
+        if min(bounds) < 0 or bounds[1] > grid['rowCount'] or bounds[3] > grid['columnCount']:
+            raise _InvalidRequest(
+                "Range (%s) exceeds grid limits. Max rows: %d, max columns: %d"
+                % (json.dumps(gridrange, sort_keys=True), grid['rowCount'], grid['columnCount'])
+            )
+        return bounds
+
+    def _range_of(self, state, gridrange):
+        sheet = self._sheet(state, gridrange.get('sheetId', 0))
+        return sheet, self._bounds(sheet, gridrange)
+
+    def _write_cells(self, cells, keys_and_sources, tree, journal):
+        # cells updated alike end up sharing one stored dict
+        memo = {}
+        for key, source in keys_and_sources:
+            old = cells.get(key)
+            memo_key = (id(old), id(source))
+            if memo_key in memo:
+                new = memo[memo_key][2]
+            else:
+                new = _masked_update(old, source, tree)
+                memo[memo_key] = (old, source, new)
+            if new:
+                journal.put(cells, key, new)
+            else:
+                journal.pop(cells, key)
+
+    def _fields(self, body):
+        if not body.get('fields'):
+            raise _InvalidRequest('At least one field must be specified.')
+        return _parse_fields(body['fields'])
+
+    def _repeat_cell(self, state, body, journal):
+        sheet, (r0, r1, c0, c1) = self._range_of(state, body.get('range', {}))
+        cell = body.get('cell', {})
+        self._write_cells(
+            sheet['cells'],
+            (((r, c), cell) for r in range(r0, r1) for c in range(c0, c1)),
+            self._fields(body), journal
+        )
+
+    def _update_cells(self, state, body, journal):
+        rows = [row.get('values', []) for row in body.get('rows', [])]
+        if 'start' in body:
+            start = body['start']
+            width = max([len(values) for values in rows] or [0])
+            sheet, (r0, r1, c0, c1) = self._range_of(state, {
+                'sheetId': start.get('sheetId', 0),
+                'startRowIndex': start.get('rowIndex', 0),
+                'endRowIndex': start.get('rowIndex', 0) + len(rows),
+                'startColumnIndex': start.get('columnIndex', 0),
+                'endColumnIndex': start.get('columnIndex', 0) + width
+            })
+            cells = (
+                ((r0 + y, c0 + x), source)
+                for y, values in enumerate(rows) for x, source in enumerate(values)
+            )
+        elif 'range' in body:
+            # cells of the range not covered by the rows are cleared
+            sheet, (r0, r1, c0, c1) = self._range_of(state, body['range'])
+            empty = {}
+            cells = (
+                ((r, c), rows[r - r0][c - c0] if r - r0 < len(rows) and c - c0 < len(rows[r - r0]) else empty)
+                for r in range(r0, r1) for c in range(c0, c1)
+            )
+        else:
+            raise _InvalidRequest('Either start or range must be set.')
+        self._write_cells(sheet['cells'], cells, self._fields(body), journal)
+
+    def _copy_paste(self, state, body, journal):
+        paste_type = body.get('pasteType', 'PASTE_NORMAL')
+        if paste_type not in _PASTE_FIELDS:
+            raise _InvalidRequest('pasteType %s is not supported by FakeSheetsService' % paste_type)
+        if body.get('pasteOrientation', 'NORMAL') != 'NORMAL':
+            raise _InvalidRequest('pasteOrientation %s is not supported by FakeSheetsService' % body['pasteOrientation'])
+        source_sheet, (sr0, sr1, sc0, sc1) = self._range_of(state, body.get('source', {}))
+        dest_sheet, (dr0, dr1, dc0, dc1) = self._range_of(state, body.get('destination', {}))
+        height, width = sr1 - sr0, sc1 - sc0
+        if not height or not width:
+            return
+        # as in Sheets, the source repeats to fill a destination that is a multiple of its size
+        rows = dr1 - dr0 if (dr1 - dr0) % height == 0 else height
+        cols = dc1 - dc0 if (dc1 - dc0) % width == 0 else width
+        dest_sheet, _ = self._range_of(state, {
+            'sheetId': dest_sheet['properties']['sheetId'],
+            'startRowIndex': dr0, 'endRowIndex': dr0 + rows,
+            'startColumnIndex': dc0, 'endColumnIndex': dc0 + cols
+        })
+        empty = {}
+        source = dict(
+            ((r, c), source_sheet['cells'].get((sr0 + r, sc0 + c), empty))
+            for r in range(height) for c in range(width)
+        )
+        self._write_cells(
+            dest_sheet['cells'],
+            (((dr0 + r, dc0 + c), source[r % height, c % width]) for r in range(rows) for c in range(cols)),
+            _parse_fields(_PASTE_FIELDS[paste_type]), journal
+        )
+
+    def _update_borders(self, state, body, journal):
+        sheet, (r0, r1, c0, c1) = self._range_of(state, body.get('range', {}))
+        # inner lines are stored as sides of the cells on both sides of them
+        for key, side, rows, cols in (
+            ('top', 'top', range(r0, r0 + 1), range(c0, c1)),
+            ('bottom', 'bottom', range(r1 - 1, r1), range(c0, c1)),
+            ('left', 'left', range(r0, r1), range(c0, c0 + 1)),
+            ('right', 'right', range(r0, r1), range(c1 - 1, c1)),
+            ('innerHorizontal', 'bottom', range(r0, r1 - 1), range(c0, c1)),
+            ('innerHorizontal', 'top', range(r0 + 1, r1), range(c0, c1)),
+            ('innerVertical', 'right', range(r0, r1), range(c0, c1 - 1)),
+            ('innerVertical', 'left', range(r0, r1), range(c0 + 1, c1))
+        ):
+            border = body.get(key)
+            if border is None or r0 >= r1 or c0 >= c1:
+                continue
+            source = {} if border.get('style') == 'NONE' else {'userEnteredFormat': {'borders': {side: border}}}
+            self._write_cells(
+                sheet['cells'], (((r, c), source) for r in rows for c in cols),
+                _parse_fields('userEnteredFormat.borders.' + side), journal
+            )
+
+    def _set_data_validation(self, state, body, journal):
+        sheet, (r0, r1, c0, c1) = self._range_of(state, body.get('range', {}))
+        cell = {'dataValidation': body['rule']} if body.get('rule') else {}
+        self._write_cells(
+            sheet['cells'],
+            (((r, c), cell) for r in range(r0, r1) for c in range(c0, c1)),
+            {'dataValidation': None}, journal
+        )
+
+    def _update_dimension_properties(self, state, body, journal):
+        dimension_range = body.get('range', {})
+        sheet = self._sheet(state, dimension_range.get('sheetId', 0))
+        dimension = dimension_range.get('dimension')
+        if dimension not in ('ROWS', 'COLUMNS'):
+            raise _InvalidRequest('range.dimension must be ROWS or COLUMNS')
+        gridrange = {'sheetId': dimension_range.get('sheetId', 0)}
+        prefix = 'Row' if dimension == 'ROWS' else 'Column'
+        if 'startIndex' in dimension_range:
+            gridrange['start%sIndex' % prefix] = dimension_range['startIndex']
+        if 'endIndex' in dimension_range:
+            gridrange['end%sIndex' % prefix] = dimension_range['endIndex']
+        bounds = self._bounds(sheet, gridrange)
+        metadata = sheet['rowMetadata' if dimension == 'ROWS' else 'columnMetadata']
+        self._write_cells(
+            metadata,
+            ((i, body.get('properties', {})) for i in range(*(bounds[:2] if dimension == 'ROWS' else bounds[2:]))),
+            self._fields(body), journal
+        )
+
+    def _update_sheet_properties(self, state, body, journal):
+        properties = body.get('properties', {})
+        sheet = self._sheet(state, properties.get('sheetId', 0))
+        old = sheet['properties']
+        new = _masked_update(old, properties, self._fields(body))
+        new['sheetId'] = old['sheetId']
+        # the grid size is never cleared, only changed
+        new['gridProperties'] = _overlay(
+            {k: old['gridProperties'][k] for k in ('rowCount', 'columnCount')},
+            new.get('gridProperties', {})
+        )
+        grid = new['gridProperties']
+        if grid['rowCount'] < 1 or grid['columnCount'] < 1:
+            raise _InvalidRequest('rowCount and columnCount must be positive')
+        if new.get('title') != old.get('title') and self._titled(state, new.get('title')):
+            raise _InvalidRequest('A sheet with the name "%s" already exists.' % new.get('title'))
+        journal.put(sheet, 'properties', new)
+        # shrinking the grid deletes the cells outside it
+        for key in [k for k in sheet['cells'] if k[0] >= grid['rowCount'] or k[1] >= grid['columnCount']]:
+            journal.pop(sheet['cells'], key)
+
+    def _titled(self, state, title):
+        return any(sheet['properties']['title'] == title for sheet in state['sheets'])
+
+    def _add_sheet(self, state, body, journal):
+        properties = dict(body.get('properties', {}))
+        if 'sheetId' in properties:
+            if any(s['properties']['sheetId'] == properties['sheetId'] for s in state['sheets']):
+                raise _InvalidRequest('A sheet with id %s already exists.' % properties['sheetId'])
+        else:
+            properties['sheetId'] = state['nextSheetId']
+        journal.put(state, 'nextSheetId', max(state['nextSheetId'], properties['sheetId']) + 1)
+        properties.setdefault('title', 'Sheet%d' % (len(state['sheets']) + 1))
+        if self._titled(state, properties['title']):
+            raise _InvalidRequest('A sheet with the name "%s" already exists.' % properties['title'])
+        properties.setdefault('index', len(state['sheets']))
+        properties.setdefault('sheetType', 'GRID')
+        properties['gridProperties'] = _overlay(
+            {'rowCount': DEFAULT_ROW_COUNT, 'columnCount': DEFAULT_COLUMN_COUNT},
+            properties.get('gridProperties', {})
+        )
+        sheets = list(state['sheets'])
+        sheets.insert(properties['index'], {
+            'properties': properties,
+            'cells': {},
+            'rowMetadata': {},
+            'columnMetadata': {},
+            'conditionalFormats': [],
+            'bandedRanges': []
+        })
+        journal.put(state, 'sheets', sheets)
+        self._reindex(state, journal)
+        return {'addSheet': {'properties': properties}}
+
+    def _delete_sheet(self, state, body, journal):
+        sheet = self._sheet(state, body.get('sheetId', 0))
+        if len(state['sheets']) == 1:
+            raise _InvalidRequest('You can\'t remove all the sheets in a document.')
+        journal.put(state, 'sheets', [s for s in state['sheets'] if s is not sheet])
+        self._reindex(state, journal)
+
+    def _reindex(self, state, journal):
+        for idx, sheet in enumerate(state['sheets']):
+            if sheet['properties'].get('index') != idx:
+                journal.put(sheet, 'properties', dict(sheet['properties'], index=idx))
+
+    def _rule_list(self, state, sheet_id, index, allow_end=False):
+        sheet = self._sheet(state, sheet_id)
+        rules = sheet['conditionalFormats']
+        if not 0 <= index < len(rules) + (1 if allow_end else 0):
+            raise _InvalidRequest('No conditional format on sheet: %s at index: %s' % (sheet_id, index))
+        return sheet, list(rules)
+
+    def _check_rule(self, state, rule):
+        if not rule.get('ranges'):
+            raise _InvalidRequest('rule.ranges must not be empty')
+        sheet_ids = set(r.get('sheetId', 0) for r in rule['ranges'])
+        if len(sheet_ids) > 1:
+            raise _InvalidRequest('All ranges of a conditional format rule must be on the same sheet')
+        for gridrange in rule['ranges']:
+            self._range_of(state, gridrange)
+        return sheet_ids.pop()
+
+    def _add_conditional_format_rule(self, state, body, journal):
+        rule = body.get('rule', {})
+        sheet, rules = self._rule_list(state, self._check_rule(state, rule), body.get('index', 0), True)
+        rules.insert(body.get('index', 0), rule)
+        journal.put(sheet, 'conditionalFormats', rules)
+
+    def _update_conditional_format_rule(self, state, body, journal):
+        index = body.get('index', 0)
+        sheet, rules = self._rule_list(state, body.get('sheetId', 0), index)
+        old_rule = rules[index]
+        if 'rule' in body:
+            if self._check_rule(state, body['rule']) != body.get('sheetId', 0):
+                raise _InvalidRequest('rule.ranges must be on sheet %s' % body.get('sheetId', 0))
+            new_index = index
+            rules[index] = body['rule']
+        elif 'newIndex' in body:
+            new_index = body['newIndex']
+            if not 0 <= new_index < len(rules):
+                raise _InvalidRequest('newIndex is out of range: %s' % new_index)
+            rules.insert(new_index, rules.pop(index))
+        else:
+            raise _InvalidRequest('Either rule or newIndex must be set.')
+        journal.put(sheet, 'conditionalFormats', rules)
+        return {'updateConditionalFormatRule': {
+            'oldIndex': index, 'oldRule': old_rule, 'newIndex': new_index, 'newRule': rules[new_index]
+        }}
+
+    def _delete_conditional_format_rule(self, state, body, journal):
+        index = body.get('index', 0)
+        sheet, rules = self._rule_list(state, body.get('sheetId', 0), index)
+        rule = rules.pop(index)
+        journal.put(sheet, 'conditionalFormats', rules)
+        return {'deleteConditionalFormatRule': {'rule': rule}}
+
+    def _banded_range(self, state, banded_range_id):
+        for sheet in state['sheets']:
+            for idx, banded_range in enumerate(sheet['bandedRanges']):
+                if banded_range['bandedRangeId'] == banded_range_id:
+                    return sheet, idx
+        raise _InvalidRequest('No banded range with id: %s' % banded_range_id)
+
+    def _check_banding(self, state, banded_range, ignore_id=None):
+        if not (banded_range.get('rowProperties') or banded_range.get('columnProperties')):
+            raise _InvalidRequest('Either rowProperties or columnProperties must be set.')
+        sheet, (r0, r1, c0, c1) = self._range_of(state, banded_range.get('range', {}))
+        for other in sheet['bandedRanges']:
+            if other['bandedRangeId'] == ignore_id:
+                continue
+            o0, o1, p0, p1 = self._bounds(sheet, other['range'])
+            if r0 < o1 and o0 < r1 and c0 < p1 and p0 < c1:
+                raise _InvalidRequest(
+                    'You cannot add alternating colors to a range that already has alternating background colors.'
+                )
+        return sheet
+
+    def _add_banding(self, state, body, journal):
+        banded_range = body.get('bandedRange', {})
+        if 'bandedRangeId' not in banded_range:
+            existing = [b['bandedRangeId'] for s in state['sheets'] for b in s['bandedRanges']]
+            banded_range['bandedRangeId'] = max(existing + [0]) + 1
+        elif any(b['bandedRangeId'] == banded_range['bandedRangeId'] for s in state['sheets'] for b in s['bandedRanges']):
+            raise _InvalidRequest('A banded range with id %s already exists.' % banded_range['bandedRangeId'])
+        sheet = self._check_banding(state, banded_range)
+        journal.put(sheet, 'bandedRanges', sheet['bandedRanges'] + [banded_range])
+        return {'addBanding': {'bandedRange': banded_range}}
+
+    def _update_banding(self, state, body, journal):
+        source = body.get('bandedRange', {})
+        sheet, idx = self._banded_range(state, source.get('bandedRangeId'))
+        old = sheet['bandedRanges'][idx]
+        new = _masked_update(old, source, self._fields(body))
+        new['bandedRangeId'] = old['bandedRangeId']
+        new_sheet = self._check_banding(state, new, ignore_id=old['bandedRangeId'])
+        journal.put(sheet, 'bandedRanges', [b for b in sheet['bandedRanges'] if b is not old])
+        journal.put(new_sheet, 'bandedRanges', new_sheet['bandedRanges'] + [new])
+
+    def _delete_banding(self, state, body, journal):
+        sheet, idx = self._banded_range(state, body.get('bandedRangeId'))
+        journal.put(sheet, 'bandedRanges', sheet['bandedRanges'][:idx] + sheet['bandedRanges'][idx + 1:])
+
+_REQUEST_HANDLERS = {
+    'repeatCell': '_repeat_cell',
+    'updateCells': '_update_cells',
+    'setDataValidation': '_set_data_validation',
+    'updateDimensionProperties': '_update_dimension_properties',
+    'updateSheetProperties': '_update_sheet_properties',
+    'addSheet': '_add_sheet',
+    'deleteSheet': '_delete_sheet',
+    'addConditionalFormatRule': '_add_conditional_format_rule',
+    'updateConditionalFormatRule': '_update_conditional_format_rule',
+    'deleteConditionalFormatRule': '_delete_conditional_format_rule',
+    'addBanding': '_add_banding',
+    'updateBanding': '_update_banding',
+    'deleteBanding': '_delete_banding',
+    'copyPaste': '_copy_paste',
+    'updateBorders': '_update_borders'
+}
+
+_PASTE_FIELDS = {
+    'PASTE_NORMAL': 'userEnteredValue,userEnteredFormat,dataValidation,textFormatRuns,note',
+    'PASTE_VALUES': 'userEnteredValue',
+    'PASTE_FORMAT': 'userEnteredFormat,dataValidation',
+    'PASTE_DATA_VALIDATION': 'dataValidation'
+}
+
+def _flattened(requests):
+    # like the real API, accepts the nested lists of requests sent by batch updaters
+    flat = []
+    for request in requests:
+        if isinstance(request, list):
+            flat.extend(_flattened(request))
+        else:
+            flat.append(request)
+    return flat
+
+class _EffectiveFormats(object):
+    """The default format overlaid with each user-entered format, computed once per stored format."""
+    def __init__(self, default_format):
+        self.default_format = default_format
+        self._formats = {}
+
+    def __call__(self, user_format):
+        entry = self._formats.get(id(user_format))
+        if entry is None:
+            entry = self._formats[id(user_format)] = (user_format, _overlay(self.default_format, user_format))
+        return entry[1]
+
+_NO_FORMAT = {}
+
+def _cell_resource(effective_format, cell):
+    if not cell:
+        return {}
+    resource = dict(cell)
+    if effective_format is not None and ('userEnteredFormat' in cell or 'userEnteredValue' in cell):
+        resource['effectiveFormat'] = effective_format(cell.get('userEnteredFormat', _NO_FORMAT))
+    value = cell.get('userEnteredValue')
+    if value and 'formulaValue' not in value:
+        resource['effectiveValue'] = value
+    return resource
+
+
+class _UnsupportedSession(object):
+    """The session of a fake spreadsheet's client: its requests go to the ``FakeSheetsService``."""
+    def request(self, method, url, **kwargs):
+        raise NotImplementedError(
+            "FakeSheetsService only serves spreadsheets.get and spreadsheets.batchUpdate, not %s %s" 
+            % (method.upper(), url)
+        )
+
+
+class FakeSpreadsheet(object):
+    """
+    Stands in for a gspread ``Spreadsheet`` whose data is kept by a ``FakeSheetsService``.
+    Get one from ``FakeSheetsService.create`` or ``FakeSheetsService.open``.
+
+    Its ``client`` is a gspread ``HTTPClient`` that sends no requests, so that gspread's own
+    ``Worksheet`` can be built on it, as functions reading many sheets at once do.
+    """
+    def __init__(self, service, spreadsheet_id, title=None):
+        self.service = service
+        self.id = spreadsheet_id
+        self.client = HTTPClient(None, session=_UnsupportedSession()) if HTTPClient is not None else None
+        self._properties = {'id': spreadsheet_id, 'title': title}
+
+    @property
+    def title(self):
+        return self._properties['title']
+
+    def batch_update(self, body):
+        return self.service.batch_update(self.id, body)
+
+    def fetch_sheet_metadata(self, params=None):
+        if params is None:
+            params = {'includeGridData': 'false'}
+        return self.service.get(self.id, params)
+
+    def worksheets(self):
+        resp = self.fetch_sheet_metadata({'fields': 'sheets.properties'})
+        return [FakeWorksheet(self, sheet['properties']) for sheet in resp['sheets']]
+
+    def worksheet(self, title):
+        for worksheet in self.worksheets():
+            if worksheet.title == title:
+                return worksheet
+        raise ValueError("No worksheet titled %r" % title)
+
+    def get_worksheet(self, index):
+        worksheets = self.worksheets()
+        return worksheets[index] if 0 <= index < len(worksheets) else None
+
+    def get_worksheet_by_id(self, id):
+        for worksheet in self.worksheets():
+            if worksheet.id == id:
+                return worksheet
+        raise ValueError("No worksheet with id %r" % id)
+
+    @property
+    def sheet1(self):
+        return self.get_worksheet(0)
+
+    def add_worksheet(self, title, rows=DEFAULT_ROW_COUNT, cols=DEFAULT_COLUMN_COUNT, index=None):
+        properties = {'title': title, 'gridProperties': {'rowCount': rows, 'columnCount': cols}}
+        if index is not None:
+            properties['index'] = index
+        resp = self.batch_update({'requests': [{'addSheet': {'properties': properties}}]})
+        return FakeWorksheet(self, resp['replies'][0]['addSheet']['properties'])
+
+    def __repr__(self):
+        return '<%s %r id:%s>' % (self.__class__.__name__, self.title, self.id)
+
+
+class FakeWorksheet(object):
+    """Stands in for a gspread ``Worksheet`` of a ``FakeSpreadsheet``."""
+    def __init__(self, spreadsheet, properties):
+        self.spreadsheet = spreadsheet
+        self.spreadsheet_id = spreadsheet.id
+        self.client = spreadsheet.client
+        self._properties = properties
+
+    @property
+    def id(self):
+        return self._properties['sheetId']
+
+    @property
+    def title(self):
+        return self._properties['title']
+
+    @property
+    def index(self):
+        return self._properties['index']
+
+    @property
+    def row_count(self):
+        return self._properties['gridProperties']['rowCount']
+
+    @property
+    def col_count(self):
+        return self._properties['gridProperties']['columnCount']
+
+    def __repr__(self):
+        return '<%s %r id:%s>' % (self.__class__.__name__, self.title, self.id)
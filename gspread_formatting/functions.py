@@ -1,8 +1,9 @@
 # -*- coding: utf-8 -*-
 
 from .util import _fetch_with_updated_properties, _range_to_dimensionrange_object
-from .models import CellFormat, TextFormatRun
+from .models import CellFormat, TextFormatRun, BandedRange
 from .conditionals import DataValidationRule
+from .instrumentation import _span, _batch_update, _fetch_sheet_metadata
 # These imports allow IDEs like PyCharm to verify the existence of these functions, 
 # even though we will rebind the names below with wrapped versions of the functions
 from gspread_formatting.batch_update_requests import * 
@@ -17,14 +18,16 @@ from functools import wraps
 __all__ = (
     'get_default_format', 'get_effective_format', 'get_user_entered_format',
     'get_frozen_row_count', 'get_frozen_column_count', 'get_right_to_left',
-    'get_data_validation_rule', 'get_text_format_runs'
+    'get_data_validation_rule', 'get_text_format_runs', 'get_banded_ranges'
 ) + gspread_formatting.batch_update_requests.__all__
 
 
 def _wrap_as_standalone_function(func):
     @wraps(func)
     def f(worksheet, *args, **kwargs):
-        return worksheet.spreadsheet.batch_update({'requests': func(worksheet, *args, **kwargs)})
+        with _span('build', operation=func.__name__):
+            requests = func(worksheet, *args, **kwargs)
+        return _batch_update(worksheet.spreadsheet, {'requests': requests}, func.__name__)
     return f
 
 for _fname in gspread_formatting.batch_update_requests.__all__:
@@ -48,11 +51,11 @@ def get_data_validation_rule(worksheet, label):
     """
     label = '%s!%s' % (worksheet.title, rowcol_to_a1(*a1_to_rowcol(label)))
 
-    resp = worksheet.spreadsheet.fetch_sheet_metadata({
+    resp = _fetch_sheet_metadata(worksheet.spreadsheet, {
         'includeGridData': True,
         'ranges': [label],
         'fields': 'sheets.data.rowData.values.effectiveFormat,sheets.data.rowData.values.dataValidation'
-    })
+    }, 'get_data_validation_rule')
     data = resp['sheets'][0]['data'][0]
     props = data.get('rowData', [{}])[0].get('values', [{}])[0].get('dataValidation')
     return DataValidationRule.from_props(props) if props else None
@@ -60,7 +63,7 @@ def get_data_validation_rule(worksheet, label):
 
 def get_default_format(spreadsheet):
     """Return Default CellFormat for spreadsheet, or None if no default formatting was specified."""
-    fmt = _fetch_with_updated_properties(spreadsheet, 'defaultFormat')
+    fmt = _fetch_with_updated_properties(spreadsheet, 'defaultFormat', operation='get_default_format')
     return CellFormat.from_props(fmt) if fmt else None
 
 
@@ -82,11 +85,11 @@ def get_effective_format(worksheet, label):
     """
     label = '%s!%s' % (worksheet.title, rowcol_to_a1(*a1_to_rowcol(label)))
 
-    resp = worksheet.spreadsheet.fetch_sheet_metadata({
+    resp = _fetch_sheet_metadata(worksheet.spreadsheet, {
         'includeGridData': True,
         'ranges': [label],
         'fields': 'sheets.data.rowData.values.effectiveFormat'
-    })
+    }, 'get_effective_format')
     data = resp['sheets'][0]['data'][0]
     props = data.get('rowData', [{}])[0].get('values', [{}])[0].get('effectiveFormat')
     return CellFormat.from_props(props) if props else None
@@ -109,11 +112,11 @@ def get_user_entered_format(worksheet, label):
     """
     label = '%s!%s' % (worksheet.title, rowcol_to_a1(*a1_to_rowcol(label)))
 
-    resp = worksheet.spreadsheet.fetch_sheet_metadata({
+    resp = _fetch_sheet_metadata(worksheet.spreadsheet, {
         'includeGridData': True,
         'ranges': [label],
         'fields': 'sheets.data.rowData.values.userEnteredFormat'
-    })
+    }, 'get_user_entered_format')
     data = resp['sheets'][0]['data'][0]
     props = data.get('rowData', [{}])[0].get('values', [{}])[0].get('userEnteredFormat')
     return CellFormat.from_props(props) if props else None
@@ -136,32 +139,47 @@ def get_text_format_runs(worksheet, label):
     """
     label = '%s!%s' % (worksheet.title, rowcol_to_a1(*a1_to_rowcol(label)))
 
-    resp = worksheet.spreadsheet.fetch_sheet_metadata({
+    resp = _fetch_sheet_metadata(worksheet.spreadsheet, {
         'includeGridData': True,
         'ranges': [label],
         'fields': 'sheets.data.rowData.values.textFormatRuns'
-    })
+    }, 'get_text_format_runs')
     data = resp['sheets'][0]['data'][0]
     props = data.get('rowData', [{}])[0].get('values', [{}])[0].get('textFormatRuns', [])
     return [TextFormatRun.from_props(item) for item in props]
 
 
+def get_banded_ranges(worksheet):
+    """Returns a list of BandedRange objects, one for each range of alternating
+    colors in the worksheet. The list will be empty if there is no banding.
+
+    :param worksheet: Worksheet object whose banded ranges are desired.
+    """
+    resp = _fetch_sheet_metadata(worksheet.spreadsheet, {
+        'fields': 'sheets(properties.sheetId,bandedRanges)'
+    }, 'get_banded_ranges')
+    for sheet in resp['sheets']:
+        if sheet['properties']['sheetId'] == worksheet.id:
+            return [BandedRange.from_props(p) for p in sheet.get('bandedRanges', [])]
+    return []
+
+
 def get_frozen_row_count(worksheet):
-    md = worksheet.spreadsheet.fetch_sheet_metadata({'includeGridData': True})
+    md = _fetch_sheet_metadata(worksheet.spreadsheet, {'includeGridData': True}, 'get_frozen_row_count')
     sheet_data = finditem(lambda i: i['properties']['title'] == worksheet.title, md['sheets'])
     grid_props = sheet_data['properties']['gridProperties']
     return grid_props.get('frozenRowCount')
 
 
 def get_frozen_column_count(worksheet):
-    md = worksheet.spreadsheet.fetch_sheet_metadata({'includeGridData': True})
+    md = _fetch_sheet_metadata(worksheet.spreadsheet, {'includeGridData': True}, 'get_frozen_column_count')
     sheet_data = finditem(lambda i: i['properties']['title'] == worksheet.title, md['sheets'])
     grid_props = sheet_data['properties']['gridProperties']
     return grid_props.get('frozenColumnCount')
 
 def get_right_to_left(worksheet):
     """Returns True or False (never None) if worksheet is rightToLeft."""
-    md = worksheet.spreadsheet.fetch_sheet_metadata({'includeGridData': True})
+    md = _fetch_sheet_metadata(worksheet.spreadsheet, {'includeGridData': True}, 'get_right_to_left')
     sheet_data = finditem(lambda i: i['properties']['title'] == worksheet.title, md['sheets'])
     pr = sheet_data['properties']
     return bool(pr.get('rightToLeft'))
@@ -0,0 +1,321 @@
+# -*- coding: utf-8 -*-
+"""
+A ``FormatGrid`` holds the formats of a rectangle of cells as a palette of distinct
+``CellFormat`` objects and a NumPy ``int32`` array of palette ids, one per cell, rather than
+as separate (range, ``CellFormat``) pairs. Formats can be read and assigned by A1 range, by
+NumPy index or by boolean mask; two grids can be compared cell by cell; and a grid compiles
+to few ``repeatCell`` requests, one per rectangle of cells sharing a format -- or, given the
+grid the worksheet currently has, only to requests for the cells that differ::
+
+    grid = get_format_grid(worksheet, 'A1:F1000')
+    wanted = grid.copy()
+    wanted['A1:F1'] = header_format
+    wanted[values > 100] = highlight_format
+    apply_format_grid(worksheet, wanted, base=grid)
+
+Requires ``numpy``.
+"""
+
+from .models import CellFormat
+from .util import _range_to_gridrange_object, _props_key
+from .instrumentation import _span, _batch_update, _fetch_sheet_metadata
+
+from gspread.utils import rowcol_to_a1
+
+import numpy as np
+
+__all__ = ('FormatGrid', 'get_format_grid', 'apply_format_grid')
+
+# the id of cells having no format
+NO_FORMAT = -1
+
+
+def _format_key(cell_format):
+    return _props_key(cell_format.to_props())
+
+
+class FormatGrid(object):
+    """
+    The formats of ``rows`` by ``columns`` cells of a worksheet, whose top-left cell is at the
+    1-based ``row`` and ``col``. ``palette`` lists the distinct ``CellFormat`` objects, and
+    ``ids`` is an ``int32`` array of shape ``(rows, columns)`` holding each cell's index in the
+    palette, or -1 for cells without a format. Every cell starts without one.
+
+    Indexing a grid with an A1 range (in worksheet coordinates, e.g. ``'B2:D10'``) or with
+    NumPy slices (relative to the grid, e.g. ``grid[1:10, :3]``) returns a new grid of those
+    cells; indexing with a pair of integers returns one cell's ``CellFormat``, or None.
+    Assigning a ``CellFormat`` (or None, to remove formats) to an A1 range, NumPy index or
+    boolean mask of the grid's shape sets the format of those cells.
+    """
+    def __init__(self, rows, columns, row=1, col=1):
+        self.ids = np.full((rows, columns), NO_FORMAT, dtype=np.int32)
+        self.palette = []
+        self.row = row
+        self.col = col
+        self._keys = {}
+
+    @classmethod
+    def from_ids(cls, ids, palette, row=1, col=1):
+        """
+        Builds a grid from an array of palette ids (-1 for no format) and the palette of
+        ``CellFormat`` objects they index, such as the ``(ids, palette)`` returned by
+        ``DataFrameFormatter.format_for_cells``. Equal formats in the palette are merged.
+        """
+        ids = np.asarray(ids, dtype=np.int32)
+        if ids.ndim != 2:
+            raise ValueError("ids must be a 2-dimensional array, not of shape %s" % (ids.shape,))
+        if ids.size and (ids.max() >= len(palette) or ids.min() < NO_FORMAT):
+            raise ValueError("ids must be -1 or indexes of the palette's %d formats" % len(palette))
+        grid = cls(ids.shape[0], ids.shape[1], row, col)
+        grid.ids = grid._translate(ids, palette)
+        return grid
+
+    @classmethod
+    def from_row_runs(cls, row_runs, palette, columns, row=1, col=1):
+        """
+        Builds a grid from run-length encoded rows, as returned by ``to_row_runs``:
+        for each row, a flat list ``[id, count, id, count, ...]`` of palette ids covering
+        ``columns`` cells.
+        """
+        ids = np.full((len(row_runs), columns), NO_FORMAT, dtype=np.int32)
+        for y, runs in enumerate(row_runs):
+            counts = runs[1::2]
+            if sum(counts) != columns:
+                raise ValueError("Run-length encoded row %d covers %d cells, not %d" % (y, sum(counts), columns))
+            ids[y] = np.repeat(np.asarray(runs[0::2], dtype=np.int32), counts)
+        return cls.from_ids(ids, palette, row, col)
+
+    @property
+    def shape(self):
+        return self.ids.shape
+
+    def __repr__(self):
+        return '<FormatGrid %s %dx%d, %d formats>' % (
+            self._a1(0, 0, self.shape[0], self.shape[1]) if self.ids.size else 'empty',
+            self.shape[0], self.shape[1], len(self.palette)
+        )
+
+    def copy(self):
+        grid = FormatGrid(0, 0, self.row, self.col)
+        grid.ids = self.ids.copy()
+        grid.palette = list(self.palette)
+        grid._keys = dict(self._keys)
+        return grid
+
+    def _intern(self, cell_format):
+        """The palette id of ``cell_format``, added to the palette if need be."""
+        if cell_format is None:
+            return NO_FORMAT
+        if not isinstance(cell_format, CellFormat):
+            raise ValueError("cell format must be a CellFormat or None, not %r" % (cell_format,))
+        key = _format_key(cell_format)
+        fmt_id = self._keys.get(key)
+        if fmt_id is None:
+            fmt_id = self._keys[key] = len(self.palette)
+            self.palette.append(cell_format)
+        return fmt_id
+
+    def _translate(self, ids, palette):
+        """Maps ids indexing ``palette`` to ids of this grid's palette."""
+        # the last entry maps NO_FORMAT, which indexes it as -1
+        lookup = np.array([self._intern(f) for f in palette] + [NO_FORMAT], dtype=np.int32)
+        return lookup[ids]
+
+    def _a1(self, y0, x0, y1, x1):
+        return '%s:%s' % (
+            rowcol_to_a1(self.row + y0, self.col + x0), rowcol_to_a1(self.row + y1 - 1, self.col + x1 - 1)
+        )
+
+    def _index(self, key):
+        """Turns an A1 range into slices of ``ids``; passes other keys through to NumPy."""
+        if not isinstance(key, str):
+            return key
+        gridrange = _range_to_gridrange_object(key, 0)
+        rows, cols = self.shape
+        y0 = gridrange.get('startRowIndex', self.row - 1) - (self.row - 1)
+        y1 = gridrange.get('endRowIndex', self.row - 1 + rows) - (self.row - 1)
+        x0 = gridrange.get('startColumnIndex', self.col - 1) - (self.col - 1)
+        x1 = gridrange.get('endColumnIndex', self.col - 1 + cols) - (self.col - 1)
+        if y0 < 0 or x0 < 0 or y1 > rows or x1 > cols:
+            raise ValueError("Range %s is not within the grid's range %s" % (key, self._a1(0, 0, rows, cols)))
+        return slice(y0, y1), slice(x0, x1)
+
+    def __getitem__(self, key):
+        index = self._index(key)
+        if isinstance(index, slice):
+            index = (index, slice(None))
+        if isinstance(index, tuple) and len(index) == 2 and all(isinstance(i, slice) for i in index):
+            (y0, y1, y_step), (x0, x1, x_step) = index[0].indices(self.shape[0]), index[1].indices(self.shape[1])
+            if y_step != 1 or x_step != 1:
+                raise ValueError("FormatGrid slices must have a step of 1")
+            grid = self.copy()
+            grid.ids = self.ids[y0:max(y0, y1), x0:max(x0, x1)].copy()
+            grid.row, grid.col = self.row + y0, self.col + x0
+            return grid
+        fmt_id = self.ids[index]
+        if np.ndim(fmt_id) != 0:
+            raise ValueError("FormatGrid indexes must be A1 ranges, slices or a cell's row and column, not %r" % (key,))
+        return self.palette[fmt_id] if fmt_id >= 0 else None
+
+    def __setitem__(self, key, cell_format):
+        # the range is checked before the format joins the palette
+        index = self._index(key)
+        self.ids[index] = self._intern(cell_format)
+
+    def _other_ids(self, other):
+        if other.shape != self.shape:
+            raise ValueError("Grids have different shapes: %s and %s" % (self.shape, other.shape))
+        # other's formats not in this palette get ids below -1, so that they differ from ours
+        keys = [_format_key(f) for f in other.palette]
+        lookup = np.array(
+            [self._keys.get(key, -2 - i) for i, key in enumerate(keys)] + [NO_FORMAT], dtype=np.int32
+        )
+        return lookup[other.ids]
+
+    def diff(self, other):
+        """Returns a boolean array, True for each cell whose format differs in ``other``,
+        a grid of the same shape."""
+        return self.ids != self._other_ids(other)
+
+    def __eq__(self, other):
+        return (
+            isinstance(other, FormatGrid) and (self.row, self.col) == (other.row, other.col) and
+            self.shape == other.shape and not self.diff(other).any()
+        )
+
+    def __ne__(self, other):
+        return not self == other
+
+    def to_row_runs(self):
+        """Returns each row's palette ids, run-length encoded as a flat list ``[id, count, ...]``."""
+        row_runs = []
+        for row in self.ids:
+            if not len(row):
+                row_runs.append([])
+                continue
+            starts = np.concatenate(([0], np.flatnonzero(row[1:] != row[:-1]) + 1))
+            counts = np.diff(np.concatenate((starts, [len(row)])))
+            runs = np.empty(2 * len(starts), dtype=np.int64)
+            runs[0::2] = row[starts]
+            runs[1::2] = counts
+            row_runs.append(runs.tolist())
+        return row_runs
+
+    def to_ranges(self):
+        """Returns (range, ``CellFormat``) pairs, one per rectangle of cells sharing a format,
+        as accepted by ``format_cell_ranges``. Cells without a format are left out."""
+        return [
+            (self._a1(y0, x0, y1, x1), self.palette[fmt_id])
+            for y0, y1, x0, x1, fmt_id in self._rectangles(self.ids, self.ids >= 0)
+        ]
+
+    def _rectangles(self, ids, mask):
+        """Rectangles ``(y0, y1, x0, x1, id)`` covering the cells selected by ``mask``, each of
+        cells sharing one id: vertical runs of an id in each column, merged with identical runs
+        in adjacent columns."""
+        from .dataframe import _merge_column_runs
+        # shifted by one, so that unselected cells are the negative ids skipped when merging
+        work = np.where(mask, ids.astype(np.int64) + 1, -1)
+        def column_runs():
+            for x in range(work.shape[1]):
+                column = work[:, x]
+                boundaries = np.flatnonzero(column[1:] != column[:-1]) + 1
+                starts = np.concatenate(([0], boundaries))
+                ends = np.concatenate((boundaries, [len(column)]))
+                yield zip(starts.tolist(), ends.tolist(), column[starts].tolist())
+        if not work.size:
+            return []
+        return [
+            (y0, y1 + 1, x0, x1 + 1, fmt_id)
+            for (y0, x0, y1, x1), fmt_id in _merge_column_runs(column_runs(), list(range(-1, len(self.palette))), 0, 0)
+        ]
+
+    def requests(self, worksheet, base=None):
+        """
+        Returns the requests that give the cells of ``worksheet`` covered by this grid exactly
+        the grid's formats, replacing their user-entered formats.
+
+        :param worksheet: The ``Worksheet`` object.
+        :param base: the grid of the formats the cells have now, e.g. from ``get_format_grid``,
+                     of the same shape and position. If given, only cells whose formats
+                     differ from it are formatted. Otherwise, one request sets the most
+                     common format over the whole grid, and further requests the others.
+        """
+        if not self.ids.size:
+            return []
+        requests = []
+        if base is not None:
+            if (base.row, base.col) != (self.row, self.col):
+                raise ValueError("base grid is at %s, not %s" % (
+                    rowcol_to_a1(base.row, base.col), rowcol_to_a1(self.row, self.col)
+                ))
+            mask = self.diff(base)
+        else:
+            values, counts = np.unique(self.ids, return_counts=True)
+            common = int(values[np.argmax(counts)])
+            requests.append(self._repeat_cell(worksheet, 0, self.shape[0], 0, self.shape[1], common))
+            mask = self.ids != common
+        for y0, y1, x0, x1, fmt_id in self._rectangles(self.ids, mask):
+            requests.append(self._repeat_cell(worksheet, y0, y1, x0, x1, fmt_id))
+        return requests
+
+    def _repeat_cell(self, worksheet, y0, y1, x0, x1, fmt_id):
+        return {
+            'repeatCell': {
+                'range': {
+                    'sheetId': worksheet.id,
+                    'startRowIndex': self.row - 1 + y0, 'endRowIndex': self.row - 1 + y1,
+                    'startColumnIndex': self.col - 1 + x0, 'endColumnIndex': self.col - 1 + x1
+                },
+                'cell': {'userEnteredFormat': self.palette[fmt_id].to_props()} if fmt_id >= 0 else {},
+                'fields': 'userEnteredFormat'
+            }
+        }
+
+
+def get_format_grid(worksheet, range):
+    """
+    Reads the user-entered formats of a range of cells with one API call, and returns them
+    as a ``FormatGrid``.
+
+    :param worksheet: The ``Worksheet`` object.
+    :param range: A bounded range in A1 notation, e.g. 'A1:F1000'.
+    """
+    gridrange = _range_to_gridrange_object(range, worksheet.id)
+    if gridrange.get('endRowIndex') is None or gridrange.get('endColumnIndex') is None:
+        raise ValueError("get_format_grid needs a bounded range, not %r" % (range,))
+    y0, x0 = gridrange.get('startRowIndex', 0), gridrange.get('startColumnIndex', 0)
+    grid = FormatGrid(gridrange['endRowIndex'] - y0, gridrange['endColumnIndex'] - x0, y0 + 1, x0 + 1)
+    resp = _fetch_sheet_metadata(worksheet.spreadsheet, {
+        'includeGridData': True,
+        'ranges': ["'%s'!%s" % (worksheet.title.replace("'", "''"), grid._a1(0, 0, *grid.shape))],
+        'fields': 'sheets.data(startRow,startColumn,rowData.values.userEnteredFormat)'
+    }, 'get_format_grid')
+    data = resp['sheets'][0]['data'][0]
+    row_offset = data.get('startRow', 0) - y0
+    col_offset = data.get('startColumn', 0) - x0
+    # formats are decoded once per distinct format
+    ids_for_keys = {}
+    for y, row_data in enumerate(data.get('rowData', [])):
+        for x, cell in enumerate(row_data.get('values', [])):
+            props = cell.get('userEnteredFormat')
+            if not props:
+                continue
+            key = _props_key(props)
+            fmt_id = ids_for_keys.get(key)
+            if fmt_id is None:
+                fmt_id = ids_for_keys[key] = grid._intern(CellFormat.from_props(props))
+            grid.ids[row_offset + y, col_offset + x] = fmt_id
+    return grid
+
+def apply_format_grid(worksheet, grid, base=None):
+    """
+    Gives the cells of ``worksheet`` covered by ``grid`` the grid's formats, with one
+    ``batchUpdate`` call (or none, if ``base`` is given and no format differs from it).
+    See ``FormatGrid.requests``.
+    """
+    with _span('build', operation='apply_format_grid'):
+        requests = grid.requests(worksheet, base)
+    if not requests:
+        return None
+    return _batch_update(worksheet.spreadsheet, {'requests': requests}, 'apply_format_grid')
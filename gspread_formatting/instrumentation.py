@@ -0,0 +1,235 @@
+# -*- coding: utf-8 -*-
+"""
+Instrumentation of the API calls made by this package, to find where the time of a slow
+formatting job goes: building requests, serializing them, or waiting for the API.
+
+While an ``Instrument`` is installed (with ``add_instrument``, or for the duration of a
+``with instrumented(...):`` block), every ``batchUpdate`` call made by the formatting
+functions, ``format_with_dataframe``, ``SpreadsheetBatchUpdater.execute`` and
+``ConditionalFormatRules.save``, and every ``fetch_sheet_metadata`` call, is reported as
+spans and counters, tagged with the ``operation`` (the function or method responsible)
+and the ``spreadsheet_id``:
+
+* span ``build``: building the requests (for batch updaters, each method call);
+* span ``serialize``: encoding the request body as JSON, as the HTTP client will;
+* span ``api_call``: the API call itself, tagged with ``method`` (``batchUpdate`` or ``get``);
+  failed calls carry the exception as the span's ``error``;
+* counters ``requests`` and ``request_bytes`` for each ``batchUpdate`` call, and
+  ``response_bytes`` for each call;
+* with a ``QuotaLedger`` installed (see ``gspread_formatting.quota``), span ``quota_wait``:
+  waiting for the ledger, tagged with ``kind`` (``read`` or ``write``), and counter
+  ``retries`` for each call repeated after a 429 error.
+
+Serializing the body and response to count their bytes costs time of its own, so it is
+done only while an instrument is installed. Retries made inside gspread's HTTP client
+(e.g. by ``BackOffHTTPClient``) are part of the ``api_call`` span and are not counted.
+"""
+
+from contextlib import contextmanager
+import json
+import logging
+import threading
+import time
+
+from gspread_formatting import quota
+
+__all__ = (
+    'Instrument', 'Span', 'LoggingInstrument', 'MetricsCallbackInstrument', 'TotalsInstrument',
+    'add_instrument', 'remove_instrument', 'instrumented'
+)
+
+# replaced, never modified, so that reporting needs no lock
+_instruments = ()
+_instruments_lock = threading.Lock()
+
+
+def add_instrument(instrument):
+    """Installs an ``Instrument`` for all threads, until ``remove_instrument`` is called."""
+    global _instruments
+    with _instruments_lock:
+        _instruments = _instruments + (instrument,)
+
+def remove_instrument(instrument):
+    global _instruments
+    with _instruments_lock:
+        _instruments = tuple(i for i in _instruments if i is not instrument)
+
+@contextmanager
+def instrumented(*instruments):
+    """Installs the given instruments for the duration of a ``with:`` block, and yields the first."""
+    for instrument in instruments:
+        add_instrument(instrument)
+    try:
+        yield instruments[0] if instruments else None
+    finally:
+        for instrument in instruments:
+            remove_instrument(instrument)
+
+
+class Span(object):
+    """A timed step: its ``name``, ``tags``, ``duration`` in seconds, and the exception, if any, as ``error``."""
+    def __init__(self, name, tags):
+        self.name = name
+        self.tags = tags
+        self.duration = None
+        self.error = None
+
+    def __repr__(self):
+        return '<Span %s %.6fs %r%s>' % (
+            self.name, self.duration or 0, self.tags, ' error=%r' % self.error if self.error else ''
+        )
+
+
+class Instrument(object):
+    """
+    Base class of instruments. Subclasses override ``on_span``, called as each span ends,
+    and ``on_counter``. Both are called in the thread making the API call.
+    """
+    def on_span(self, span):
+        pass
+
+    def on_counter(self, name, value, tags):
+        pass
+
+
+class LoggingInstrument(Instrument):
+    """Logs each span and counter, by default to the ``gspread_formatting`` logger at DEBUG level."""
+    def __init__(self, logger=None, level=logging.DEBUG):
+        self.logger = logger or logging.getLogger('gspread_formatting')
+        self.level = level
+
+    def on_span(self, span):
+        if span.error is not None:
+            self.logger.log(self.level, '%s took %.1fms %s, failed: %r', span.name, span.duration * 1000, span.tags, span.error)
+        else:
+            self.logger.log(self.level, '%s took %.1fms %s', span.name, span.duration * 1000, span.tags)
+
+    def on_counter(self, name, value, tags):
+        self.logger.log(self.level, '%s: %s %s', name, value, tags)
+
+
+class MetricsCallbackInstrument(Instrument):
+    """
+    Reports spans and counters to a metrics library through ``callback(metric_name, value, tags)``:
+    span durations in seconds as ``<prefix><span name>.seconds``, with an ``error`` tag holding
+    the exception's class name (or ``None``), and counters as ``<prefix><counter name>``.
+    """
+    def __init__(self, callback, prefix='gspread_formatting.'):
+        self.callback = callback
+        self.prefix = prefix
+
+    def on_span(self, span):
+        tags = dict(span.tags, error=type(span.error).__name__ if span.error is not None else None)
+        self.callback(self.prefix + span.name + '.seconds', span.duration, tags)
+
+    def on_counter(self, name, value, tags):
+        self.callback(self.prefix + name, value, tags)
+
+
+class TotalsInstrument(Instrument):
+    """
+    Adds up spans and counters by name (and by ``operation``, in ``by_operation``):
+    ``seconds`` and ``counts`` hold the total duration and number of each span, and
+    ``counters`` the total of each counter, e.g. ``seconds['api_call']``.
+    """
+    def __init__(self):
+        self.seconds = {}
+        self.counts = {}
+        self.counters = {}
+        self.by_operation = {}
+        self._lock = threading.Lock()
+
+    def on_span(self, span):
+        with self._lock:
+            for totals in (self, self._operation(span.tags)):
+                totals.seconds[span.name] = totals.seconds.get(span.name, 0) + span.duration
+                totals.counts[span.name] = totals.counts.get(span.name, 0) + 1
+
+    def on_counter(self, name, value, tags):
+        with self._lock:
+            for totals in (self, self._operation(tags)):
+                totals.counters[name] = totals.counters.get(name, 0) + value
+
+    def _operation(self, tags):
+        operation = tags.get('operation')
+        if operation not in self.by_operation:
+            self.by_operation[operation] = TotalsInstrument()
+        return self.by_operation[operation]
+
+
+@contextmanager
+def _span(name, **tags):
+    instruments = _instruments
+    if not instruments:
+        yield None
+        return
+    span = Span(name, tags)
+    start = time.perf_counter()
+    try:
+        yield span
+    except BaseException as e:
+        span.error = e
+        raise
+    finally:
+        span.duration = time.perf_counter() - start
+        for instrument in instruments:
+            instrument.on_span(span)
+
+def _count(name, value, tags):
+    for instrument in _instruments:
+        instrument.on_counter(name, value, tags)
+
+def _json_bytes(obj):
+    return len(json.dumps(obj, default=str).encode('utf-8'))
+
+def _request_count(requests):
+    # batch updaters send a list of lists of requests
+    return sum(_request_count(r) if isinstance(r, list) else 1 for r in requests)
+
+def _call(method, kind, call, tags):
+    """
+    Makes an API call, reporting it as an ``api_call`` span. With a ``QuotaLedger``
+    installed, first waits for the quota (as a ``quota_wait`` span), and retries the call
+    while it fails with a 429 error.
+    """
+    ledger = quota._ledger
+    retries = 0
+    while True:
+        if ledger is not None:
+            with _span('quota_wait', kind=kind, **tags):
+                ledger.acquire(kind)
+        try:
+            with _span('api_call', method=method, **tags):
+                return call()
+        except Exception as e:
+            delay = ledger._retry_delay(retries + 1) if ledger is not None and quota._is_throttled(e) else None
+            if delay is None:
+                raise
+        retries += 1
+        _count('retries', 1, tags)
+        ledger.pause(delay)
+
+def _batch_update(spreadsheet, body, operation):
+    """Calls ``spreadsheet.batch_update(body)``, reporting it to the installed instruments."""
+    if not _instruments and quota._ledger is None:
+        return spreadsheet.batch_update(body)
+    tags = {'operation': operation, 'spreadsheet_id': getattr(spreadsheet, 'id', None)}
+    if _instruments:
+        with _span('serialize', **tags):
+            request_bytes = _json_bytes(body)
+        _count('requests', _request_count(body.get('requests', [])), tags)
+        _count('request_bytes', request_bytes, tags)
+    resp = _call('batchUpdate', quota.WRITE, lambda: spreadsheet.batch_update(body), tags)
+    if _instruments:
+        _count('response_bytes', _json_bytes(resp), tags)
+    return resp
+
+def _fetch_sheet_metadata(spreadsheet, params, operation):
+    """Calls ``spreadsheet.fetch_sheet_metadata(params)``, reporting it to the installed instruments."""
+    if not _instruments and quota._ledger is None:
+        return spreadsheet.fetch_sheet_metadata(params)
+    tags = {'operation': operation, 'spreadsheet_id': getattr(spreadsheet, 'id', None)}
+    resp = _call('get', quota.READ, lambda: spreadsheet.fetch_sheet_metadata(params), tags)
+    if _instruments:
+        _count('response_bytes', _json_bytes(resp), tags)
+    return resp
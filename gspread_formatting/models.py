@@ -128,6 +128,130 @@ class GridRange(FormattingComponent):
         self.startColumnIndex = startColumnIndex
         self.endColumnIndex = endColumnIndex
 
+    # Spatial operations. A start index of None is treated as 0, and an end index of None
+    # as unbounded, matching the semantics of the Sheets API.
+
+    def is_bounded(self):
+        return self.endRowIndex is not None and self.endColumnIndex is not None
+
+    def area(self):
+        """Number of cells in the range, or None if the range is unbounded."""
+        if not self.is_bounded():
+            return None
+        rows = self.endRowIndex - (self.startRowIndex or 0)
+        cols = self.endColumnIndex - (self.startColumnIndex or 0)
+        return max(rows, 0) * max(cols, 0)
+
+    def is_empty(self):
+        return (
+            _end_le(self.endRowIndex, self.startRowIndex or 0) 
+            or _end_le(self.endColumnIndex, self.startColumnIndex or 0)
+        )
+
+    def contains(self, other):
+        """True if ``other`` (a ``GridRange`` or a ``(rowIndex, columnIndex)`` pair of 0-based
+        indices) lies entirely within this range."""
+        if not isinstance(other, GridRange):
+            row, col = other
+            other = GridRange(self.sheetId, row, row + 1, col, col + 1)
+        if other.sheetId != self.sheetId:
+            return False
+        return (
+            (self.startRowIndex or 0) <= (other.startRowIndex or 0)
+            and (self.startColumnIndex or 0) <= (other.startColumnIndex or 0)
+            and _end_le(other.endRowIndex, self.endRowIndex)
+            and _end_le(other.endColumnIndex, self.endColumnIndex)
+        )
+
+    __contains__ = contains
+
+    def intersects(self, other):
+        return self.intersection(other) is not None
+
+    def intersection(self, other):
+        """Returns the ``GridRange`` common to this range and ``other``, or None if they do not overlap."""
+        if other is None or other.sheetId != self.sheetId:
+            return None
+        rv = GridRange(
+            self.sheetId,
+            _max_start(self.startRowIndex, other.startRowIndex),
+            _min_end(self.endRowIndex, other.endRowIndex),
+            _max_start(self.startColumnIndex, other.startColumnIndex),
+            _min_end(self.endColumnIndex, other.endColumnIndex)
+        )
+        return None if rv.is_empty() else rv
+
+    __and__ = intersection
+
+    def difference(self, other):
+        """Returns a list of disjoint ``GridRange`` objects covering the cells of this range
+        that are not in ``other``."""
+        overlap = self.intersection(other)
+        if overlap is None:
+            return [] if self.is_empty() else [self._copy()]
+        rv = []
+        # full-width bands above and below the overlap...
+        if (overlap.startRowIndex or 0) > (self.startRowIndex or 0):
+            rv.append(GridRange(
+                self.sheetId, self.startRowIndex, overlap.startRowIndex, 
+                self.startColumnIndex, self.endColumnIndex
+            ))
+        if not _end_le(self.endRowIndex, overlap.endRowIndex):
+            rv.append(GridRange(
+                self.sheetId, overlap.endRowIndex, self.endRowIndex, 
+                self.startColumnIndex, self.endColumnIndex
+            ))
+        # ...then the pieces left and right of the overlap, within its rows.
+        if (overlap.startColumnIndex or 0) > (self.startColumnIndex or 0):
+            rv.append(GridRange(
+                self.sheetId, overlap.startRowIndex, overlap.endRowIndex, 
+                self.startColumnIndex, overlap.startColumnIndex
+            ))
+        if not _end_le(self.endColumnIndex, overlap.endColumnIndex):
+            rv.append(GridRange(
+                self.sheetId, overlap.startRowIndex, overlap.endRowIndex, 
+                overlap.endColumnIndex, self.endColumnIndex
+            ))
+        return rv
+
+    __sub__ = difference
+
+    def union(self, *others):
+        """Returns a list of disjoint ``GridRange`` objects covering every cell in this
+        range and in ``others``. Adjacent pieces are merged where they form a rectangle."""
+        from .ranges import coalesce_ranges
+        return coalesce_ranges((self,) + others)
+
+    __or__ = union
+
+    def _copy(self):
+        return GridRange(self.sheetId, self.startRowIndex, self.endRowIndex, self.startColumnIndex, self.endColumnIndex)
+
+    def __hash__(self):
+        return hash((self.sheetId, self.startRowIndex, self.endRowIndex, self.startColumnIndex, self.endColumnIndex))
+
+def _max_start(a, b):
+    if a is None:
+        return b
+    if b is None:
+        return a
+    return max(a, b)
+
+def _min_end(a, b):
+    if a is None:
+        return b
+    if b is None:
+        return a
+    return min(a, b)
+
+def _end_le(a, b):
+    """True if end index ``a`` is at or before end index ``b``, where None is unbounded."""
+    if b is None:
+        return True
+    if a is None:
+        return False
+    return a <= b
+
 class CellFormatComponent(FormattingComponent, abc.ABC):
     pass
 
@@ -315,6 +439,51 @@ class TextRotation(CellFormatComponent):
         self.angle = angle
         self.vertical = vertical
 
+class BandingProperties(FormattingComponent):
+    _FIELDS = {
+        'headerColor': 'color',
+        'headerColorStyle': 'colorStyle',
+        'firstBandColor': 'color',
+        'firstBandColorStyle': 'colorStyle',
+        'secondBandColor': 'color',
+        'secondBandColorStyle': 'colorStyle',
+        'footerColor': 'color',
+        'footerColorStyle': 'colorStyle'
+    }
+
+    def __init__(self,
+        headerColor=None,
+        headerColorStyle=None,
+        firstBandColor=None,
+        firstBandColorStyle=None,
+        secondBandColor=None,
+        secondBandColorStyle=None,
+        footerColor=None,
+        footerColorStyle=None
+        ):
+        self.headerColor = headerColor
+        self.headerColorStyle = headerColorStyle
+        self.firstBandColor = firstBandColor
+        self.firstBandColorStyle = firstBandColorStyle
+        self.secondBandColor = secondBandColor
+        self.secondBandColorStyle = secondBandColorStyle
+        self.footerColor = footerColor
+        self.footerColorStyle = footerColorStyle
+
+class BandedRange(FormattingComponent):
+    _FIELDS = {
+        'bandedRangeId': None,
+        'range': 'gridRange',
+        'rowProperties': 'bandingProperties',
+        'columnProperties': 'bandingProperties'
+    }
+
+    def __init__(self, bandedRangeId=None, range=None, rowProperties=None, columnProperties=None):
+        self.bandedRangeId = bandedRangeId
+        self.range = range
+        self.rowProperties = rowProperties
+        self.columnProperties = columnProperties
+
 # provide camelCase aliases for all component classes.
 
 _CLASSES = {}
@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+"""
+Client-side accounting of the Sheets API's per-minute read and write quotas, shared by
+every thread and process that uses the same ledger file.
+
+Google limits the read and write requests of each user of a project per minute (60 of each,
+by default), and answers calls over the limit with a 429 error. Worker processes calling the
+API independently exceed the quota together, and then retry against each other. Once a
+``QuotaLedger`` is installed with ``set_quota_ledger``, every ``fetch_sheet_metadata`` call
+made by this package counts as a read and every ``batchUpdate`` call as a write: each call
+waits until the ledger has room for it in the last ``period`` seconds, and is then recorded
+in the ledger, a SQLite database file that all processes on the machine can share::
+
+    set_quota_ledger(QuotaLedger('/tmp/sheets-quota.sqlite', read_limit=60, write_limit=60))
+
+A call that still fails with a 429 (because of calls made by other machines, or by gspread
+directly) pauses every process using the ledger, with exponential backoff, and is retried up
+to ``max_retries`` times; each retry is reported to installed instruments (see
+``gspread_formatting.instrumentation``) as a ``retries`` counter, and the time spent waiting
+for the ledger as a ``quota_wait`` span.
+"""
+
+from contextlib import contextmanager
+import sqlite3
+import threading
+import time
+
+__all__ = ('QuotaLedger', 'set_quota_ledger', 'get_quota_ledger')
+
+READ = 'read'
+WRITE = 'write'
+
+_ledger = None
+
+
+def set_quota_ledger(ledger):
+    """Installs a ``QuotaLedger`` for all API calls made by this package, in all threads.
+    Pass None to stop quota accounting. Returns the previously installed ledger, if any."""
+    global _ledger
+    previous, _ledger = _ledger, ledger
+    return previous
+
+def get_quota_ledger():
+    """Returns the installed ``QuotaLedger``, or None."""
+    return _ledger
+
+
+class QuotaLedger(object):
+    """
+    A record of the API calls made in the last ``period`` seconds, kept in the SQLite database
+    at ``path`` so that every process opening the same file shares it.
+
+    :param path: the database file, created if it does not exist. ``':memory:'`` gives a
+                 ledger private to this object, shared only between threads.
+    :param read_limit: the maximum number of read calls in any ``period`` seconds.
+    :param write_limit: the maximum number of write calls in any ``period`` seconds.
+    :param period: the length in seconds of the quota window.
+    :param max_retries: how many times a call failing with a 429 error is retried.
+    :param backoff: seconds all processes pause after the first 429 error, doubling with each
+                    consecutive retry of a call, up to ``period``.
+    :param clock: a function returning the current time in seconds. It must agree between
+                  processes, so the default is ``time.time``.
+    :param sleep: the function used to wait.
+    """
+    def __init__(self, path, read_limit=60, write_limit=60, period=60, max_retries=5, backoff=1.0,
+                 clock=time.time, sleep=time.sleep):
+        if read_limit < 1 or write_limit < 1:
+            raise ValueError("read_limit and write_limit must be positive numbers of calls")
+        if period <= 0:
+            raise ValueError("period must be a positive number of seconds")
+        self.path = path
+        self.limits = {READ: read_limit, WRITE: write_limit}
+        self.period = period
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.clock = clock
+        self.sleep = sleep
+        self._lock = threading.Lock()
+        # autocommit mode, so that transactions are begun explicitly
+        self._db = sqlite3.connect(path, timeout=60, isolation_level=None, check_same_thread=False)
+        with self._transaction() as db:
+            db.execute('CREATE TABLE IF NOT EXISTS calls (kind TEXT NOT NULL, at REAL NOT NULL)')
+            db.execute('CREATE INDEX IF NOT EXISTS calls_by_kind ON calls (kind, at)')
+            db.execute('CREATE TABLE IF NOT EXISTS pause (id INTEGER PRIMARY KEY CHECK (id = 0), until REAL NOT NULL)')
+
+    def __repr__(self):
+        return '<QuotaLedger %s read_limit=%d write_limit=%d period=%s>' % (
+            self.path, self.limits[READ], self.limits[WRITE], self.period
+        )
+
+    @contextmanager
+    def _transaction(self):
+        # BEGIN IMMEDIATE takes the database's write lock, serializing processes
+        with self._lock:
+            self._db.execute('BEGIN IMMEDIATE')
+            try:
+                yield self._db
+            except BaseException:
+                self._db.execute('ROLLBACK')
+                raise
+            self._db.execute('COMMIT')
+
+    def _expire(self, db, now):
+        db.execute('DELETE FROM calls WHERE at <= ?', (now - self.period,))
+
+    def _wait_time(self, db, kind, now):
+        """Seconds until a call of ``kind`` may be made, or 0."""
+        row = db.execute('SELECT until FROM pause WHERE id = 0').fetchone()
+        if row is not None and row[0] > now:
+            return row[0] - now
+        count = db.execute('SELECT COUNT(*) FROM calls WHERE kind = ?', (kind,)).fetchone()[0]
+        if count < self.limits[kind]:
+            return 0
+        # the call that must leave the window to make room for one more
+        at = db.execute(
+            'SELECT at FROM calls WHERE kind = ? ORDER BY at LIMIT 1 OFFSET ?',
+            (kind, count - self.limits[kind])
+        ).fetchone()[0]
+        return max(at + self.period - now, 0.001)
+
+    def acquire(self, kind):
+        """
+        Waits until a call of ``kind`` (``'read'`` or ``'write'``) fits within the quota,
+        records it, and returns the number of seconds waited.
+        """
+        if kind not in self.limits:
+            raise ValueError("kind must be 'read' or 'write', not %r" % (kind,))
+        waited = 0
+        while True:
+            with self._transaction() as db:
+                now = self.clock()
+                self._expire(db, now)
+                wait = self._wait_time(db, kind, now)
+                if not wait:
+                    db.execute('INSERT INTO calls (kind, at) VALUES (?, ?)', (kind, now))
+                    return waited
+            self.sleep(wait)
+            waited += wait
+
+    def pause(self, seconds):
+        """Makes every process using the ledger wait ``seconds`` before its next call."""
+        with self._transaction() as db:
+            until = self.clock() + seconds
+            db.execute(
+                'INSERT INTO pause (id, until) VALUES (0, ?) '
+                'ON CONFLICT (id) DO UPDATE SET until = max(until, excluded.until)',
+                (until,)
+            )
+
+    def usage(self):
+        """Returns the number of read and write calls made in the last ``period`` seconds,
+        as a dict: ``{'read': 12, 'write': 40}``."""
+        with self._transaction() as db:
+            self._expire(db, self.clock())
+            counts = dict(db.execute('SELECT kind, COUNT(*) FROM calls GROUP BY kind').fetchall())
+        return dict((kind, counts.get(kind, 0)) for kind in self.limits)
+
+    def utilization(self):
+        """Returns the fraction of the read and write quotas used in the last ``period``
+        seconds, as a dict: ``{'read': 0.2, 'write': 0.67}``."""
+        return dict((kind, float(count) / self.limits[kind]) for kind, count in self.usage().items())
+
+    def _retry_delay(self, retries):
+        """The pause before the ``retries``-th retry of a throttled call, or None to give up."""
+        if retries > self.max_retries:
+            return None
+        return min(self.backoff * 2 ** (retries - 1), self.period)
+
+    def close(self):
+        self._db.close()
+
+
+def _is_throttled(error):
+    code = getattr(error, 'code', None)
+    if code is None:
+        code = getattr(getattr(error, 'response', None), 'status_code', None)
+    return code == 429
@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+"""
+Spatial helpers over ``GridRange`` objects: coalescing many ranges into a minimal
+set of disjoint rectangles, and an index answering "which ranges touch this cell
+or this range?" without scanning every range.
+"""
+
+from .models import GridRange
+
+__all__ = ('coalesce_ranges', 'GridRangeIndex')
+
+_UNBOUNDED = float('inf')
+
+
+def coalesce_ranges(ranges):
+    """Returns a list of disjoint ``GridRange`` objects covering exactly the cells covered
+    by the given ``GridRange`` objects, with adjacent pieces merged into larger rectangles.
+
+    :param ranges: An iterable of ``GridRange`` objects, possibly on different sheets and
+                   possibly overlapping.
+    """
+    disjoint = []
+    index = GridRangeIndex()
+    for r in ranges:
+        if r.is_empty():
+            continue
+        pieces = [r]
+        for existing in index.query_range(r):
+            pieces = [p for piece in pieces for p in piece.difference(existing)]
+            if not pieces:
+                break
+        for piece in pieces:
+            index.add(piece)
+        disjoint.extend(pieces)
+    by_sheet = {}
+    originals = {}
+    for r in disjoint:
+        by_sheet.setdefault(r.sheetId, []).append(_bbox(r))
+        originals[(r.sheetId, _bbox(r))] = r
+    rv = []
+    for sheetId, boxes in by_sheet.items():
+        # each pass joins vertical runs of equal column span, then horizontal runs of
+        # equal row span; joining one way can line pieces up for the other way.
+        count = None
+        while count != len(boxes):
+            count = len(boxes)
+            boxes = _join_runs(_join_runs(boxes, 2, 0), 0, 2)
+        rv.extend(originals.get((sheetId, box)) or _gridrange(sheetId, box) for box in boxes)
+    return rv
+
+def _join_runs(boxes, span, along):
+    """Joins boxes with equal extents at ``span`` and ``span + 1`` whose extents at
+    ``along`` and ``along + 1`` meet, in one pass over the sorted boxes."""
+    boxes = sorted(boxes, key=lambda b: (b[span], b[span + 1], b[along]))
+    rv = []
+    for box in boxes:
+        last = rv[-1] if rv else None
+        if (last is not None and last[span] == box[span] and last[span + 1] == box[span + 1]
+                and last[along + 1] == box[along]):
+            joined = list(last)
+            joined[along + 1] = box[along + 1]
+            rv[-1] = tuple(joined)
+        else:
+            rv.append(box)
+    return rv
+
+def _gridrange(sheetId, box):
+    return GridRange(
+        sheetId,
+        box[0],
+        None if box[1] == _UNBOUNDED else box[1],
+        box[2],
+        None if box[3] == _UNBOUNDED else box[3]
+    )
+
+
+def _bbox(gridrange):
+    return (
+        gridrange.startRowIndex or 0,
+        _UNBOUNDED if gridrange.endRowIndex is None else gridrange.endRowIndex,
+        gridrange.startColumnIndex or 0,
+        _UNBOUNDED if gridrange.endColumnIndex is None else gridrange.endColumnIndex
+    )
+
+def _bbox_union(boxes):
+    return (
+        min(b[0] for b in boxes),
+        max(b[1] for b in boxes),
+        min(b[2] for b in boxes),
+        max(b[3] for b in boxes)
+    )
+
+def _bbox_overlaps(a, b):
+    return a[0] < b[1] and b[0] < a[1] and a[2] < b[3] and b[2] < a[3]
+
+
+class _Node(object):
+    __slots__ = ('bbox', 'children', 'entries')
+
+    def __init__(self, bbox, children=None, entries=None):
+        self.bbox = bbox
+        self.children = children
+        self.entries = entries
+
+
+class GridRangeIndex(object):
+    """
+    An R-tree over ``GridRange`` objects, bulk-loaded with the Sort-Tile-Recursive
+    algorithm. Each range is stored with an associated value (the range itself if no
+    value is given); queries return the values of matching ranges in the order
+    they were added, so the index can stand in for an ordered list of rules or requests.
+
+    Ranges may be added between queries. The ranges are kept in static trees of
+    distinct power-of-two sizes, like the digits of a binary counter: adding a range
+    merges the trees of equal size into one, which is rebuilt when next queried. A
+    query visits at most ``log2(n)`` trees, and each range is rebuilt into a larger
+    tree at most ``log2(n)`` times, so interleaved adds and queries stay logarithmic.
+    """
+
+    def __init__(self, items=(), node_capacity=16):
+        """
+        :param items: An iterable of ``GridRange`` objects or of ``(GridRange, value)`` pairs.
+        :param node_capacity: Maximum number of children per tree node.
+        """
+        if node_capacity < 2:
+            raise ValueError("node_capacity must be at least 2")
+        self.node_capacity = node_capacity
+        self._count = 0
+        # [entries, roots by sheet id, or None until queried], largest first
+        self._trees = []
+        for item in items:
+            if isinstance(item, GridRange):
+                self.add(item)
+            else:
+                self.add(*item)
+
+    def __len__(self):
+        return self._count
+
+    def add(self, gridrange, value=None):
+        if not isinstance(gridrange, GridRange):
+            raise ValueError("gridrange must be instance of: %s" % GridRange)
+        entries = [(self._count, gridrange, gridrange if value is None else value, _bbox(gridrange))]
+        self._count += 1
+        while self._trees and len(self._trees[-1][0]) <= len(entries):
+            entries = self._trees.pop()[0] + entries
+        self._trees.append([entries, None])
+
+    def query_point(self, rowIndex, columnIndex, sheetId=0):
+        """Values of all ranges on sheet ``sheetId`` containing the cell at the given
+        0-based row and column indices."""
+        box = (rowIndex, rowIndex + 1, columnIndex, columnIndex + 1)
+        return self._query(sheetId, box)
+
+    def query_range(self, gridrange):
+        """Values of all ranges that overlap the given ``GridRange``."""
+        if gridrange.is_empty():
+            return []
+        return self._query(gridrange.sheetId, _bbox(gridrange))
+
+    def _query(self, sheetId, box):
+        found = []
+        for tree in self._trees:
+            if tree[1] is None:
+                tree[1] = self._build(tree[0])
+            root = tree[1].get(sheetId)
+            stack = [root] if root is not None else []
+            while stack:
+                node = stack.pop()
+                if not _bbox_overlaps(node.bbox, box):
+                    continue
+                if node.entries is not None:
+                    found.extend(e for e in node.entries if _bbox_overlaps(e[3], box))
+                else:
+                    stack.extend(node.children)
+        found.sort(key=lambda e: e[0])
+        return [e[2] for e in found]
+
+    def _build(self, entries):
+        by_sheet = {}
+        for entry in entries:
+            if not entry[1].is_empty():
+                by_sheet.setdefault(entry[1].sheetId, []).append(entry)
+        return dict((sheetId, self._pack(entries)) for sheetId, entries in by_sheet.items())
+
+    def _pack(self, entries):
+        nodes = [
+            _Node(_bbox_union([e[3] for e in group]), entries=group)
+            for group in self._tile(entries, lambda e: e[3])
+        ]
+        while len(nodes) > 1:
+            nodes = [
+                _Node(_bbox_union([n.bbox for n in group]), children=group)
+                for group in self._tile(nodes, lambda n: n.bbox)
+            ]
+        return nodes[0]
+
+    def _tile(self, items, bbox_of):
+        cap = self.node_capacity
+        leaf_count = -(-len(items) // cap)
+        slice_count = max(1, int(leaf_count ** 0.5 + 0.5))
+        slice_size = -(-len(items) // slice_count)
+        # unbounded ranges sort by their start, so they do not all land in one slice
+        items = sorted(items, key=lambda i: bbox_of(i)[0])
+        groups = []
+        for s in range(0, len(items), slice_size):
+            vertical_slice = sorted(items[s:s + slice_size], key=lambda i: bbox_of(i)[2])
+            groups.extend(vertical_slice[g:g + cap] for g in range(0, len(vertical_slice), cap))
+        return groups
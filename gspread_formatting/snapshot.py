@@ -0,0 +1,394 @@
+# -*- coding: utf-8 -*-
+"""
+Snapshots of the formatting of a whole worksheet -- user-entered formats, text format runs,
+data validation rules, row heights and column widths, frozen rows and columns, and
+conditional format rules -- taken with one API call, stored in a compact file, and
+reapplied (to the same worksheet or another one) with one ``batchUpdate`` call::
+
+    snapshot = take_snapshot(template_worksheet)
+    snapshot.save('template.fmt')
+
+    snapshot = FormatSnapshot.load('template.fmt')
+    apply_snapshot(new_worksheet, snapshot)
+
+Rather than one nested object per cell, a snapshot keeps each distinct cell format (and data
+validation rule) once, in a palette, and the format of every cell of the grid as a palette
+index, run-length encoded in row-major order; row heights and column widths are run-length
+encoded too. Files are gzip-compressed JSON of these arrays.
+
+Applying a snapshot sends one request per rectangle of cells sharing a format (after one
+request setting the most common format over the whole grid), rather than one per cell.
+"""
+
+from .conditionals import ConditionalFormatRule, get_conditional_format_rules
+from .instrumentation import _span, _batch_update, _fetch_sheet_metadata
+from .ranges import coalesce_ranges
+from .models import GridRange
+from .batch_update_requests import set_frozen
+from .util import _props_key
+
+from gspread.utils import rowcol_to_a1
+
+import gzip
+import json
+
+__all__ = ('FormatSnapshot', 'take_snapshot', 'apply_snapshot')
+
+SNAPSHOT_FORMAT = 'gspread-formatting-snapshot'
+SNAPSHOT_VERSION = 1
+
+DEFAULT_ROW_HEIGHT = 21
+DEFAULT_COLUMN_WIDTH = 100
+
+
+def _append_run(runs, value, count):
+    if runs and runs[-2] == value:
+        runs[-1] += count
+    else:
+        runs.extend((value, count))
+
+def _iter_runs(runs):
+    """Yields ``(value, start, end)`` for each run of a flat ``[value, count, ...]`` list."""
+    position = 0
+    for i in range(0, len(runs), 2):
+        yield runs[i], position, position + runs[i + 1]
+        position += runs[i + 1]
+
+def _most_common(runs):
+    totals = {}
+    for value, start, end in _iter_runs(runs):
+        totals[value] = totals.get(value, 0) + end - start
+    return max(sorted(totals), key=lambda value: totals[value]) if totals else None
+
+
+class _Palette(object):
+    """Interns JSON-serializable objects, numbering them from 1; 0 stands for no object."""
+    def __init__(self):
+        self.items = []
+        self._ids = {}
+
+    def id_for(self, obj):
+        if not obj:
+            return 0
+        key = _props_key(obj)
+        item_id = self._ids.get(key)
+        if item_id is None:
+            self.items.append(obj)
+            item_id = self._ids[key] = len(self.items)
+        return item_id
+
+
+class FormatSnapshot(object):
+    """
+    The formatting of a worksheet, as taken by ``take_snapshot``. Attributes:
+
+    * ``title``, ``row_count``, ``column_count``, ``frozen_row_count``, ``frozen_column_count``;
+    * ``formats``: the palette of distinct user-entered formats (as API properties), and
+      ``cell_formats``: the run-length encoded format ids of the cells, row by row, as a flat list
+      ``[id, count, id, count, ...]`` where id 0 is no format and id ``n`` is ``formats[n - 1]``;
+    * ``validations`` and ``cell_validations``: the same, for data validation rules;
+    * ``text_format_runs``: a list of ``[row_index, column_index, runs]``, for cells having runs;
+    * ``row_heights`` and ``column_widths``: run-length encoded pixel sizes, ``[size, count, ...]``;
+    * ``conditional_format_rules``: a list of ``ConditionalFormatRule`` objects.
+    """
+    def __init__(self, title, row_count, column_count, frozen_row_count=0, frozen_column_count=0,
+                 formats=(), cell_formats=None, validations=(), cell_validations=None,
+                 text_format_runs=(), row_heights=None, column_widths=None, conditional_format_rules=()):
+        self.title = title
+        self.row_count = row_count
+        self.column_count = column_count
+        self.frozen_row_count = frozen_row_count
+        self.frozen_column_count = frozen_column_count
+        self.formats = list(formats)
+        self.cell_formats = cell_formats if cell_formats is not None else [0, row_count * column_count]
+        self.validations = list(validations)
+        self.cell_validations = cell_validations if cell_validations is not None else [0, row_count * column_count]
+        self.text_format_runs = list(text_format_runs)
+        self.row_heights = row_heights if row_heights is not None else [DEFAULT_ROW_HEIGHT, row_count]
+        self.column_widths = column_widths if column_widths is not None else [DEFAULT_COLUMN_WIDTH, column_count]
+        self.conditional_format_rules = list(conditional_format_rules)
+        for runs, length in (
+            (self.cell_formats, row_count * column_count), (self.cell_validations, row_count * column_count),
+            (self.row_heights, row_count), (self.column_widths, column_count)
+        ):
+            if sum(runs[1::2]) != length:
+                raise ValueError("Run-length encoded data covers %d items, not %d" % (sum(runs[1::2]), length))
+
+    def __repr__(self):
+        return '<FormatSnapshot %r %dx%d, %d formats, %d validations, %d conditional format rules>' % (
+            self.title, self.row_count, self.column_count, len(self.formats), len(self.validations),
+            len(self.conditional_format_rules)
+        )
+
+    def to_dict(self):
+        """Returns the snapshot as a dict of JSON-serializable values, as stored in files."""
+        return {
+            'format': SNAPSHOT_FORMAT,
+            'version': SNAPSHOT_VERSION,
+            'title': self.title,
+            'rowCount': self.row_count,
+            'columnCount': self.column_count,
+            'frozenRowCount': self.frozen_row_count,
+            'frozenColumnCount': self.frozen_column_count,
+            'formats': self.formats,
+            'cellFormats': self.cell_formats,
+            'validations': self.validations,
+            'cellValidations': self.cell_validations,
+            'textFormatRuns': self.text_format_runs,
+            'rowHeights': self.row_heights,
+            'columnWidths': self.column_widths,
+            'conditionalFormats': [rule.to_props() for rule in self.conditional_format_rules]
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        if data.get('format') != SNAPSHOT_FORMAT:
+            raise ValueError("Not a formatting snapshot")
+        if data.get('version') != SNAPSHOT_VERSION:
+            raise ValueError("Unsupported formatting snapshot version: %r" % data.get('version'))
+        return cls(
+            data['title'], data['rowCount'], data['columnCount'],
+            data['frozenRowCount'], data['frozenColumnCount'],
+            data['formats'], data['cellFormats'], data['validations'], data['cellValidations'],
+            data['textFormatRuns'], data['rowHeights'], data['columnWidths'],
+            [ConditionalFormatRule.from_props(p) for p in data['conditionalFormats']]
+        )
+
+    def save(self, file):
+        """Writes the snapshot to ``file``, a path or a binary file object."""
+        content = gzip.compress(json.dumps(self.to_dict(), separators=(',', ':')).encode('utf-8'))
+        if hasattr(file, 'write'):
+            file.write(content)
+        else:
+            with open(file, 'wb') as f:
+                f.write(content)
+
+    @classmethod
+    def load(cls, file):
+        """Reads a snapshot written by ``save`` from ``file``, a path or a binary file object."""
+        if hasattr(file, 'read'):
+            content = file.read()
+        else:
+            with open(file, 'rb') as f:
+                content = f.read()
+        return cls.from_dict(json.loads(gzip.decompress(content).decode('utf-8')))
+
+    def _grid_ranges(self, runs, sheet_id):
+        """Groups the cells of run-length encoded ``runs`` by value, as lists of ``GridRange``
+        objects, each covering a run's cells in one row or a block of whole rows."""
+        width = self.column_count
+        by_value = {}
+        def add(value, r0, r1, c0, c1):
+            by_value.setdefault(value, []).append(GridRange(
+                sheetId=sheet_id, startRowIndex=r0, endRowIndex=r1, startColumnIndex=c0, endColumnIndex=c1
+            ))
+        for value, start, end in _iter_runs(runs):
+            row, col = divmod(start, width)
+            end_row, end_col = divmod(end, width)
+            if row == end_row:
+                add(value, row, row + 1, col, end_col)
+                continue
+            if col:
+                add(value, row, row + 1, col, width)
+                row += 1
+            if end_row > row:
+                add(value, row, end_row, 0, width)
+            if end_col:
+                add(value, end_row, end_row + 1, 0, end_col)
+        return by_value
+
+    def _cell_requests(self, runs, palette, sheet_id, request):
+        if not self.row_count or not self.column_count:
+            return []
+        base = _most_common(runs)
+        requests = [request(GridRange(
+            sheetId=sheet_id, startRowIndex=0, endRowIndex=self.row_count,
+            startColumnIndex=0, endColumnIndex=self.column_count
+        ), palette[base - 1] if base else None, True)]
+        by_value = self._grid_ranges(runs, sheet_id)
+        for value in sorted(by_value):
+            if value == base:
+                continue
+            for gridrange in coalesce_ranges(by_value[value]):
+                requests.append(request(gridrange, palette[value - 1] if value else None, False))
+        return requests
+
+    def _dimension_requests(self, runs, sheet_id, dimension):
+        def request(size, start, end):
+            return {
+                'updateDimensionProperties': {
+                    'range': {'sheetId': sheet_id, 'dimension': dimension, 'startIndex': start, 'endIndex': end},
+                    'properties': {'pixelSize': size},
+                    'fields': 'pixelSize'
+                }
+            }
+        base = _most_common(runs)
+        if base is None:
+            return []
+        # the most common size over the whole dimension, then the others
+        return [request(base, 0, sum(runs[1::2]))] + [
+            request(size, start, end) for size, start, end in _iter_runs(runs) if size != base
+        ]
+
+    def requests(self, worksheet, current_rules=None):
+        """
+        Returns the requests that make ``worksheet`` formatted as in the snapshot.
+        The worksheet's grid is enlarged if it is smaller than the snapshot's.
+
+        :param worksheet: The ``Worksheet`` object to format.
+        :param current_rules: the worksheet's current ``ConditionalFormatRules``, as returned by
+                              ``get_conditional_format_rules``, which are replaced by the
+                              snapshot's rules. If None, the snapshot's rules are added before
+                              any existing rules.
+        """
+        sheet_id = worksheet.id
+        requests = []
+        row_count = getattr(worksheet, 'row_count', None)
+        col_count = getattr(worksheet, 'col_count', None)
+        grid = {}
+        if row_count is not None and row_count < self.row_count:
+            grid['rowCount'] = self.row_count
+        if col_count is not None and col_count < self.column_count:
+            grid['columnCount'] = self.column_count
+        if grid:
+            requests.append({
+                'updateSheetProperties': {
+                    'properties': {'sheetId': sheet_id, 'gridProperties': grid},
+                    'fields': ','.join('gridProperties.%s' % k for k in sorted(grid))
+                }
+            })
+
+        def format_request(gridrange, props, whole_grid):
+            # setting the whole grid also clears text format runs, set again below
+            return {
+                'repeatCell': {
+                    'range': gridrange.to_props(),
+                    'cell': {'userEnteredFormat': props} if props else {},
+                    'fields': 'userEnteredFormat,textFormatRuns' if whole_grid else 'userEnteredFormat'
+                }
+            }
+        requests.extend(self._cell_requests(self.cell_formats, self.formats, sheet_id, format_request))
+
+        def validation_request(gridrange, props, whole_grid):
+            body = {'range': gridrange.to_props()}
+            if props:
+                body['rule'] = props
+            return {'setDataValidation': body}
+        requests.extend(self._cell_requests(self.cell_validations, self.validations, sheet_id, validation_request))
+
+        requests.extend(
+            {
+                'updateCells': {
+                    'start': {'sheetId': sheet_id, 'rowIndex': row, 'columnIndex': col},
+                    'rows': [{'values': [{'textFormatRuns': runs}]}],
+                    'fields': 'textFormatRuns'
+                }
+            }
+            for row, col, runs in self.text_format_runs
+        )
+        requests.extend(self._dimension_requests(self.row_heights, sheet_id, 'ROWS'))
+        requests.extend(self._dimension_requests(self.column_widths, sheet_id, 'COLUMNS'))
+        requests.extend(set_frozen(worksheet, rows=self.frozen_row_count, cols=self.frozen_column_count))
+
+        rules = [_rule_on_sheet(rule, sheet_id) for rule in self.conditional_format_rules]
+        if current_rules is not None:
+            current_rules.clear()
+            current_rules.extend(rules)
+            requests.extend(current_rules._save_requests())
+        else:
+            requests.extend(
+                {'addConditionalFormatRule': {'rule': rule.to_props(), 'index': i}}
+                for i, rule in enumerate(rules)
+            )
+        return requests
+
+
+def _rule_on_sheet(rule, sheet_id):
+    props = rule.to_props()
+    for gridrange in props.get('ranges', []):
+        gridrange['sheetId'] = sheet_id
+    return ConditionalFormatRule.from_props(props)
+
+def _sheet_range(title, row_count, col_count):
+    return "'%s'!A1:%s" % (title.replace("'", "''"), rowcol_to_a1(row_count, col_count))
+
+
+def take_snapshot(worksheet):
+    """
+    Returns a ``FormatSnapshot`` of the formatting of the whole worksheet, read with one API call.
+
+    :param worksheet: The ``Worksheet`` object.
+    """
+    resp = _fetch_sheet_metadata(worksheet.spreadsheet, {
+        'includeGridData': True,
+        'ranges': [_sheet_range(worksheet.title, worksheet.row_count, worksheet.col_count)],
+        'fields': (
+            'sheets(properties(sheetId,title,gridProperties),conditionalFormats,'
+            'data(startRow,startColumn,rowMetadata.pixelSize,columnMetadata.pixelSize,'
+            'rowData.values(userEnteredFormat,textFormatRuns,dataValidation)))'
+        )
+    }, 'take_snapshot')
+    sheet = resp['sheets'][0]
+    grid = sheet['properties']['gridProperties']
+    row_count, col_count = grid['rowCount'], grid['columnCount']
+    data = sheet.get('data', [{}])[0]
+    first_row, first_col = data.get('startRow', 0), data.get('startColumn', 0)
+    row_data = data.get('rowData', [])
+
+    formats, validations = _Palette(), _Palette()
+    cell_formats, cell_validations, text_format_runs = [], [], []
+    empty = []
+    for r in range(row_count):
+        i = r - first_row
+        values = row_data[i].get('values', empty) if 0 <= i < len(row_data) else empty
+        if not values:
+            _append_run(cell_formats, 0, col_count)
+            _append_run(cell_validations, 0, col_count)
+            continue
+        for c in range(col_count):
+            j = c - first_col
+            cell = values[j] if 0 <= j < len(values) else None
+            if not cell:
+                _append_run(cell_formats, 0, 1)
+                _append_run(cell_validations, 0, 1)
+                continue
+            _append_run(cell_formats, formats.id_for(cell.get('userEnteredFormat')), 1)
+            _append_run(cell_validations, validations.id_for(cell.get('dataValidation')), 1)
+            if cell.get('textFormatRuns'):
+                text_format_runs.append([r, c, cell['textFormatRuns']])
+
+    def sizes(metadata, first, count, default):
+        runs = []
+        for index in range(count):
+            i = index - first
+            props = metadata[i] if 0 <= i < len(metadata) else {}
+            _append_run(runs, props.get('pixelSize', default), 1)
+        return runs
+
+    return FormatSnapshot(
+        sheet['properties']['title'], row_count, col_count,
+        grid.get('frozenRowCount', 0), grid.get('frozenColumnCount', 0),
+        formats.items, cell_formats, validations.items, cell_validations, text_format_runs,
+        sizes(data.get('rowMetadata', []), first_row, row_count, DEFAULT_ROW_HEIGHT),
+        sizes(data.get('columnMetadata', []), first_col, col_count, DEFAULT_COLUMN_WIDTH),
+        [ConditionalFormatRule.from_props(p) for p in sheet.get('conditionalFormats', [])]
+    )
+
+def apply_snapshot(worksheet, snapshot, replace_conditional_format_rules=True):
+    """
+    Formats ``worksheet`` as in ``snapshot``, with one ``batchUpdate`` call.
+
+    :param worksheet: The ``Worksheet`` object to format.
+    :param snapshot: A ``FormatSnapshot``.
+    :param replace_conditional_format_rules: if True (the default), the worksheet's conditional
+        format rules are first read (with one more API call) and replaced by the snapshot's;
+        if False, the snapshot's rules are added before any existing rules, which suits
+        newly created worksheets.
+    """
+    current_rules = get_conditional_format_rules(worksheet) if replace_conditional_format_rules else None
+    with _span('build', operation='apply_snapshot'):
+        requests = snapshot.requests(worksheet, current_rules)
+    resp = _batch_update(worksheet.spreadsheet, {'requests': requests}, 'apply_snapshot')
+    if current_rules is not None:
+        current_rules._mark_saved()
+    return resp
@@ -1,8 +1,12 @@
 # -*- coding: utf-8 -*-
-from functools import reduce
+from functools import reduce, lru_cache
 from operator import or_
+import inspect
+import json
 import re 
 
+from .instrumentation import _fetch_sheet_metadata
+
 def _convert_to_properties(fobj):
     if isinstance(fobj, list):
         return [i.to_props() for i in fobj]
@@ -11,6 +15,10 @@ def _convert_to_properties(fobj):
     else:
         return None
 
+def _props_key(props):
+    """A hashable key equal for equal API properties, for interning formats by value."""
+    return json.dumps(props, sort_keys=True)
+
 def _affected_fields_for(fobj, field_name):
     if isinstance(fobj, list):
         return list(reduce(or_, [set(i.affected_fields(field_name)) for i in fobj]))
@@ -28,35 +36,44 @@ def _build_repeat_cell_request(worksheet, range, formatting_object, celldata_fie
         }
     }
 
-def _fetch_with_updated_properties(spreadsheet, key, params=None):
+def _make_worksheet(spreadsheet, properties):
+    """Builds a gspread ``Worksheet`` from sheet properties already fetched from the API."""
+    from gspread import Worksheet
+    if 'client' in inspect.signature(Worksheet.__init__).parameters:
+        return Worksheet(spreadsheet, properties, spreadsheet.id, spreadsheet.client)
+    # gspread < 6.0.0
+    return Worksheet(spreadsheet, properties)
+
+def _fetch_with_updated_properties(spreadsheet, key, params=None, operation=None):
     try:
         return spreadsheet._properties[key]
     except KeyError:
-        metadata = spreadsheet.fetch_sheet_metadata(params)
+        metadata = _fetch_sheet_metadata(spreadsheet, params, operation)
         spreadsheet._properties.update(metadata['properties'])
         return spreadsheet._properties[key]
 
 _MAGIC_NUMBER = 64
 _CELL_ADDR_RE = re.compile(r'([A-Za-z]+)?([1-9]\d*)?')
+_COLUMN_LABEL_CACHE_SIZE = 4096
+
+@lru_cache(maxsize=_COLUMN_LABEL_CACHE_SIZE)
+def _column_label_to_index(column_label):
+    col = 0
+    for c in column_label.upper():
+        col = col * 26 + (ord(c) - _MAGIC_NUMBER)
+    return col
 
 def _a1_to_rowcol(label):
     if not label:
         raise ValueError(label)
     m = _CELL_ADDR_RE.match(label)
     if m:
-        column_label = m.group(1).upper() if m.group(1) else None
-        row = int(m.group(2)) if m.group(2) else None
-
-        if column_label is not None:
-            col = 0
-            for i, c in enumerate(reversed(column_label)):
-                col += (ord(c) - _MAGIC_NUMBER) * (26 ** i)
-        else:
-            col = None
+        column_label, row = m.groups()
+        col = _column_label_to_index(column_label) if column_label else None
+        row = int(row) if row else None
         return (row, col)
     raise ValueError(label)
 
-
 def _range_to_dimensionrange_object(range, worksheet_id):
     gridrange = _range_to_gridrange_object(range, worksheet_id)
     is_row_range = ('startRowIndex' in gridrange or 'endRowIndex' in gridrange)
@@ -79,11 +96,34 @@ def _range_to_dimensionrange_object(range, worksheet_id):
     return obj
 
 def _range_to_gridrange_object(range, worksheet_id):
+    if isinstance(range, (tuple, list)):
+        return _rowcol_range_to_gridrange_object(range, worksheet_id)
+    if hasattr(range, 'to_props'):
+        obj = range.to_props()
+        obj['sheetId'] = worksheet_id
+        return obj
     parts = range.split(':')
     start = parts[0]
     end = parts[1] if len(parts) > 1 else ''
     row_offset, column_offset = _a1_to_rowcol(start)
     last_row, last_column = _a1_to_rowcol(end) if end else (row_offset, column_offset)
+    return _bounds_to_gridrange_object(range, worksheet_id, row_offset, column_offset, last_row, last_column)
+
+def _rowcol_range_to_gridrange_object(rowcols, worksheet_id):
+    """Builds a GridRange object from 1-based, inclusive numeric coordinates:
+    either ``(row, col)`` for a single cell or ``(start_row, start_col, end_row, end_col)``
+    for a rectangle. ``None`` leaves that side of the range unbounded."""
+    if len(rowcols) == 2:
+        row_offset, column_offset = last_row, last_column = rowcols
+    elif len(rowcols) == 4:
+        row_offset, column_offset, last_row, last_column = rowcols
+    else:
+        raise ValueError(rowcols)
+    if all(v is None for v in rowcols):
+        raise ValueError(rowcols)
+    return _bounds_to_gridrange_object(rowcols, worksheet_id, row_offset, column_offset, last_row, last_column)
+
+def _bounds_to_gridrange_object(range, worksheet_id, row_offset, column_offset, last_row, last_column):
     # check for illegal ranges
     if (row_offset is not None and last_row is not None and row_offset > last_row):
         raise ValueError(range)
@@ -4,12 +4,25 @@ import os
 import re
 import random
 import unittest
+from unittest import mock
 import itertools
+import json
 import uuid
 from datetime import datetime, date
+import numpy as np
 import pandas as pd
 from gspread_dataframe import set_with_dataframe
 
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+try:
+    import polars
+except ImportError:
+    polars = None
+
 try:
     from StringIO import StringIO
 except ImportError:
@@ -25,7 +38,18 @@ from oauth2client.service_account import ServiceAccountCredentials
 import gspread
 from gspread import utils
 from gspread_formatting import *
+import gspread_formatting.batch_update_requests
+import gspread_formatting.ranges
 from gspread_formatting.dataframe import *
+from gspread_formatting.dataframe import _format_with_dataframe, _format_with_dataframes, _coalesce_format_requests, \
+    DEFAULT_TYPE_INFERENCE
+from gspread_formatting.evaluation import *
+from gspread_formatting.fake import FakeSheetsService
+from gspread_formatting.instrumentation import *
+from gspread_formatting.quota import *
+from gspread_formatting.snapshot import *
+from gspread_formatting.grid import *
+import benchmark
 from gspread_formatting.util import _range_to_gridrange_object, _range_to_dimensionrange_object
 
 try:
@@ -88,6 +112,23 @@ def gen_value(prefix=None):
 TEST_WORKSHEET_NAME = f'wksht_test{gen_value()}'
 
 
+class RecordingSpreadsheet(object):
+    """Stands in for a gspread Spreadsheet, recording batch_update bodies instead of sending them."""
+    def __init__(self):
+        self.bodies = []
+
+    def batch_update(self, body):
+        # batch updaters clear their request list after the call, so keep a copy
+        self.bodies.append(dict(body, requests=list(body['requests'])))
+        return {'replies': [{} for r in body['requests']]}
+
+class RecordingWorksheet(object):
+    def __init__(self, spreadsheet, id=0, title='Sheet1'):
+        self.spreadsheet = spreadsheet
+        self.id = id
+        self.title = title
+
+
 class RangeConversionTest(unittest.TestCase):
     RANGES = {
         'A': {'startColumnIndex': 0, 'endColumnIndex': 1},
@@ -114,6 +155,16 @@ class RangeConversionTest(unittest.TestCase):
 
     ILLEGAL_DIMENSION_RANGES = ( 'A5:B', '1:C3', 'A1:D5' )
 
+    ROWCOL_RANGES = {
+        (1, 1): 'A1',
+        (2, 3, 10, 27): 'C2:AA10',
+        (None, 1, None, 3): 'A:C',
+        (5, 1, None, 2): 'A5:B',
+        (3, None, 100, None): '3:100'
+    }
+
+    ILLEGAL_ROWCOL_RANGES = ( (2, 1, 1, 1), (1, 3, 1, 1), (1, 2, 3), (None, None) )
+
     def test_ranges(self):
         worksheet_id = 0
         for range, gridrange_obj in self.RANGES.items():
@@ -146,6 +197,24 @@ class RangeConversionTest(unittest.TestCase):
                 exc = e
             self.assertTrue(isinstance(exc, ValueError))
 
+    def test_rowcol_ranges(self):
+        for rowcols, range in self.ROWCOL_RANGES.items():
+            self.assertEqual(_range_to_gridrange_object(range, 3), _range_to_gridrange_object(rowcols, 3))
+
+    def test_illegal_rowcol_ranges(self):
+        for rowcols in self.ILLEGAL_ROWCOL_RANGES:
+            with self.assertRaises(ValueError):
+                _range_to_gridrange_object(rowcols, 0)
+
+    def test_gridrange_ranges(self):
+        gr = GridRange(sheetId=9, startRowIndex=4, startColumnIndex=0, endColumnIndex=2)
+        self.assertEqual(_range_to_gridrange_object('A5:B', 3), _range_to_gridrange_object(gr, 3))
+        self.assertEqual(
+            {'dimension': 'ROWS', 'startIndex': 2, 'endIndex': 3, 'sheetId': 0}, 
+            _range_to_dimensionrange_object((3, None), 0)
+        )
+
+
 class GspreadTest(unittest.TestCase):
     maxDiff = None
     config = None
@@ -477,8 +546,8 @@ class WorksheetTest(GspreadTest):
         current_rules.append(new_rule_2)
         current_rules.append(new_rule_3)
         self.assertNotEqual(current_rules.save(), None)
-        # re-saving _always_ sends a request to API, even if no local changes made
-        self.assertNotEqual(current_rules.save(), None)
+        # re-saving without local changes sends no request to API
+        self.assertEqual(current_rules.save(), None)
         current_rules = get_conditional_format_rules(self.sheet)
         self.assertEqual(
             current_rules.rules[0].booleanRule.format.textFormat.bold, 
@@ -830,3 +899,1272 @@ class GridRangeTest(unittest.TestCase):
         gr = GridRange.from_props({'startRowIndex': 1})
         self.assertEqual(0, gr.sheetId)
         self.assertEqual(1, gr.startRowIndex)
+
+    def test_intersection_and_containment(self):
+        a = GridRange(0, 0, 10, 0, 5)
+        b = GridRange(0, 5, None, 2, None)
+        self.assertEqual(GridRange(0, 5, 10, 2, 5), a & b)
+        self.assertEqual(15, (a & b).area())
+        self.assertEqual(None, b.area())
+        self.assertEqual(None, a & GridRange(1, 0, 10, 0, 5))
+        self.assertEqual(None, a & GridRange(0, 10, 11, 0, 5))
+        self.assertTrue(a.contains(GridRange(0, 1, 2, 1, 2)))
+        self.assertTrue((9, 4) in a)
+        self.assertFalse((10, 4) in a)
+        self.assertFalse(a.contains(b))
+
+    def test_difference_and_union(self):
+        a = GridRange(0, 0, 4, 0, 4)
+        hole = GridRange(0, 1, 3, 1, 3)
+        pieces = a - hole
+        self.assertEqual(4, len(pieces))
+        self.assertEqual(12, sum(p.area() for p in pieces))
+        self.assertFalse(any(p.intersects(hole) for p in pieces))
+        self.assertEqual([a], a - GridRange(0, 5, 6, 5, 6))
+        self.assertEqual([], hole - a)
+        self.assertEqual([GridRange(0, 0, 4, 0, 8)], a | GridRange(0, 0, 4, 4, 8))
+        self.assertEqual([a], coalesce_ranges(pieces + [hole]))
+
+    def test_coalesce_many_ranges(self):
+        cells = [GridRange(0, r, r + 1, c, c + 1) for r in range(40) for c in range(25)]
+        random.Random(7).shuffle(cells)
+        self.assertEqual([GridRange(0, 0, 40, 0, 25)], coalesce_ranges(cells))
+        rng = random.Random(11)
+        ranges = [
+            GridRange(rng.randint(0, 1), r, r + rng.randint(1, 4), c, c + rng.randint(1, 4))
+            for r, c in ((rng.randint(0, 60), rng.randint(0, 20)) for i in range(500))
+        ]
+        covered = lambda rs: set(
+            (g.sheetId, r, c) for g in rs
+            for r in range(g.startRowIndex, g.endRowIndex) for c in range(g.startColumnIndex, g.endColumnIndex)
+        )
+        rects = coalesce_ranges(ranges)
+        self.assertEqual(covered(ranges), covered(rects))
+        self.assertEqual(len(covered(ranges)), sum(g.area() for g in rects))
+
+
+class GridRangeIndexTest(unittest.TestCase):
+
+    def test_queries_return_values_in_insertion_order(self):
+        ranges = [
+            GridRange(0, r, r + 3, c, c + 2) for r in range(0, 60, 2) for c in range(0, 40, 3)
+        ]
+        ranges.append(GridRange(0, 5, None, None, 1))
+        ranges.append(GridRange(1, 0, 100, 0, 100))
+        index = GridRangeIndex(((gr, i) for i, gr in enumerate(ranges)), node_capacity=4)
+        self.assertEqual(len(ranges), len(index))
+        for row, col in [(0, 0), (7, 0), (59, 38), (500, 0), (61, 41)]:
+            self.assertEqual(
+                [i for i, gr in enumerate(ranges) if gr.sheetId == 0 and gr.contains((row, col))],
+                index.query_point(row, col)
+            )
+        query = GridRange(0, 10, 14, 5, 9)
+        self.assertEqual(
+            [i for i, gr in enumerate(ranges) if gr.intersects(query)],
+            index.query_range(query)
+        )
+        index.add(GridRange(0, 0, 1, 0, 1), 'late')
+        self.assertEqual('late', index.query_point(0, 0)[-1])
+
+    def test_work_per_range_stays_logarithmic_under_inserts(self):
+        # coalesce_ranges adds each piece right after querying for it; count the
+        # bounding boxes tested by queries and merged by tree builds rather than
+        # timing them.
+        def boxes_per_range(n):
+            rng = random.Random(3)
+            ranges = [
+                GridRange(0, r, r + 1, c, c + 1)
+                for r, c in ((rng.randint(0, n // 10), rng.randint(0, 30)) for i in range(n))
+            ]
+            count = [0]
+            overlaps = gspread_formatting.ranges._bbox_overlaps
+            union = gspread_formatting.ranges._bbox_union
+            def counting_overlaps(a, b):
+                count[0] += 1
+                return overlaps(a, b)
+            def counting_union(boxes):
+                count[0] += len(boxes)
+                return union(boxes)
+            with mock.patch('gspread_formatting.ranges._bbox_overlaps', counting_overlaps), \
+                    mock.patch('gspread_formatting.ranges._bbox_union', counting_union):
+                coalesce_ranges(ranges)
+            return count[0] / float(n)
+        # square-root rebuilds would grow the work per range fourfold here
+        self.assertLess(boxes_per_range(16000), 2.5 * boxes_per_range(1000))
+
+
+class ConditionalFormatRulesSaveTest(unittest.TestCase):
+
+    def make_rule(self, n):
+        return ConditionalFormatRule(
+            ranges=[GridRange(0, n, n + 1, 0, 4)],
+            booleanRule=BooleanRule(
+                condition=BooleanCondition('NUMBER_GREATER', [str(n)]),
+                format=CellFormat(textFormat=TextFormat(bold=True))
+            )
+        )
+
+    def apply(self, rules, requests):
+        rules = [r.to_props() for r in rules]
+        for req in requests:
+            (kind, body), = req.items()
+            if kind == 'deleteConditionalFormatRule':
+                del rules[body['index']]
+            elif kind == 'addConditionalFormatRule':
+                rules.insert(body['index'], body['rule'])
+            elif 'newIndex' in body:
+                rules.insert(body['newIndex'], rules.pop(body['index']))
+            else:
+                rules[body['index']] = body['rule']
+        return rules
+
+    def test_minimal_requests(self):
+        spreadsheet = RecordingSpreadsheet()
+        original = [self.make_rule(n) for n in range(300)]
+        rules = ConditionalFormatRules(RecordingWorksheet(spreadsheet), original)
+        self.assertEqual(None, rules.save())
+        rules[150] = self.make_rule(1000)
+        rules.save()
+        self.assertEqual(1, len(spreadsheet.bodies[-1]['requests']))
+        self.assertIn('updateConditionalFormatRule', spreadsheet.bodies[-1]['requests'][0])
+        rules.insert(10, rules.pop(200))
+        rules.save()
+        self.assertEqual(1, len(spreadsheet.bodies[-1]['requests']))
+        # in-place mutation of a rule is detected
+        rules[0].booleanRule.format.textFormat.italic = True
+        rules.save()
+        self.assertEqual(1, len(spreadsheet.bodies[-1]['requests']))
+        self.assertEqual(None, rules.save())
+
+    def test_random_edits_reproduce_rules(self):
+        rng = random.Random(28)
+        for _ in range(200):
+            original = [self.make_rule(rng.randrange(10)) for _ in range(rng.randrange(8))]
+            spreadsheet = RecordingSpreadsheet()
+            rules = ConditionalFormatRules(RecordingWorksheet(spreadsheet), original)
+            for _ in range(rng.randrange(5)):
+                op = rng.randrange(4)
+                if op == 0 and rules:
+                    del rules[rng.randrange(len(rules))]
+                elif op == 1:
+                    rules.insert(rng.randrange(len(rules) + 1), self.make_rule(rng.randrange(20)))
+                elif op == 2 and rules:
+                    rules.insert(rng.randrange(len(rules)), rules.pop(rng.randrange(len(rules))))
+                elif op == 3 and rules:
+                    rules[rng.randrange(len(rules))] = self.make_rule(rng.randrange(20))
+            rules.save()
+            requests = spreadsheet.bodies[-1]['requests'] if spreadsheet.bodies else []
+            self.assertEqual([r.to_props() for r in rules], self.apply(original, requests))
+
+    def test_all_sheets_fetched_and_saved_at_once(self):
+        make_rule = self.make_rule
+        class MetadataSpreadsheet(RecordingSpreadsheet):
+            id = 'spreadsheet-id'
+            client = gspread.http_client.HTTPClient.__new__(gspread.http_client.HTTPClient)
+            def fetch_sheet_metadata(self, params=None):
+                self.bodies.append(params)
+                return {'sheets': [
+                    {
+                        'properties': {'sheetId': sheet_id, 'title': 'Sheet%d' % sheet_id, 'index': sheet_id},
+                        'conditionalFormats': [make_rule(n).to_props() for n in range(sheet_id)]
+                    }
+                    for sheet_id in range(3)
+                ]}
+        spreadsheet = MetadataSpreadsheet()
+        all_rules = get_all_conditional_format_rules(spreadsheet)
+        self.assertEqual([{'fields': 'sheets(properties,conditionalFormats)'}], spreadsheet.bodies)
+        self.assertEqual([0, 1, 2], sorted(all_rules))
+        self.assertEqual(2, len(all_rules[2]))
+        self.assertEqual('Sheet1', all_rules[1].worksheet.title)
+        self.assertIs(all_rules[1], all_rules[all_rules[1].worksheet])
+        self.assertEqual(None, all_rules.save())
+        all_rules[0].append(make_rule(7))
+        del all_rules[2][0]
+        all_rules.save()
+        self.assertEqual(
+            ['addConditionalFormatRule', 'deleteConditionalFormatRule'],
+            [list(r)[0] for r in spreadsheet.bodies[-1]['requests']]
+        )
+        self.assertEqual(None, all_rules.save())
+
+    def test_consolidate(self):
+        red = CellFormat(backgroundColor=Color(1, 0, 0))
+        def rule(range, value, fmt=red):
+            return ConditionalFormatRule(
+                ranges=[range], 
+                booleanRule=BooleanRule(BooleanCondition('NUMBER_EQ', [value]), fmt)
+            )
+        spreadsheet = RecordingSpreadsheet()
+        rules = ConditionalFormatRules(RecordingWorksheet(spreadsheet), [
+            rule(GridRange(0, 0, 10, 0, 1), '1'),
+            rule(GridRange(0, 0, 10, 1, 2), '1'),
+            # overlaps the rule below it, so must keep precedence over it
+            rule(GridRange(0, 0, 10, 3, 4), '2'),
+            rule(GridRange(0, 0, 10, 2, 3), '1'),
+            rule(GridRange(0, 5, 10, 3, 4), '1'),
+            rule(GridRange(0, 0, 10, 5, 6), '1', CellFormat(backgroundColor=Color(0, 1, 0))),
+            ConditionalFormatRule(
+                ranges=[GridRange(0, 0, 10, 6, 7)], 
+                booleanRule=BooleanRule(BooleanCondition('CUSTOM_FORMULA', ['=A1>0']), red)
+            ),
+            ConditionalFormatRule(
+                ranges=[GridRange(0, 0, 10, 7, 8)], 
+                booleanRule=BooleanRule(BooleanCondition('CUSTOM_FORMULA', ['=A1>0']), red)
+            ),
+            # relative references in condition values are anchored like custom formulas
+            rule(GridRange(0, 0, 10, 8, 9), '=A1'),
+            rule(GridRange(0, 0, 10, 9, 10), '=A1'),
+        ])
+        rules.consolidate()
+        self.assertEqual(8, len(rules))
+        self.assertEqual([GridRange(0, 0, 10, 9, 10)], rules[7].ranges)
+        self.assertEqual([GridRange(0, 0, 10, 0, 3)], rules[0].ranges)
+        self.assertEqual([GridRange(0, 5, 10, 3, 4)], rules[2].ranges)
+        rules.save()
+        # one rule replaced with merged ranges, two merged rules deleted
+        self.assertEqual(3, len(spreadsheet.bodies[-1]['requests']))
+
+
+class EvaluationTest(unittest.TestCase):
+    VALUES = [
+        [1, 'apple', None, date(2024, 1, 5)],
+        [50.5, 'Banana', '', date(2024, 1, 20)],
+        [200, True, float('nan'), 'x']
+    ]
+
+    def check(self, condition_type, values, expected):
+        mask = evaluate_condition(BooleanCondition(condition_type, values), self.VALUES, today=date(2024, 1, 22))
+        self.assertEqual(expected, mask.astype(int).tolist())
+
+    def test_conditions(self):
+        self.check('NUMBER_GREATER', ['10'], [[0, 0, 0, 0], [1, 0, 0, 0], [1, 0, 0, 0]])
+        self.check('NUMBER_NOT_BETWEEN', ['0', '60'], [[0, 0, 0, 0], [0, 0, 0, 0], [1, 0, 0, 0]])
+        self.check('TEXT_CONTAINS', ['AN'], [[0, 0, 0, 0], [0, 1, 0, 0], [0, 0, 0, 0]])
+        self.check('BLANK', [], [[0, 0, 1, 0], [0, 0, 1, 0], [0, 0, 1, 0]])
+        self.check('DATE_AFTER', ['2024-01-10'], [[0, 0, 0, 0], [0, 0, 0, 1], [0, 0, 0, 0]])
+        self.check('DATE_EQ', [RelativeDate('PAST_WEEK')], [[0, 0, 0, 0], [0, 0, 0, 1], [0, 0, 0, 0]])
+        self.check('ONE_OF_LIST', ['APPLE', 'x'], [[0, 1, 0, 0], [0, 0, 0, 0], [0, 0, 0, 1]])
+        with self.assertRaises(ValueError):
+            evaluate_condition(BooleanCondition('CUSTOM_FORMULA', ['=A1>1']), self.VALUES)
+
+    def test_gradient_and_rule_precedence(self):
+        gradient = GradientRule(
+            minpoint=InterpolationPoint(color=Color(1, 0, 0), type='NUMBER', value='0'),
+            maxpoint=InterpolationPoint(color=Color(0, 0, 1), type='NUMBER', value='100')
+        )
+        colors = evaluate_gradient(gradient, [[0, 25, 'a', 500]])
+        self.assertEqual([1.0, 0.75], colors[0, :2, 0].tolist())
+        self.assertEqual([0.0, 0.0, 1.0], colors[0, 3].tolist())
+        self.assertTrue(all(v != v for v in colors[0, 2]))
+
+        bold = CellFormat(textFormat=TextFormat(bold=True))
+        rules = [
+            ConditionalFormatRule(
+                ranges=[GridRange(0, 0, 1, None, None)], 
+                booleanRule=BooleanRule(BooleanCondition('NOT_BLANK', []), bold)
+            ),
+            ConditionalFormatRule(ranges=[GridRange(0, 0, 3, 0, 1)], gradientRule=gradient)
+        ]
+        result = evaluate_conditional_format_rules(rules, self.VALUES)
+        self.assertEqual([bold, bold, None, bold], list(result[0]))
+        self.assertEqual(Color(0.4950, 0, 0.5050), result[1][0].backgroundColor)
+        self.assertEqual(None, result[1][1])
+        # a block starting at row index 1 is outside the first rule, and only column A is in the second
+        result = evaluate_conditional_format_rules(rules, [[1, 2]], startRowIndex=1)
+        self.assertEqual(Color(0.99, 0, 0.01), result[0][0].backgroundColor)
+        self.assertEqual(None, result[0][1])
+
+    def test_effective_formats_from_single_read(self):
+        class MetadataSpreadsheet(RecordingSpreadsheet):
+            def fetch_sheet_metadata(self, params=None):
+                self.bodies.append(params)
+                return {
+                    'properties': {'defaultFormat': {'textFormat': {'fontSize': 10}}},
+                    'sheets': [{
+                        'properties': {'sheetId': 0},
+                        'conditionalFormats': [{
+                            'ranges': [{'sheetId': 0, 'startColumnIndex': 1, 'endColumnIndex': 2}],
+                            'booleanRule': {
+                                'condition': {'type': 'DATE_BEFORE', 'values': [{'userEnteredValue': '2020-01-01'}]},
+                                'format': {'textFormat': {'italic': True}}
+                            }
+                        }],
+                        'data': [{
+                            'startRow': 1,
+                            'rowData': [
+                                {'values': [
+                                    {'userEnteredFormat': {'textFormat': {'bold': True}}, 'effectiveValue': {'stringValue': 'x'}},
+                                    {'userEnteredFormat': {'numberFormat': {'type': 'DATE'}}, 'effectiveValue': {'numberValue': 43000}}
+                                ]},
+                                {'values': [{}, {'effectiveValue': {'numberValue': 43000}}]}
+                            ]
+                        }]
+                    }]
+                }
+        spreadsheet = MetadataSpreadsheet()
+        formats = get_effective_formats(RecordingWorksheet(spreadsheet), 'A2:C3')
+        self.assertEqual(1, len(spreadsheet.bodies))
+        self.assertEqual((2, 3), formats.shape)
+        self.assertEqual(CellFormat(textFormat=TextFormat(fontSize=10, bold=True)), formats[0][0])
+        self.assertEqual(
+            CellFormat(numberFormat=NumberFormat('DATE'), textFormat=TextFormat(fontSize=10, italic=True)),
+            formats[0][1]
+        )
+        # a bare number in B3 is not a date, so the DATE_BEFORE rule does not apply
+        self.assertEqual(CellFormat(textFormat=TextFormat(fontSize=10)), formats[1][1])
+        self.assertIs(formats[1][0], formats[0][2])
+
+
+def paint_requests(requests):
+    """Applies repeatCell requests to a dict of (row index, column index) -> userEnteredFormat props."""
+    grid = {}
+    for req in requests:
+        if 'repeatCell' not in req:
+            continue
+        rng = req['repeatCell']['range']
+        fmt = req['repeatCell']['cell']['userEnteredFormat']
+        for r in range(rng['startRowIndex'], rng['endRowIndex']):
+            for c in range(rng['startColumnIndex'], rng['endColumnIndex']):
+                grid[(r, c)] = fmt
+    return grid
+
+
+class FakeSheetsServiceTest(unittest.TestCase):
+    BOLD = cellFormat(textFormat=textFormat(bold=True))
+
+    def test_formatting_round_trip(self):
+        service = FakeSheetsService()
+        worksheet = service.create('Report').sheet1
+        format_cell_range(worksheet, 'A1:B2', self.BOLD)
+        with batch_updater(worksheet.spreadsheet) as batch:
+            batch.format_cell_range(worksheet, 'B2:C3', cellFormat(backgroundColor=color(1, 0, 0)))
+            batch.set_frozen(worksheet, rows=1)
+            batch.set_column_width(worksheet, 'A', 200)
+        self.assertEqual(
+            cellFormat(textFormat=textFormat(bold=True), backgroundColor=color(1, 0, 0)),
+            get_user_entered_format(worksheet, 'B2')
+        )
+        self.assertEqual(None, get_user_entered_format(worksheet, 'D4'))
+        self.assertEqual('arial,sans,sans-serif', get_effective_format(worksheet, 'A1').textFormat.fontFamily)
+        self.assertEqual(1, get_frozen_row_count(worksheet))
+        rules = get_conditional_format_rules(worksheet)
+        rules.append(ConditionalFormatRule(
+            ranges=[GridRange.from_a1_range('A1:A5', worksheet)],
+            booleanRule=BooleanRule(condition=BooleanCondition('NUMBER_GREATER', ['2']), format=self.BOLD)
+        ))
+        rules.save()
+        self.assertEqual(list(rules), list(get_conditional_format_rules(worksheet)))
+        metadata = worksheet.spreadsheet.fetch_sheet_metadata({
+            'includeGridData': True, 'ranges': ['Sheet1!A1:B1'], 'fields': 'sheets.data(columnMetadata,rowData)'
+        })
+        data = metadata['sheets'][0]['data'][0]
+        self.assertEqual([{'pixelSize': 200}, {'pixelSize': 100}], data['columnMetadata'])
+        self.assertEqual(
+            [self.BOLD.to_props()] * 2,
+            [cell['userEnteredFormat'] for cell in data['rowData'][0]['values']]
+        )
+        self.assertFalse('rowMetadata' in data)
+        self.assertEqual(
+            {'repeatCell': 2, 'updateSheetProperties': 1, 'updateDimensionProperties': 1,
+             'addConditionalFormatRule': 1, 'addSheet': 1},
+            service.request_counts
+        )
+
+    def test_all_conditional_format_rules(self):
+        spreadsheet = FakeSheetsService().create('Report')
+        worksheet = spreadsheet.add_worksheet('Costs', rows=10, cols=5)
+        all_rules = get_all_conditional_format_rules(spreadsheet)
+        self.assertEqual('Costs', all_rules[worksheet].worksheet.title)
+        all_rules[worksheet].append(ConditionalFormatRule(
+            ranges=[GridRange.from_a1_range('A1:A5', worksheet)],
+            booleanRule=BooleanRule(condition=BooleanCondition('NUMBER_GREATER', ['2']), format=self.BOLD)
+        ))
+        all_rules.save()
+        self.assertEqual(list(all_rules[worksheet]), list(get_conditional_format_rules(worksheet)))
+        self.assertEqual(0, len(get_conditional_format_rules(spreadsheet.sheet1)))
+        with self.assertRaises(NotImplementedError):
+            worksheet.client.request('get', 'https://sheets.googleapis.com/v4/spreadsheets/x')
+
+    def test_failed_batch_is_not_applied(self):
+        worksheet = FakeSheetsService().create('Report', rows=10, cols=5).sheet1
+        for requests in (
+            [('A1', self.BOLD), ('A11', self.BOLD)],
+            [('A1', self.BOLD), ('F1', self.BOLD)]
+        ):
+            with self.assertRaises(gspread.exceptions.APIError) as cm:
+                format_cell_ranges(worksheet, requests)
+            self.assertEqual(400, cm.exception.code)
+            self.assertTrue('exceeds grid limits' in str(cm.exception))
+        with self.assertRaises(gspread.exceptions.APIError):
+            worksheet.spreadsheet.batch_update({'requests': [
+                {'updateSheetProperties': {'properties': {'sheetId': 0, 'title': 'Renamed'}, 'fields': 'title'}},
+                {'mergeCells': {}}
+            ]})
+        self.assertEqual(None, get_user_entered_format(worksheet, 'A1'))
+        for body in ({'requests': []}, {'requests': [[], []]}, {}):
+            with self.assertRaises(gspread.exceptions.APIError) as cm:
+                worksheet.spreadsheet.batch_update(body)
+            self.assertEqual(400, cm.exception.code)
+        # a batch updater flushed by its last request has nothing left to send on exit
+        with batch_updater(worksheet.spreadsheet, max_pending_requests=1) as batch:
+            batch.format_cell_range(worksheet, 'A1', self.BOLD)
+        self.assertEqual(self.BOLD, get_user_entered_format(worksheet, 'A1'))
+        self.assertEqual('Sheet1', worksheet.spreadsheet.sheet1.title)
+
+    def test_copy_format(self):
+        spreadsheet = FakeSheetsService().create('Report', rows=20, cols=10)
+        worksheet = spreadsheet.sheet1
+        other = spreadsheet.add_worksheet('Other', rows=20, cols=10)
+        red = cellFormat(backgroundColor=color(1, 0, 0))
+        format_cell_ranges(worksheet, [('A1:B1', self.BOLD), ('A2:B2', red), ('H10', red)])
+        with batch_updater(spreadsheet) as batch:
+            batch.copy_format(worksheet, 'A1:B2', ['D1:G4', 'H10'])
+        copy_format(other, 'A1:B2', (1, 1), source_worksheet=worksheet)
+        self.assertEqual(
+            [{
+                'copyPaste': {
+                    'source': {'sheetId': 0, 'startRowIndex': 0, 'endRowIndex': 2, 'startColumnIndex': 0, 'endColumnIndex': 2},
+                    'destination': {'sheetId': 0, 'startRowIndex': 9, 'endRowIndex': 10, 'startColumnIndex': 7, 'endColumnIndex': 8},
+                    'pasteType': 'PASTE_FORMAT',
+                    'pasteOrientation': 'NORMAL'
+                }
+            }],
+            gspread_formatting.batch_update_requests.copy_format(worksheet, 'A1:B2', 'H10')
+        )
+        # D1:G4 repeats the source four times; H10 receives all of it
+        for label, fmt in (('D1', self.BOLD), ('G3', self.BOLD), ('G4', red), ('H10', self.BOLD), ('I11', red)):
+            self.assertEqual(fmt, get_user_entered_format(worksheet, label))
+        self.assertEqual(None, get_user_entered_format(worksheet, 'D5'))
+        self.assertEqual(red, get_user_entered_format(other, 'B2'))
+        # the same spreadsheet, opened again
+        reopened = spreadsheet.service.open(spreadsheet.id).worksheet('Other')
+        copy_format(reopened, 'A1', 'C3', source_worksheet=worksheet)
+        self.assertEqual(self.BOLD, get_user_entered_format(other, 'C3'))
+        for dest_ranges in ([], ()):
+            with self.assertRaises(ValueError):
+                copy_format(worksheet, 'A1:B2', dest_ranges)
+        # booleans are not coordinates, so this is not read as the single cell A1
+        with self.assertRaises((ValueError, AttributeError)):
+            gspread_formatting.batch_update_requests.copy_format(worksheet, 'A1:B2', (True, True))
+        with self.assertRaises(ValueError):
+            copy_format(worksheet, 'A1', 'B1', source_worksheet=spreadsheet.service.create('New').sheet1)
+
+    def test_update_borders(self):
+        worksheet = FakeSheetsService().create('Report', rows=20, cols=10).sheet1
+        thick, thin, dotted = border('SOLID_THICK'), border('SOLID'), border('DOTTED')
+        format_cell_range(worksheet, 'B2', cellFormat(borders=borders(bottom=dotted), textFormat=textFormat(bold=True)))
+        update_borders(worksheet, 'B2:C3', top=thick, inner_vertical=thin)
+        self.assertEqual(
+            cellFormat(borders=borders(top=thick, right=thin, bottom=dotted), textFormat=textFormat(bold=True)),
+            get_user_entered_format(worksheet, 'B2')
+        )
+        self.assertEqual(cellFormat(borders=borders(left=thin)), get_user_entered_format(worksheet, 'C3'))
+        with self.assertRaises(ValueError):
+            update_borders(worksheet, 'A1')
+
+        # a boxed table with thin inner lines, given cell by cell, takes a single request
+        cells = [('A1:D5', borders(top=thin, bottom=thin, left=thin, right=thin)),
+                 ('A1:D1', borders(top=thick)), ('A5:D5', borders(bottom=thick)),
+                 ('A1:A5', borders(left=thick)), ('D1:D5', borders(right=thick))]
+        requests = gspread_formatting.batch_update_requests.update_cell_borders(worksheet, cells)
+        self.assertEqual(1, len(requests))
+        self.assertEqual(
+            {'top', 'bottom', 'left', 'right', 'innerHorizontal', 'innerVertical', 'range'},
+            set(requests[0]['updateBorders'])
+        )
+
+        worksheet = worksheet.spreadsheet.add_worksheet('Borders', rows=20, cols=10)
+        rng = random.Random(1)
+        cells = []
+        for i in range(30):
+            r, c = rng.randrange(1, 12), rng.randrange(1, 8)
+            sides = dict((side, rng.choice([thin, thick, None])) for side in ('top', 'bottom', 'left', 'right'))
+            cells.append(((r, c, r + rng.randrange(0, 4), c + rng.randrange(0, 3)), borders(**sides)))
+        update_cell_borders(worksheet, cells)
+        expected = gspread_formatting.batch_update_requests._border_edges(worksheet, cells)
+        data = worksheet.spreadsheet.fetch_sheet_metadata({
+            'includeGridData': True, 'ranges': ['Borders!A1:J20'],
+            'fields': 'sheets.data.rowData.values.userEnteredFormat.borders'
+        })['sheets'][0]['data'][0]['rowData']
+        def side(r, c, name):
+            try:
+                return json.dumps(data[r]['values'][c]['userEnteredFormat']['borders'][name], sort_keys=True)
+            except (IndexError, KeyError):
+                return None
+        for edges, (before, after) in zip(expected, (('bottom', 'top'), ('right', 'left'))):
+            for (boundary, position), key in edges.items():
+                if edges is expected[0]:
+                    found = side(boundary, position, after) or side(boundary - 1, position, before)
+                else:
+                    found = side(position, boundary, after) or side(position, boundary - 1, before)
+                self.assertEqual(key, found)
+
+    def test_latency_and_throttling(self):
+        now = [0.0]
+        def sleep(seconds):
+            now[0] += seconds
+        service = FakeSheetsService(latency=0.5, max_calls_per_minute=4, sleep=sleep, clock=lambda: now[0])
+        worksheet = service.create('Report').sheet1
+        codes = []
+        for attempt in range(6):
+            try:
+                format_cell_range(worksheet, 'A1', self.BOLD)
+                codes.append(200)
+            except gspread.exceptions.APIError as e:
+                codes.append(e.code)
+        # create() and sheet1 made the first two calls
+        self.assertEqual([200, 200, 429, 429, 429, 429], codes)
+        self.assertEqual(4.0, now[0])
+        now[0] += 60
+        service.throttle_next(1)
+        with self.assertRaises(gspread.exceptions.APIError):
+            get_user_entered_format(worksheet, 'A1')
+        self.assertEqual(self.BOLD, get_user_entered_format(worksheet, 'A1'))
+        self.assertEqual(5, service.throttled)
+        self.assertEqual({'get': 3, 'batchUpdate': 7}, service.calls)
+
+
+class InstrumentationTest(unittest.TestCase):
+    BOLD = cellFormat(textFormat=textFormat(bold=True))
+
+    def test_spans_and_counters(self):
+        service = FakeSheetsService()
+        worksheet = service.create('Report').sheet1
+        metrics = []
+        callback = MetricsCallbackInstrument(lambda name, value, tags: metrics.append((name, value, tags)))
+        with instrumented(TotalsInstrument(), callback) as totals:
+            format_cell_ranges(worksheet, [('A1:B2', self.BOLD), ('C3', self.BOLD)])
+            with batch_updater(worksheet.spreadsheet) as batch:
+                batch.format_cell_range(worksheet, 'D4', self.BOLD)
+                batch.set_frozen(worksheet, rows=1)
+            get_user_entered_format(worksheet, 'A1')
+            with self.assertRaises(gspread.exceptions.APIError):
+                format_cell_range(worksheet, 'AA1', self.BOLD)
+        format_cell_range(worksheet, 'A1', self.BOLD)
+
+        self.assertEqual({'build': 4, 'serialize': 3, 'api_call': 4}, totals.counts)
+        self.assertEqual(5, totals.counters['requests'])
+        self.assertTrue(totals.counters['request_bytes'] > 0)
+        self.assertTrue(totals.counters['response_bytes'] > 0)
+        self.assertEqual(
+            {'build': 1, 'serialize': 1, 'api_call': 1}, totals.by_operation['format_cell_ranges'].counts
+        )
+        self.assertEqual(2, totals.by_operation['SpreadsheetBatchUpdater.execute'].counters['requests'])
+        self.assertEqual(
+            {'build': 1}, totals.by_operation['SpreadsheetBatchUpdater.format_cell_range'].counts
+        )
+        self.assertEqual({'api_call': 1}, totals.by_operation['get_user_entered_format'].counts)
+
+        api_calls = [m for m in metrics if m[0] == 'gspread_formatting.api_call.seconds']
+        self.assertEqual(
+            [('batchUpdate', None), ('batchUpdate', None), ('get', None), ('batchUpdate', 'APIError')],
+            [(tags['method'], tags['error']) for name, value, tags in api_calls]
+        )
+        self.assertEqual(worksheet.spreadsheet.id, api_calls[0][2]['spreadsheet_id'])
+        self.assertEqual('format_cell_range', api_calls[-1][2]['operation'])
+
+
+class QuotaLedgerTest(unittest.TestCase):
+    BOLD = cellFormat(textFormat=textFormat(bold=True))
+
+    def setUp(self):
+        import tempfile
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'quota.sqlite')
+        self.now = [1000.0]
+        self.ledgers = []
+
+    def tearDown(self):
+        import shutil
+        set_quota_ledger(None)
+        for ledger in self.ledgers:
+            ledger.close()
+        shutil.rmtree(self.directory)
+
+    def ledger(self, **kwargs):
+        def sleep(seconds):
+            self.now[0] += seconds
+        ledger = QuotaLedger(self.path, clock=lambda: self.now[0], sleep=sleep, **kwargs)
+        self.ledgers.append(ledger)
+        return ledger
+
+    def test_ledger_is_shared(self):
+        # two ledgers on one file stand for two processes
+        first, second = self.ledger(read_limit=3, write_limit=2), self.ledger(read_limit=3, write_limit=2)
+        self.assertEqual(0, first.acquire('write'))
+        self.now[0] += 10
+        self.assertEqual(0, second.acquire('write'))
+        self.assertEqual(0, second.acquire('read'))
+        self.assertEqual({'read': 1, 'write': 2}, first.usage())
+        self.assertEqual({'read': 1 / 3.0, 'write': 1.0}, second.utilization())
+        # the third write waits until the first leaves the 60-second window
+        self.assertEqual(50, first.acquire('write'))
+        self.assertEqual(1060, self.now[0])
+        self.assertEqual({'read': 1, 'write': 2}, second.usage())
+        second.pause(5)
+        self.assertEqual(5, first.acquire('read'))
+        with self.assertRaises(ValueError):
+            first.acquire('delete')
+
+    def test_calls_are_scheduled_and_retried(self):
+        service = FakeSheetsService()
+        worksheet = service.create('Report').sheet1
+        ledger = self.ledger(read_limit=3, write_limit=2, backoff=2)
+        set_quota_ledger(ledger)
+        with instrumented(TotalsInstrument()) as totals:
+            for i in range(3):
+                format_cell_range(worksheet, 'A%d' % (i + 1), self.BOLD)
+            self.assertEqual(1060, self.now[0])
+            service.throttle_next(2)
+            self.assertEqual(self.BOLD, get_user_entered_format(worksheet, 'A3'))
+        self.assertEqual(2, totals.counters['retries'])
+        self.assertEqual(1066, self.now[0])
+        self.assertEqual({'read': 3, 'write': 1}, ledger.usage())
+        ledger.max_retries = 0
+        service.throttle_next(1)
+        with self.assertRaises(gspread.exceptions.APIError):
+            get_user_entered_format(worksheet, 'A3')
+
+
+class SnapshotTest(unittest.TestCase):
+    BOLD = cellFormat(textFormat=textFormat(bold=True))
+    RED = cellFormat(backgroundColor=color(1, 0, 0))
+
+    def test_round_trip(self):
+        import io
+        service = FakeSheetsService()
+        spreadsheet = service.create('Template', rows=100, cols=10)
+        template = spreadsheet.sheet1
+        format_cell_ranges(template, [('A1:J1', self.BOLD), ('B3:C50', self.RED), ('E5', self.BOLD)])
+        set_text_format_runs(template, 'D2', [TextFormatRun(startIndex=2, format=textFormat(italic=True))])
+        set_data_validation_for_cell_range(
+            template, 'F2:F100', DataValidationRule(BooleanCondition('BOOLEAN', []), showCustomUi=True)
+        )
+        set_row_height(template, '1', 40)
+        set_column_widths(template, [('A', 200), ('C:D', 50)])
+        set_frozen(template, rows=1, cols=2)
+        rules = get_conditional_format_rules(template)
+        rules.append(ConditionalFormatRule(
+            ranges=[GridRange.from_a1_range('G2:G100', template)],
+            booleanRule=BooleanRule(condition=BooleanCondition('NUMBER_GREATER', ['2']), format=self.RED)
+        ))
+        rules.save()
+
+        snapshot = take_snapshot(template)
+        self.assertEqual(
+            [1, 10, 0, 11, 2, 2, 0, 8, 2, 2, 0, 8, 2, 2, 0, 1, 1, 1], snapshot.cell_formats[:18]
+        )
+        self.assertEqual([self.BOLD.to_props(), self.RED.to_props()], snapshot.formats[:2])
+        self.assertEqual([40, 1, 21, 99], snapshot.row_heights)
+        self.assertEqual([200, 1, 100, 1, 50, 2, 100, 6], snapshot.column_widths)
+        f = io.BytesIO()
+        snapshot.save(f)
+        f.seek(0)
+        loaded = FormatSnapshot.load(f)
+        self.assertEqual(snapshot.to_dict(), loaded.to_dict())
+
+        # the target starts with formatting of its own, and a smaller grid
+        target = spreadsheet.add_worksheet('Copy', rows=50, cols=10)
+        format_cell_range(target, 'A1:J50', self.RED)
+        set_data_validation_for_cell_range(
+            target, 'A1', DataValidationRule(BooleanCondition('BOOLEAN', []))
+        )
+        set_column_width(target, 'J', 300)
+        apply_snapshot(target, loaded)
+        copied = take_snapshot(spreadsheet.worksheet('Copy'))
+        expected = dict(snapshot.to_dict(), title='Copy')
+        expected['conditionalFormats'][0]['ranges'][0]['sheetId'] = target.id
+        self.assertEqual(expected, copied.to_dict())
+        self.assertTrue(service.request_counts['repeatCell'] < 20)
+        self.assertEqual(1, len(get_conditional_format_rules(target)))
+
+    def test_invalid_snapshots(self):
+        with self.assertRaises(ValueError):
+            FormatSnapshot('Sheet1', 10, 2, cell_formats=[0, 19])
+        with self.assertRaises(ValueError):
+            FormatSnapshot.from_dict(dict(FormatSnapshot('Sheet1', 1, 1).to_dict(), version=99))
+
+
+class FormatGridTest(unittest.TestCase):
+    BOLD = cellFormat(textFormat=textFormat(bold=True))
+    RED = cellFormat(backgroundColor=color(1, 0, 0))
+
+    def test_indexing_and_diff(self):
+        grid = FormatGrid(10, 5, row=2, col=2)
+        grid['B2:F2'] = self.BOLD
+        grid[np.arange(50).reshape(10, 5) % 7 == 3] = self.RED
+        self.assertEqual([self.BOLD, self.RED], grid.palette)
+        self.assertEqual(self.BOLD, grid[0, 1])
+        self.assertEqual(self.RED, grid['E2'][0, 0])
+        self.assertEqual(None, grid[1, 0])
+        sub = grid['C3:D5']
+        self.assertEqual((3, 3, (3, 2)), (sub.row, sub.col, sub.shape))
+        self.assertEqual(sub, grid[1:4, 1:3])
+        with self.assertRaises(ValueError):
+            grid['A1:B2']
+        self.assertIn(('B2:D2', self.BOLD), grid.to_ranges())
+        self.assertEqual(grid, FormatGrid.from_row_runs(grid.to_row_runs(), grid.palette, 5, row=2, col=2))
+
+        changed = grid.copy()
+        changed['B3:C4'] = self.BOLD
+        changed[0, 4] = None
+        self.assertEqual(5, changed.diff(grid).sum())
+        self.assertNotEqual(changed, grid)
+        worksheet = RecordingWorksheet(RecordingSpreadsheet(), id=4)
+        requests = changed.requests(worksheet, base=grid)
+        self.assertEqual(
+            [({'sheetId': 4, 'startRowIndex': 2, 'endRowIndex': 4, 'startColumnIndex': 1, 'endColumnIndex': 3}, self.BOLD.to_props()),
+             ({'sheetId': 4, 'startRowIndex': 1, 'endRowIndex': 2, 'startColumnIndex': 5, 'endColumnIndex': 6}, None)],
+            sorted(
+                [(r['repeatCell']['range'], r['repeatCell']['cell'].get('userEnteredFormat')) for r in requests],
+                key=lambda pair: pair[0]['startColumnIndex']
+            )
+        )
+        # without a base, the most common format (none) covers the grid first
+        requests = grid.requests(worksheet)
+        self.assertEqual({}, requests[0]['repeatCell']['cell'])
+        self.assertEqual(len(grid.to_ranges()) + 1, len(requests))
+
+    def test_invalid_arguments(self):
+        palette = [self.BOLD, self.RED]
+        # each row's runs must cover exactly the grid's columns, with ids of the palette
+        self.assertEqual((2, 3), FormatGrid.from_row_runs([[0, 3], [1, 1, -1, 2]], palette, 3).shape)
+        for row_runs in ([[0, 2]], [[0, 2, 1, 2]], [[2, 3]], [[-2, 3]]):
+            with self.assertRaises(ValueError):
+                FormatGrid.from_row_runs(row_runs, palette, 3)
+        with self.assertRaises(ValueError):
+            FormatGrid.from_ids([0, 1], palette)
+
+        grid = FormatGrid(10, 5, row=2, col=2)
+        for key in ((slice(None, None, 2), slice(None)), (slice(None), slice(None, None, -1)), slice(0, 10, 3)):
+            with self.assertRaises(ValueError):
+                grid[key]
+        with self.assertRaises(ValueError):
+            grid[0]
+        # A1 ranges must lie within B2:F11
+        for label in ('A2', 'B1:C3', 'G2', 'B2:G11', 'B12', 'F11:F12'):
+            with self.assertRaises(ValueError):
+                grid[label]
+            with self.assertRaises(ValueError):
+                grid[label] = self.BOLD
+        self.assertEqual((10, 5), grid['B2:F11'].shape)
+        self.assertEqual([], grid.palette)
+
+        worksheet = RecordingWorksheet(RecordingSpreadsheet())
+        for base in (FormatGrid(10, 5, row=3, col=2), FormatGrid(10, 5, row=2, col=1), FormatGrid(9, 5, row=2, col=2)):
+            with self.assertRaises(ValueError):
+                grid.requests(worksheet, base=base)
+        self.assertEqual([], grid.requests(worksheet, base=FormatGrid(10, 5, row=2, col=2)))
+
+    def test_read_and_apply(self):
+        worksheet = FakeSheetsService().create('Report', rows=50, cols=10).sheet1
+        format_cell_ranges(worksheet, [('A1:J1', self.BOLD), ('C5:D40', self.RED)])
+        grid = get_format_grid(worksheet, 'A1:J50')
+        self.assertEqual(2, len(grid.palette))
+        self.assertEqual(self.RED, grid['D40'][0, 0])
+        wanted = grid.copy()
+        wanted['A1:J1'] = None
+        wanted['A2:J2'] = self.BOLD
+        self.assertEqual(2, len(wanted.requests(worksheet, base=grid)))
+        apply_format_grid(worksheet, wanted, base=grid)
+        self.assertEqual(wanted, get_format_grid(worksheet, 'A1:J50'))
+        self.assertEqual(None, apply_format_grid(worksheet, wanted, base=wanted))
+        self.assertEqual(wanted['C3:D45'], get_format_grid(worksheet, 'C3:D45'))
+
+
+class BenchmarkTest(unittest.TestCase):
+    def test_results_and_regressions(self):
+        document = benchmark.run_benchmarks(['cellformat_to_props', 'conditional_rules_save'], quick=True)
+        self.assertEqual(['cellformat_to_props', 'conditional_rules_save_500_rules'], sorted(document['results']))
+        result = document['results']['cellformat_to_props']
+        self.assertTrue(0 < result['min'] <= result['median'] <= result['max'])
+        self.assertAlmostEqual(result['median'] / result['calibration'], result['relative'])
+        self.assertEqual(json.loads(json.dumps(document)), document)
+        self.assertEqual([], benchmark.check_results(document, baseline=document))
+        failures = benchmark.check_results(
+            document,
+            thresholds={'cellformat_to_props': result['relative'] / 2},
+            baseline={'results': {'conditional_rules_save_500_rules': {'relative': 1e-9}}}
+        )
+        self.assertEqual(2, len(failures))
+        self.assertTrue(failures[0].startswith('cellformat_to_props: relative median'))
+
+
+class DataFrameFormatterOfflineTest(unittest.TestCase):
+    HIGH = cellFormat(backgroundColor=color(1, 0, 0))
+    LOW = cellFormat(backgroundColor=color(0, 0, 1))
+
+    def make_dataframe(self, rows=60):
+        return pd.DataFrame({
+            'a': [i % 7 for i in range(rows)],
+            'b': [(i // 10) * 1.5 for i in range(rows)],
+            'c': ['x%d' % i for i in range(rows)],
+        })
+
+    def cell_formatter(self):
+        high, low = self.HIGH, self.LOW
+        class CellFormatter(BasicFormatter):
+            def format_for_cell(self, value, row_number, col_number, dataframe):
+                if isinstance(value, str):
+                    return None
+                return high if value > 4 else (low if value < 1 else None)
+        return CellFormatter.with_defaults()
+
+    def vectorized_formatter(self):
+        high, low = self.HIGH, self.LOW
+        class VectorizedFormatter(BasicFormatter):
+            def format_for_cells(self, dataframe):
+                numeric = dataframe.select_dtypes('number')
+                ids = np.full(dataframe.shape, -1)
+                for idx, name in enumerate(dataframe.columns):
+                    if name in numeric:
+                        ids[:, idx] = np.where(numeric[name] > 4, 0, np.where(numeric[name] < 1, 1, -1))
+                return ids, [high, low]
+        return VectorizedFormatter.with_defaults()
+
+    def test_reused_format_object(self):
+        # a formatter changing and returning one format object gets each version's format
+        high, low = self.HIGH, self.LOW
+        class ReusingFormatter(BasicFormatter):
+            shared = cellFormat()
+            def format_for_cell(self, value, row_number, col_number, dataframe):
+                if isinstance(value, str) or 1 <= value <= 4:
+                    return None
+                self.shared.backgroundColor = (high if value > 4 else low).backgroundColor
+                return self.shared
+        worksheet = RecordingWorksheet(RecordingSpreadsheet())
+        df = self.make_dataframe()
+        self.assertEqual(
+            paint_requests(_format_with_dataframe(worksheet, df, self.cell_formatter())),
+            paint_requests(_format_with_dataframe(worksheet, df, ReusingFormatter.with_defaults()))
+        )
+
+    def test_vectorized_cell_formats(self):
+        worksheet = RecordingWorksheet(RecordingSpreadsheet())
+        df = self.make_dataframe()
+        for kwargs in ({}, {'row': 3, 'col': 2}, {'include_column_header': False}):
+            per_cell = _format_with_dataframe(worksheet, df, self.cell_formatter(), **kwargs)
+            vectorized = _format_with_dataframe(worksheet, df, self.vectorized_formatter(), **kwargs)
+            self.assertEqual(paint_requests(per_cell), paint_requests(vectorized))
+            self.assertEqual(len(per_cell), len(vectorized))
+
+    def test_format_grid_cell_formats(self):
+        worksheet = RecordingWorksheet(RecordingSpreadsheet())
+        df = self.make_dataframe()
+        vectorized = self.vectorized_formatter()
+        class GridFormatter(type(vectorized)):
+            def format_for_cells(self, dataframe):
+                return FormatGrid.from_ids(*vectorized.format_for_cells(dataframe))
+        self.assertEqual(
+            _format_with_dataframe(worksheet, df, vectorized),
+            _format_with_dataframe(worksheet, df, GridFormatter.with_defaults())
+        )
+
+    def test_basic_formatter_skips_cells(self):
+        df = self.make_dataframe()
+        self.assertEqual((None, ()), DEFAULT_FORMATTER.format_for_cells(df))
+        self.assertEqual(None, self.cell_formatter().format_for_cells(df))
+
+    def test_chunked_requests(self):
+        spreadsheet = RecordingSpreadsheet()
+        worksheet = RecordingWorksheet(spreadsheet)
+        df = self.make_dataframe(95)
+        seen_rows = []
+        class RowFormatter(BasicFormatter):
+            def format_for_data_row(self, values, row_number, dataframe):
+                seen_rows.append(list(values))
+                return cellFormat(textFormat=textFormat(bold=True)) if row_number % 2 else None
+        formatter = RowFormatter.with_defaults(freeze_headers=True)
+        batches = list(iter_format_with_dataframe(worksheet, df, formatter, include_index=True, chunk_size=10))
+        # column and header formats, 10 chunks of rows, then the freeze request
+        self.assertEqual(12, len(batches))
+        self.assertEqual([0, 1, 2, 95], seen_rows[0][:1] + seen_rows[1][:1] + seen_rows[2][:1] + [len(seen_rows)])
+        self.assertEqual(
+            [r for batch in batches for r in batch], 
+            _format_with_dataframe(worksheet, df, formatter, include_index=True)
+        )
+        with self.assertRaises(ValueError):
+            list(iter_format_with_dataframe(worksheet, df, formatter, chunk_size=0))
+
+        batch = batch_updater(spreadsheet, max_pending_requests=20)
+        batch.format_with_dataframe_in_chunks(worksheet, df, formatter, chunk_size=10)
+        flushed = [sum(len(r) for r in body['requests']) for body in spreadsheet.bodies]
+        self.assertTrue(all(n >= 20 for n in flushed))
+        batch.execute()
+        total = sum(len(r) for body in spreadsheet.bodies for r in body['requests'])
+        self.assertEqual(len(_format_with_dataframe(worksheet, df, formatter)), total)
+
+    def test_flush_on_last_request_leaves_nothing_to_send(self):
+        spreadsheet = RecordingSpreadsheet()
+        worksheet = RecordingWorksheet(spreadsheet)
+        with batch_updater(spreadsheet, max_pending_requests=2) as batch:
+            batch.format_cell_range(worksheet, 'A1', cellFormat(textFormat=textFormat(bold=True)))
+            batch.format_cell_range(worksheet, 'B1', cellFormat(textFormat=textFormat(italic=True)))
+        # the second request flushed the batch, so leaving the block sends nothing
+        self.assertEqual(1, len(spreadsheet.bodies))
+        self.assertEqual(None, batch.execute())
+
+    def test_equal_formats_are_merged(self):
+        worksheet = RecordingWorksheet(RecordingSpreadsheet())
+        df = self.make_dataframe(100)
+        high = self.HIGH
+        class BlockFormatter(BasicFormatter):
+            def format_for_data_row(self, values, row_number, dataframe):
+                # a fresh but equal format object for each row in the first 40 data rows
+                return cellFormat(textFormat=textFormat(bold=True)) if row_number <= 41 else None
+            def format_for_cell(self, value, row_number, col_number, dataframe):
+                return high if row_number > 81 and col_number < 3 else None
+        # skip the first batch, holding column and header formats
+        batches = list(iter_format_with_dataframe(worksheet, df, BlockFormatter(), chunk_size=25))[1:]
+        ranges = [r['repeatCell']['range'] for batch in batches for r in batch]
+        self.assertEqual([
+            {'sheetId': 0, 'startRowIndex': 1, 'endRowIndex': 41, 'startColumnIndex': 0, 'endColumnIndex': 4},
+            {'sheetId': 0, 'startRowIndex': 81, 'endRowIndex': 101, 'startColumnIndex': 0, 'endColumnIndex': 2},
+        ], ranges)
+
+    def test_conditional_formatter_compiles_rules(self):
+        worksheet = RecordingWorksheet(RecordingSpreadsheet())
+        df = self.make_dataframe(100)
+        over_four = BooleanRule(condition=BooleanCondition('NUMBER_GREATER', ['4']), format=self.HIGH)
+        gradient = GradientRule(
+            minpoint=InterpolationPoint(color=color(1, 1, 1), type='MIN'),
+            maxpoint=InterpolationPoint(color=color(0, 1, 0), type='MAX')
+        )
+        formatter = ConditionalFormatter.with_defaults(
+            column_rules={'a': over_four, 'b': [over_four, gradient]}
+        )
+        existing = ConditionalFormatRule(
+            ranges=[GridRange(0, 0, 5, 7, 8)],
+            booleanRule=BooleanRule(condition=BooleanCondition('NOT_BLANK'), format=self.LOW)
+        )
+        rules = ConditionalFormatRules(worksheet, [existing])
+        requests = _format_with_dataframe(worksheet, df, formatter, row=2, conditional_rules=rules)
+        adds = [r['addConditionalFormatRule'] for r in requests if 'addConditionalFormatRule' in r]
+        self.assertEqual([0, 1], [a['index'] for a in adds])
+        self.assertEqual(existing.to_props(), rules[2].to_props())
+        # formatting the same frame again keeps the rules as they are
+        again = _format_with_dataframe(worksheet, df, formatter, row=2, conditional_rules=rules)
+        self.assertFalse(any('ConditionalFormatRule' in list(r)[0] for r in again))
+        self.assertEqual(3, len(rules))
+        # jobs on one worksheet see each other's rules, and formatting them again changes none
+        worksheet = FakeSheetsService().create('Report', rows=200, cols=10).sheet1
+        jobs = [(worksheet, df, formatter), (worksheet, df, formatter, 1, 5)]
+        format_with_dataframes(jobs)
+        self.assertEqual(4, len(get_conditional_format_rules(worksheet)))
+        (spreadsheet, requests), = _format_with_dataframes(jobs)
+        self.assertFalse(any('ConditionalFormatRule' in list(r)[0] for r in requests))
+        # the equal rule covers both columns; the MIN/MAX gradient stays specific to column b
+        self.assertEqual(
+            [{'sheetId': 0, 'startRowIndex': 2, 'endRowIndex': 102, 'startColumnIndex': 0, 'endColumnIndex': 2}],
+            adds[0]['rule']['ranges']
+        )
+        self.assertEqual(
+            [{'sheetId': 0, 'startRowIndex': 2, 'endRowIndex': 102, 'startColumnIndex': 1, 'endColumnIndex': 2}],
+            adds[1]['rule']['ranges']
+        )
+        self.assertTrue('gradientRule' in adds[1]['rule'])
+        self.assertFalse(any('addConditionalFormatRule' in r for r in _format_with_dataframe(worksheet, df)))
+
+    def test_appended_rows_extend_rules_and_banding(self):
+        worksheet = FakeSheetsService().create('Report', rows=200, cols=10).sheet1
+        over_four = BooleanRule(condition=BooleanCondition('NUMBER_GREATER', ['4']), format=self.HIGH)
+        gradient = GradientRule(
+            minpoint=InterpolationPoint(color=color(1, 1, 1), type='MIN'),
+            maxpoint=InterpolationPoint(color=color(0, 1, 0), type='MAX')
+        )
+        formatter = ConditionalFormatter.with_defaults(
+            column_rules={'a': over_four, 'b': [over_four, gradient]},
+            banding=BandingProperties(firstBandColor=color(1, 1, 1), secondBandColor=color(0.9, 0.9, 1))
+        )
+        df = self.make_dataframe(40)
+        format_with_dataframe(worksheet, df, formatter, row=3, col=2)
+        # a rule added by someone else, after the DataFrame's rules
+        rules = get_conditional_format_rules(worksheet)
+        rules.append(ConditionalFormatRule(
+            ranges=[GridRange.from_a1_range('H1:H5', worksheet)],
+            booleanRule=BooleanRule(condition=BooleanCondition('NOT_BLANK'), format=self.LOW)
+        ))
+        rules.save()
+        format_with_dataframe(worksheet, self.make_dataframe(60), formatter, row=3, col=2, formatted_rows=len(df))
+
+        rules = get_conditional_format_rules(worksheet)
+        self.assertEqual(3, len(rules))
+        self.assertEqual(
+            [(3, 63, 1, 3), (3, 63, 2, 3), (0, 5, 7, 8)],
+            [(gr.startRowIndex, gr.endRowIndex, gr.startColumnIndex, gr.endColumnIndex)
+             for rule in rules for gr in rule.ranges]
+        )
+        self.assertTrue(rules[1].gradientRule is not None)
+        banded_ranges = get_banded_ranges(worksheet)
+        self.assertEqual(1, len(banded_ranges))
+        self.assertEqual(GridRange(worksheet.id, 2, 63, 1, 4), banded_ranges[0].range)
+
+        # the rules are found by content, not position, and extending them again changes nothing
+        rules.insert(0, rules.pop())
+        rules.save()
+        self.assertFalse(any(
+            'ConditionalFormatRule' in list(r)[0] or 'Banding' in list(r)[0]
+            for r in _format_with_dataframe(worksheet, self.make_dataframe(60), formatter, row=3, col=2, formatted_rows=len(df))
+        ))
+        format_with_dataframe(worksheet, self.make_dataframe(80), formatter, row=3, col=2, formatted_rows=60)
+        self.assertEqual(
+            [(0, 5, 7, 8), (3, 83, 1, 3), (3, 83, 2, 3)],
+            [(gr.startRowIndex, gr.endRowIndex, gr.startColumnIndex, gr.endColumnIndex)
+             for rule in get_conditional_format_rules(worksheet) for gr in rule.ranges]
+        )
+        self.assertEqual(GridRange(worksheet.id, 2, 83, 1, 4), get_banded_ranges(worksheet)[0].range)
+
+        # the rules or banding added by the earlier call must still be there
+        rules = get_conditional_format_rules(worksheet)
+        del rules[1]
+        rules.save()
+        with self.assertRaises(ValueError):
+            _format_with_dataframe(worksheet, self.make_dataframe(100), formatter, row=3, col=2, formatted_rows=80)
+        delete_banding(worksheet, get_banded_ranges(worksheet)[0].bandedRangeId)
+        with self.assertRaises(ValueError):
+            _format_with_dataframe(
+                worksheet, self.make_dataframe(100), BasicFormatter.with_defaults(banding=formatter.banding),
+                row=3, col=2, formatted_rows=80
+            )
+
+    def test_banding(self):
+        worksheet = RecordingWorksheet(RecordingSpreadsheet(), id=3)
+        df = self.make_dataframe(100)
+        bands = BandingProperties(
+            headerColor=color(0.5, 0.5, 0.5), firstBandColor=color(1, 1, 1), secondBandColor=color(0.9, 0.9, 1)
+        )
+        formatter = BasicFormatter.with_defaults(banding=bands)
+        requests = _format_with_dataframe(worksheet, df, formatter, row=2, col=2, include_index=True)
+        adds = [r['addBanding']['bandedRange'] for r in requests if 'addBanding' in r]
+        self.assertEqual(1, len(adds))
+        self.assertEqual(
+            {'sheetId': 3, 'startRowIndex': 1, 'endRowIndex': 102, 'startColumnIndex': 1, 'endColumnIndex': 5},
+            adds[0]['range']
+        )
+        self.assertEqual(bands.to_props(), adds[0]['rowProperties'])
+        # Google Sheets chooses the id, so it never collides with an existing banded range
+        self.assertFalse('bandedRangeId' in adds[0])
+        # without a header row, the header color would band the first data row
+        requests = _format_with_dataframe(worksheet, df, formatter, include_column_header=False)
+        adds = [r['addBanding']['bandedRange'] for r in requests if 'addBanding' in r]
+        self.assertFalse('headerColor' in adds[0]['rowProperties'])
+        self.assertEqual(102, adds[0]['range']['endRowIndex'] + 2)
+        update_banding(worksheet, 7, range='A1:B20')
+        delete_banding(worksheet, 7)
+        self.assertEqual(
+            [{'updateBanding': {
+                'bandedRange': {
+                    'bandedRangeId': 7,
+                    'range': {'sheetId': 3, 'startRowIndex': 0, 'endRowIndex': 20, 'startColumnIndex': 0, 'endColumnIndex': 2}
+                },
+                'fields': 'range'
+            }}],
+            worksheet.spreadsheet.bodies[0]['requests']
+        )
+        self.assertEqual([{'deleteBanding': {'bandedRangeId': 7}}], worksheet.spreadsheet.bodies[1]['requests'])
+        self.assertEqual(BandedRange.from_props(adds[0]).to_props(), adds[0])
+        with self.assertRaises(ValueError):
+            add_banding(worksheet, 'A1:B20')
+
+    def test_plan_cache(self):
+        worksheet = RecordingWorksheet(RecordingSpreadsheet())
+        calls = []
+        class CountingFormatter(BasicFormatter):
+            def format_for_column(self, column, col_number, dataframe):
+                calls.append(col_number)
+                return super(CountingFormatter, self).format_for_column(column, col_number, dataframe)
+        formatter = CountingFormatter.with_defaults(freeze_headers=True)
+        cache = FormattingPlanCache(maxsize=2)
+        for rows in (10, 30, 20):
+            df = self.make_dataframe(rows)
+            self.assertEqual(
+                _format_with_dataframe(worksheet, df, formatter),
+                _format_with_dataframe(worksheet, df, formatter, plan_cache=cache)
+            )
+        # three uncached calls plus one cached call visit each of the three columns
+        self.assertEqual(12, len(calls))
+        self.assertEqual((2, 1), (cache.hits, cache.misses))
+        _format_with_dataframe(worksheet, self.make_dataframe(), formatter, col=2, plan_cache=cache)
+        _format_with_dataframe(worksheet, self.make_dataframe()[['a']], formatter, plan_cache=cache)
+        self.assertEqual(2, len(cache))
+        _format_with_dataframe(worksheet, self.make_dataframe(), formatter, plan_cache=cache)
+        self.assertEqual((2, 4), (cache.hits, cache.misses))
+        with self.assertRaises(ValueError):
+            FormattingPlanCache(maxsize=0)
+
+    def test_sampled_type_inference(self):
+        inference = ColumnTypeInference(sample_size=5, edge_size=2)
+        column = pd.Series(list(range(1000)), dtype=object)
+        self.assertEqual(9, len(inference.sample(column)))
+        self.assertEqual('i', inference.infer(column))
+        # a float between sampled positions is only seen by a strict inference
+        column[501] = 0.5
+        self.assertEqual('i', inference.infer(column))
+        self.assertEqual('f', ColumnTypeInference(strict=True).infer(column))
+        for values, kind in (
+                ([1, None], 'f'), 
+                ([datetime(2020, 1, 1), float('nan')], 'M'), 
+                ([1, pd.NA], None), 
+                ([True, False], None), 
+                (['$1,024.50', '12%'], None)):
+            self.assertEqual(kind, DEFAULT_TYPE_INFERENCE.infer(pd.Series(values, dtype=object)), values)
+
+        df = pd.DataFrame({
+            'price': ['$1,024.50', '€3', None], 
+            'share': ['12.5%', '3 %', '0%'], 
+            'day': ['2024-01-03', '2024-02-01 10:00', '2024-03-01']
+        })
+        formatter = BasicFormatter.with_defaults(
+            type_inference=ColumnTypeInference(parse_strings=True), 
+            currency_format='$#,##0.00'
+        )
+        self.assertEqual(
+            [numberFormat('CURRENCY', '$#,##0.00'), numberFormat('PERCENT', ''), numberFormat('DATE', '')],
+            [formatter.format_for_column(df[c], i + 1, df).numberFormat for i, c in enumerate(df.columns)]
+        )
+        self.assertEqual(None, DEFAULT_FORMATTER.format_for_column(df['price'], 1, df).numberFormat)
+
+    @unittest.skipIf(pyarrow is None, "pyarrow is not installed")
+    def test_arrow_table_formatted_like_dataframe(self):
+        worksheet = RecordingWorksheet(RecordingSpreadsheet())
+        df = self.make_dataframe()
+        table = pyarrow.Table.from_pandas(df, preserve_index=False)
+        for formatter in (DEFAULT_FORMATTER, self.cell_formatter()):
+            for kwargs in ({}, {'include_index': True, 'row': 2}):
+                self.assertEqual(
+                    _format_with_dataframe(worksheet, df, formatter, **kwargs),
+                    _format_with_dataframe(worksheet, table, formatter, **kwargs)
+                )
+
+    @unittest.skipIf(pyarrow is None, "pyarrow is not installed")
+    def test_arrow_frame_interface(self):
+        from gspread_formatting.arrow import ArrowFrame, _as_frame
+        table = pyarrow.table({
+            'flag': pyarrow.array([True, False, None]),
+            'count': pyarrow.array([1, 2, 3], pyarrow.uint8()),
+            'price': pyarrow.array([1.5, None, 3.25]),
+            'day': pyarrow.array([date(2024, 1, d) for d in (1, 2, 3)]),
+            'at': pyarrow.array([datetime(2024, 1, 1, h) for h in (1, 2, 3)]),
+            'kind': pyarrow.array(['a', 'b', 'a']).dictionary_encode(),
+            'name': pyarrow.array(['x', 'y', 'z']),
+        })
+        frame = _as_frame(table)
+        self.assertIs(frame, _as_frame(frame))
+        self.assertEqual(['b', 'u', 'f', 'M', 'M', 'O', 'O'], [d.kind for d in frame.dtypes])
+        self.assertEqual(frame.dtypes, ArrowFrame(table).dtypes)
+        self.assertEqual('double', str(frame['price'].dtype))
+        self.assertEqual((3, 7), frame.shape)
+        self.assertEqual(3, len(frame))
+        column = frame['name']
+        self.assertEqual((3, ['x', 'y', 'z']), (len(column), list(column)))
+        self.assertEqual(['y', 'z'], column[1:].to_pylist())
+        self.assertEqual(['x', 'z'], column[::2])
+        self.assertEqual(['z', 'x'], column[[2, 0]])
+        self.assertEqual('y', column[1])
+        rows = frame.iloc[1:]
+        self.assertEqual([1, 2], list(rows.index))
+        self.assertEqual([2, 1], rows.index[[1, 0]])
+        self.assertEqual([1], list(rows.index[:1]))
+        self.assertEqual(range(1, 3, 2), rows.index[::2])
+        self.assertEqual([[False, 2, None, date(2024, 1, 2), datetime(2024, 1, 1, 2), 'b', 'y']], rows.iloc[:1].values)
+        self.assertEqual([[], []], ArrowFrame(table.select([]).slice(0, 2)).values)
+        with self.assertRaises(ValueError):
+            frame.iloc[::2]
+
+    @unittest.skipIf(polars is None, "polars is not installed")
+    def test_polars_frame_formatted_like_dataframe(self):
+        worksheet = RecordingWorksheet(RecordingSpreadsheet())
+        df = self.make_dataframe()
+        df['d'] = pd.date_range('2024-01-01', periods=len(df), freq='D')
+        df['flag'] = [i % 3 == 0 for i in range(len(df))]
+        frame = polars.from_pandas(df)
+        high = self.HIGH
+        class RowAndCellFormatter(BasicFormatter):
+            def format_for_data_row(self, values, row_number, dataframe):
+                return cellFormat(textFormat=textFormat(bold=True)) if values[0] == 6 else None
+            def format_for_cell(self, value, row_number, col_number, dataframe):
+                return high if isinstance(value, float) and value > 4 else None
+        for formatter in (DEFAULT_FORMATTER, RowAndCellFormatter.with_defaults()):
+            for kwargs in ({}, {'include_index': True, 'row': 2}, {'formatted_rows': 20}):
+                self.assertEqual(
+                    _format_with_dataframe(worksheet, df, formatter, **kwargs),
+                    _format_with_dataframe(worksheet, frame, formatter, **kwargs)
+                )
+
+    def test_coalesced_requests_paint_the_same_cells(self):
+        worksheet = RecordingWorksheet(RecordingSpreadsheet())
+        rng = random.Random(5)
+        formats = [cellFormat(backgroundColor=color(i / 3.0, 0, 0)) for i in range(3)]
+        for trial in range(20):
+            requests = []
+            for i in range(60):
+                r, c = rng.randint(1, 12), rng.randint(1, 6)
+                requests.extend(gspread_formatting.batch_update_requests.format_cell_range(
+                    worksheet, (r, c, r + rng.randint(0, 3), c + rng.randint(0, 2)), rng.choice(formats)
+                ))
+            coalesced = _coalesce_format_requests(requests)
+            self.assertEqual(paint_requests(requests), paint_requests(coalesced))
+            self.assertTrue(len(coalesced) <= len(requests))
+
+    def test_many_dataframes_in_one_call_per_spreadsheet(self):
+        spreadsheet, other_spreadsheet = RecordingSpreadsheet(), RecordingSpreadsheet()
+        worksheet = RecordingWorksheet(spreadsheet)
+        other_worksheet = RecordingWorksheet(other_spreadsheet, id=7)
+        first, second = self.make_dataframe(10), self.make_dataframe(20)
+        jobs = [
+            (worksheet, first, DEFAULT_FORMATTER),
+            (other_worksheet, first),
+            # directly below the first DataFrame, without a header of its own
+            (worksheet, second, DEFAULT_FORMATTER, 12, 1, False, False),
+        ]
+        responses = format_with_dataframes(jobs)
+        self.assertEqual(2, len(responses))
+        self.assertEqual((1, 1), (len(spreadsheet.bodies), len(other_spreadsheet.bodies)))
+        requests = spreadsheet.bodies[0]['requests']
+        separate = _format_with_dataframe(*jobs[0]) + _format_with_dataframe(*jobs[2])
+        self.assertEqual(paint_requests(separate), paint_requests(requests))
+        # the equal number formats of columns a and b cover both DataFrames with one request
+        column_ranges = [
+            r['repeatCell']['range'] for r in requests 
+            if r['repeatCell']['range']['startColumnIndex'] == 0
+        ]
+        self.assertEqual([{
+            'sheetId': 0, 'startRowIndex': 0, 'endRowIndex': 32, 'startColumnIndex': 0, 'endColumnIndex': 2
+        }], column_ranges[:1])
+        self.assertTrue(len(requests) < len(separate))
+
+        batch = batch_updater(spreadsheet)
+        batch.format_with_dataframes(jobs[::2])
+        batch.execute()
+        self.assertEqual([requests], spreadsheet.bodies[1]['requests'])
+        with self.assertRaises(ValueError):
+            batch.format_with_dataframes(jobs)
+
+    def test_appended_rows(self):
+        worksheet = RecordingWorksheet(RecordingSpreadsheet())
+        high = self.HIGH
+        class MaxRowFormatter(BasicFormatter):
+            def format_for_data_row(self, values, row_number, dataframe):
+                return high if values[0] == dataframe['a'].max() else None
+        formatter = MaxRowFormatter.with_defaults(freeze_headers=True)
+        df = pd.DataFrame({'a': [3, 1, 5, 2], 'b': [1.5, 2.5, 3.5, 4.5]})
+        appended = pd.concat([df, pd.DataFrame({'a': [9, 0], 'b': [0.5, 0.5]})], ignore_index=True)
+        before = _format_with_dataframe(worksheet, df, formatter)
+        after = _format_with_dataframe(worksheet, appended, formatter, formatted_rows=len(df))
+        # the previous maximum's row is cleared of its row format, which paints an empty format
+        painted = paint_requests(before + after)
+        self.assertEqual(
+            paint_requests(_format_with_dataframe(worksheet, appended, formatter)), 
+            dict((cell, fmt) for cell, fmt in painted.items() if fmt)
+        )
+        # no header or freeze requests; only the new rows and the previous maximum's row are touched
+        self.assertFalse(any('updateSheetProperties' in r for r in after))
+        touched = set(
+            r for req in after for r in range(
+                req['repeatCell']['range']['startRowIndex'], req['repeatCell']['range']['endRowIndex']
+            )
+        )
+        self.assertEqual(set([3, 5, 6]), touched)
+        self.assertEqual([], _format_with_dataframe(worksheet, df, formatter, formatted_rows=len(df)))
+        with self.assertRaises(ValueError):
+            _format_with_dataframe(worksheet, df, formatter, formatted_rows=len(df) + 1)